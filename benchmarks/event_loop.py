@@ -0,0 +1,153 @@
+"""
+Compare the default asyncio event loop with uvloop on the bot's hot paths:
+event dispatch through py-cord and HTTP round trips through aiohttp.
+
+Run it from the project root with ``python -m benchmarks.event_loop``.
+
+This file is part of ouoteam/ouov3 which is released under GNU General Public License v3.0.
+See file LISENCE for full license details.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Dict, List
+
+import aiohttp
+import discord
+from aiohttp import web
+
+LISTENERS = 4
+PAYLOAD = {
+    "id": "1087520364185260102",
+    "channel_id": "1026851206926192662",
+    "content": "OuO" * 50,
+    "author": {"id": "733920687751823372", "username": "ouo", "discriminator": "0"},
+}
+
+
+async def dispatch(events: int) -> Dict[str, float]:
+    """
+    Dispatch events to a bot with a few listeners, as the gateway does for every message.
+
+    :param events: The number of events to dispatch.
+    :type events: int
+
+    :return: The number of events handled per second.
+    :rtype: Dict[str, float]
+    """
+    bot = discord.AutoShardedBot(intents=discord.Intents.default())
+    handled = 0
+    done = asyncio.Event()
+
+    async def listener(payload: dict) -> None:
+        nonlocal handled
+        handled += 1
+        if handled == events * LISTENERS:
+            done.set()
+
+    for _ in range(LISTENERS):
+        bot.add_listener(listener, "on_benchmark")
+    start = time.perf_counter()
+    for i in range(events):
+        bot.dispatch("benchmark", PAYLOAD)
+        if i % 1000 == 0:
+            # let the listeners run, as the gateway does between two messages
+            await asyncio.sleep(0)
+    await done.wait()
+    elapsed = time.perf_counter() - start
+    return {"events/s": events / elapsed}
+
+
+async def http(requests: int, concurrency: int) -> Dict[str, float]:
+    """
+    Send requests to a local JSON server, so only the client and loop overhead is measured.
+
+    :param requests: The number of requests to send.
+    :type requests: int
+    :param concurrency: The number of requests in flight.
+    :type concurrency: int
+
+    :return: The throughput and the round-trip times in milliseconds.
+    :rtype: Dict[str, float]
+    """
+
+    async def handler(request: web.Request) -> web.Response:
+        return web.json_response(PAYLOAD)
+
+    app = web.Application()
+    app.router.add_get("/", handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    times: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+    async with aiohttp.ClientSession() as session:
+
+        async def request() -> None:
+            async with semaphore:
+                start = time.perf_counter()
+                async with session.get(f"http://127.0.0.1:{port}/") as r:
+                    await r.json()
+                times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(request() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+    await runner.cleanup()
+    times.sort()
+    return {
+        "requests/s": requests / elapsed,
+        "rtt mean ms": statistics.fmean(times) * 1000,
+        "rtt p99 ms": times[int(len(times) * 0.99)] * 1000,
+    }
+
+
+async def benchmark(args: argparse.Namespace) -> Dict[str, float]:
+    results = await dispatch(args.events)
+    results.update(await http(args.requests, args.concurrency))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=3, help="the best round is reported")
+    args = parser.parse_args()
+
+    loops = {"asyncio": asyncio.DefaultEventLoopPolicy}
+    try:
+        import uvloop
+
+        loops["uvloop"] = uvloop.EventLoopPolicy
+    except ImportError:
+        print("uvloop is not installed, only the default loop is measured")
+
+    results: Dict[str, Dict[str, float]] = {}
+    for name, policy in loops.items():
+        asyncio.set_event_loop_policy(policy())
+        rounds = [asyncio.run(benchmark(args)) for _ in range(args.rounds)]
+        results[name] = {
+            key: (min if key.startswith("rtt") else max)(r[key] for r in rounds)
+            for key in rounds[0]
+        }
+
+    keys = list(next(iter(results.values())))
+    print(f"{'':<14}" + "".join(f"{name:>14}" for name in results))
+    for key in keys:
+        print(f"{key:<14}" + "".join(f"{r[key]:>14.1f}" for r in results.values()))
+    if "uvloop" in results:
+        print("uvloop speedup")
+        for key in keys:
+            ratio = results["uvloop"][key] / results["asyncio"][key]
+            print(f"{key:<14}{1 / ratio if key.startswith('rtt') else ratio:>27.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Measure the search speed of the Tic Tac Toe engine in nodes per second, against the
+numpy string board it replaced, the time of a move from the solver table and the rate of
+batch evaluation.
+
+Run it from the project root with ``python -m benchmarks.tictactoe``.
+
+This file is part of ouoteam/ouov3 which is released under GNU General Public License v3.0.
+See file LISENCE for full license details.
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import time
+
+import numpy as np
+
+from utils.tictactoe import Batch, Tictactoe
+
+
+class NumpyTictactoe:
+    """
+    The previous engine, a 3×3 numpy array of strings, kept as the baseline.
+    """
+
+    def __init__(self):
+        self.board = np.array([["", "", ""], ["", "", ""], ["", "", ""]])
+        self.nodes = 0
+
+    def get_score(self) -> int:
+        for row in self.board:
+            if all(cell == "X" for cell in row):
+                return 10
+            elif all(cell == "O" for cell in row):
+                return -10
+        for col in range(3):
+            if all(self.board[row][col] == "X" for row in range(3)):
+                return 10
+            elif all(self.board[row][col] == "O" for row in range(3)):
+                return -10
+        if all(self.board[i][i] == "X" for i in range(3)):
+            return 10
+        elif all(self.board[i][i] == "O" for i in range(3)):
+            return -10
+        if all(self.board[i][2 - i] == "X" for i in range(3)):
+            return 10
+        elif all(self.board[i][2 - i] == "O" for i in range(3)):
+            return -10
+        return 0
+
+    def minimax(self, depth: int, is_maximizing: bool) -> int:
+        self.nodes += 1
+        score = self.get_score()
+        if score in [10, -10]:
+            return score - depth
+        if np.all(self.board != ""):
+            return 0
+        best_score = -np.inf if is_maximizing else np.inf
+        for i, j in itertools.product(range(3), range(3)):
+            if self.board[i][j] == "":
+                self.board[i][j] = "X" if is_maximizing else "O"
+                score = self.minimax(depth + 1, not is_maximizing)
+                self.board[i][j] = ""
+                best_score = (max if is_maximizing else min)(score, best_score)
+        return best_score
+
+
+def measure(engine_class: type, rounds: int) -> tuple[float, int, float]:
+    """
+    Search the whole game tree from an empty board.
+
+    :param engine_class: The engine to measure.
+    :type engine_class: type
+    :param rounds: The number of searches, the fastest one is reported.
+    :type rounds: int
+
+    :return: The nodes per second, the nodes per search and the time per search in seconds.
+    :rtype: tuple[float, int, float]
+    """
+    best = float("inf")
+    nodes = 0
+    for _ in range(rounds):
+        engine = engine_class()
+        start = time.perf_counter()
+        engine.minimax(0, True)
+        best = min(best, time.perf_counter() - start)
+        nodes = engine.nodes
+    return nodes / best, nodes, best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--skip-baseline", action="store_true", help="the baseline takes a while")
+    args = parser.parse_args()
+
+    engines = {"bitboard": Tictactoe}
+    if not args.skip_baseline:
+        engines = {"numpy": NumpyTictactoe, **engines}
+    results = {name: measure(engine, args.rounds) for name, engine in engines.items()}
+    print(f"{'':<10}{'nodes/s':>14}{'nodes':>10}{'ms/search':>12}")
+    for name, (rate, nodes, elapsed) in results.items():
+        print(f"{name:<10}{rate:>14,.0f}{nodes:>10}{elapsed * 1000:>12.1f}")
+    if "numpy" in results:
+        print(f"speedup   {results['numpy'][2] / results['bitboard'][2]:>13.1f}x")
+
+    games = 100_000
+    start = time.perf_counter()
+    for _ in range(games):
+        Tictactoe().get_best_move()
+    elapsed = time.perf_counter() - start
+    print(f"table     {games / elapsed:>14,.0f} moves/s {elapsed / games * 1e6:>8.2f} us/move")
+
+    # random boards, not all of them legal, which does not matter for the speed
+    cells = np.random.default_rng(0).integers(0, 3, size=(1_000_000, 9))
+    weights = 1 << np.arange(9, dtype=np.uint64)
+    x = ((cells == 1) * weights).sum(axis=1, dtype=np.uint64)
+    o = ((cells == 2) * weights).sum(axis=1, dtype=np.uint64)
+    start = time.perf_counter()
+    Batch.results(x, o)
+    elapsed = time.perf_counter() - start
+    print(f"batch     {len(x) / elapsed:>14,.0f} boards/s")
+
+
+if __name__ == "__main__":
+    main()
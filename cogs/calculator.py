@@ -6,29 +6,102 @@ See file LISENCE for full license details.
 """
 from __future__ import annotations
 
+import asyncio
+import io
 import operator
 
 import discord
 
+from utils.embed import Embed
+from utils.expression import Expression, ExpressionError
 from utils.i18n import I18n
 from utils.logging import Cog
 
 
+class CalculatorState:
+    """
+    The state of a calculator, kept in its message instead of in memory.
+    The embed shows the current number, and its footer the pending operation, such as ``12 +``,
+    or ``=`` after a result, when the next number replaces it.
+
+    :param result: The current number.
+    :type result: str
+    :param last_number: The left operand of the pending operation.
+    :type last_number: str
+    :param last_operation: The pending operation.
+    :type last_operation: str | None
+    :param clear_next: Whether the next number replaces the current one.
+    :type clear_next: bool
+    """
+
+    __slots__ = ("result", "last_number", "last_operation", "clear_next")
+
+    def __init__(
+        self,
+        result: str = "0",
+        last_number: str = "0",
+        last_operation: str | None = None,
+        clear_next: bool = False,
+    ) -> None:
+        self.result = result
+        self.last_number = last_number
+        self.last_operation = last_operation
+        self.clear_next = clear_next
+
+    @classmethod
+    def from_message(cls, message: discord.Message | None) -> CalculatorState:
+        """
+        Decode the state of a calculator message.
+
+        :param message: The message.
+        :type message: discord.Message | None
+
+        :return: The state, or a cleared state if the message has no calculator embed.
+        :rtype: CalculatorState
+        """
+        if message is None or not message.embeds or not message.embeds[0].description:
+            return cls()
+        embed = message.embeds[0]
+        result = embed.description.strip("`").strip() or "0"
+        footer = embed.footer.text if embed.footer else None
+        if footer == "=":
+            return cls(result, clear_next=True)
+        if footer and " " in footer:
+            last_number, last_operation = footer.rsplit(" ", 1)
+            if last_operation in CalculatorView.ops:
+                return cls(result, last_number, last_operation)
+        return cls(result)
+
+    def to_embed(self) -> discord.Embed:
+        """
+        Encode the state in an embed.
+
+        :return: The embed.
+        :rtype: discord.Embed
+        """
+        embed = discord.Embed(
+            description=f"```{self.result.rjust(30)}```", color=discord.Color.blurple()
+        )
+        if self.clear_next:
+            embed.set_footer(text="=")
+        elif self.last_operation is not None:
+            embed.set_footer(text=f"{self.last_number} {self.last_operation}")
+        return embed
+
+
 class CalculatorView(discord.ui.View):
     """
     The calculator view.
+    It holds no state: a single instance is registered as a persistent view and handles every
+    calculator, reading the state from the message of each interaction, so calculators cost no
+    memory, survive restarts and work in any cluster process.
     """
 
     ops = {"+": operator.add, "-": operator.sub, "×": operator.mul, "÷": operator.truediv}
 
-    def __init__(self, author_id: int, bot: discord.AutoShardedBot):
-        super().__init__()
-        self.author_id: int = author_id
+    def __init__(self, bot: discord.AutoShardedBot):
+        super().__init__(timeout=None)
         self.bot: discord.AutoShardedBot = bot
-        self.result: str = "0"
-        self.last_number: str = "0"
-        self.last_operation: str | None = None
-        self.clear_next: bool = False
 
     def get_locale(self, interaction: discord.Interaction) -> str | None:
         """
@@ -51,17 +124,16 @@ class CalculatorView(discord.ui.View):
         """
         await interaction.response.edit_message()
 
-    async def edit_embed(self, interaction: discord.Interaction) -> None:
+    async def edit_embed(self, interaction: discord.Interaction, state: CalculatorState) -> None:
         """
         Edit the message with the embed.
 
         :param interaction: The interaction.
         :type interaction: discord.Interaction
+        :param state: The new state of the calculator.
+        :type state: CalculatorState
         """
-        embed = discord.Embed(
-            description=f"```{self.result.rjust(30)}```", color=discord.Color.blurple()
-        )
-        await interaction.response.edit_message(embed=embed)
+        await interaction.response.edit_message(embed=state.to_embed())
 
     async def handle_number(
         self, button: discord.ui.Button, interaction: discord.Interaction
@@ -74,13 +146,14 @@ class CalculatorView(discord.ui.View):
         :param interaction: The interaction.
         :type interaction: discord.Interaction
         """
+        state = CalculatorState.from_message(interaction.message)
         number = button.label or "0"
-        if self.clear_next or self.result == "0":
-            self.clear_next = False
-            self.result = number
+        if state.clear_next or state.result == "0":
+            state.clear_next = False
+            state.result = number
         else:
-            self.result += number
-        await self.edit_embed(interaction)
+            state.result += number
+        await self.edit_embed(interaction, state)
 
     async def handle_operation(
         self, button: discord.ui.Button, interaction: discord.Interaction
@@ -93,17 +166,21 @@ class CalculatorView(discord.ui.View):
         :param interaction: The interaction.
         :type interaction: discord.Interaction
         """
-        if self.last_operation is not None:
-            op_func = self.ops[self.last_operation]
-            result = op_func(float(self.last_number), float(self.result))
-            self.last_number = str(round(result, 10)).rstrip("0").rstrip(".")
+        state = CalculatorState.from_message(interaction.message)
+        if state.last_operation is not None:
+            op_func = self.ops[state.last_operation]
+            result = op_func(float(state.last_number), float(state.result))
+            state.last_number = str(round(result, 10)).rstrip("0").rstrip(".")
         else:
-            self.last_number = self.result
-        self.last_operation = button.label
-        self.result = "0"
-        await self.edit_embed(interaction)
-
-    @discord.ui.button(label="AC", style=discord.ButtonStyle.danger)
+            state.last_number = state.result
+        state.last_operation = button.label
+        state.result = "0"
+        state.clear_next = False
+        await self.edit_embed(interaction, state)
+
+    @discord.ui.button(
+        label="AC", style=discord.ButtonStyle.danger, custom_id="calculator:all_clear"
+    )
     async def all_clear(self, _: discord.ui.Button, interaction: discord.Interaction) -> None:
         """
         Handle the all clear button.
@@ -113,12 +190,13 @@ class CalculatorView(discord.ui.View):
         :param interaction: The interaction.
         :type interaction: discord.Interaction
         """
-        self.result = "0"
-        self.last_number = "0"
-        self.last_operation = None
-        await self.edit_embed(interaction)
+        state = CalculatorState.from_message(interaction.message)
+        state.result = "0"
+        state.last_number = "0"
+        state.last_operation = None
+        await self.edit_embed(interaction, state)
 
-    @discord.ui.button(label="C", style=discord.ButtonStyle.danger)
+    @discord.ui.button(label="C", style=discord.ButtonStyle.danger, custom_id="calculator:clear")
     async def clear(self, _: discord.ui.Button, interaction: discord.Interaction) -> None:
         """
         Handle the clear button.
@@ -128,10 +206,13 @@ class CalculatorView(discord.ui.View):
         :param interaction: The interaction.
         :type interaction: discord.Interaction
         """
-        self.result = "0"
-        await self.edit_embed(interaction)
+        state = CalculatorState.from_message(interaction.message)
+        state.result = "0"
+        await self.edit_embed(interaction, state)
 
-    @discord.ui.button(label="←", style=discord.ButtonStyle.primary)
+    @discord.ui.button(
+        label="←", style=discord.ButtonStyle.primary, custom_id="calculator:backspace"
+    )
     async def backspace(self, _: discord.ui.Button, interaction: discord.Interaction) -> None:
         """
         Handle the backspace button.
@@ -141,14 +222,17 @@ class CalculatorView(discord.ui.View):
         :param interaction: The interaction.
         :type interaction: discord.Interaction
         """
-        if self.result == "0":
+        state = CalculatorState.from_message(interaction.message)
+        if state.result == "0":
             return await self.edit_skip(interaction)
-        self.result = self.result[:-1]
-        if self.clear_next or self.result == "":
-            self.result = "0"
-        await self.edit_embed(interaction)
+        state.result = state.result[:-1]
+        if state.clear_next or state.result == "":
+            state.result = "0"
+        await self.edit_embed(interaction, state)
 
-    @discord.ui.button(label="÷", style=discord.ButtonStyle.secondary)
+    @discord.ui.button(
+        label="÷", style=discord.ButtonStyle.secondary, custom_id="calculator:divide"
+    )
     async def divide(self, button: discord.ui.Button, interaction: discord.Interaction) -> None:
         """
         Handle the divide button.
@@ -160,7 +244,9 @@ class CalculatorView(discord.ui.View):
         """
         await self.handle_operation(button, interaction)
 
-    @discord.ui.button(label="1", style=discord.ButtonStyle.success, row=1)
+    @discord.ui.button(
+        label="1", style=discord.ButtonStyle.success, row=1, custom_id="calculator:one"
+    )
     async def one(self, button: discord.ui.Button, interaction: discord.Interaction) -> None:
         """
         Handle the one button.
@@ -172,7 +258,9 @@ class CalculatorView(discord.ui.View):
         """
         await self.handle_number(button, interaction)
 
-    @discord.ui.button(label="2", style=discord.ButtonStyle.success, row=1)
+    @discord.ui.button(
+        label="2", style=discord.ButtonStyle.success, row=1, custom_id="calculator:two"
+    )
     async def two(self, button: discord.ui.Button, interaction: discord.Interaction) -> None:
         """
         Handle the two button.
@@ -184,7 +272,9 @@ class CalculatorView(discord.ui.View):
         """
         await self.handle_number(button, interaction)
 
-    @discord.ui.button(label="3", style=discord.ButtonStyle.success, row=1)
+    @discord.ui.button(
+        label="3", style=discord.ButtonStyle.success, row=1, custom_id="calculator:three"
+    )
     async def three(self, button: discord.ui.Button, interaction: discord.Interaction) -> None:
         """
         Handle the three button.
@@ -196,7 +286,9 @@ class CalculatorView(discord.ui.View):
         """
         await self.handle_number(button, interaction)
 
-    @discord.ui.button(label="×", style=discord.ButtonStyle.secondary, row=1)
+    @discord.ui.button(
+        label="×", style=discord.ButtonStyle.secondary, row=1, custom_id="calculator:multiply"
+    )
     async def multiply(self, button: discord.ui.Button, interaction: discord.Interaction) -> None:
         """
         Handle the multiply button.
@@ -208,7 +300,9 @@ class CalculatorView(discord.ui.View):
         """
         await self.handle_operation(button, interaction)
 
-    @discord.ui.button(label="4", style=discord.ButtonStyle.success, row=2)
+    @discord.ui.button(
+        label="4", style=discord.ButtonStyle.success, row=2, custom_id="calculator:four"
+    )
     async def four(self, button: discord.ui.Button, interaction: discord.Interaction) -> None:
         """
         Handle the four button.
@@ -220,7 +314,9 @@ class CalculatorView(discord.ui.View):
         """
         await self.handle_number(button, interaction)
 
-    @discord.ui.button(label="5", style=discord.ButtonStyle.success, row=2)
+    @discord.ui.button(
+        label="5", style=discord.ButtonStyle.success, row=2, custom_id="calculator:five"
+    )
     async def five(self, button: discord.ui.Button, interaction: discord.Interaction) -> None:
         """
         Handle the five button.
@@ -232,7 +328,9 @@ class CalculatorView(discord.ui.View):
         """
         await self.handle_number(button, interaction)
 
-    @discord.ui.button(label="6", style=discord.ButtonStyle.success, row=2)
+    @discord.ui.button(
+        label="6", style=discord.ButtonStyle.success, row=2, custom_id="calculator:six"
+    )
     async def six(self, button: discord.ui.Button, interaction: discord.Interaction) -> None:
         """
         Handle the six button.
@@ -244,7 +342,9 @@ class CalculatorView(discord.ui.View):
         """
         await self.handle_number(button, interaction)
 
-    @discord.ui.button(label="-", style=discord.ButtonStyle.secondary, row=2)
+    @discord.ui.button(
+        label="-", style=discord.ButtonStyle.secondary, row=2, custom_id="calculator:subtract"
+    )
     async def subtract(self, button: discord.ui.Button, interaction: discord.Interaction) -> None:
         """
         Handle the subtract button.
@@ -256,7 +356,9 @@ class CalculatorView(discord.ui.View):
         """
         await self.handle_operation(button, interaction)
 
-    @discord.ui.button(label="7", style=discord.ButtonStyle.success, row=3)
+    @discord.ui.button(
+        label="7", style=discord.ButtonStyle.success, row=3, custom_id="calculator:seven"
+    )
     async def seven(self, button: discord.ui.Button, interaction: discord.Interaction) -> None:
         """
         Handle the seven button.
@@ -268,7 +370,9 @@ class CalculatorView(discord.ui.View):
         """
         await self.handle_number(button, interaction)
 
-    @discord.ui.button(label="8", style=discord.ButtonStyle.success, row=3)
+    @discord.ui.button(
+        label="8", style=discord.ButtonStyle.success, row=3, custom_id="calculator:eight"
+    )
     async def eight(self, button: discord.ui.Button, interaction: discord.Interaction) -> None:
         """
         Handle the eight button.
@@ -280,7 +384,9 @@ class CalculatorView(discord.ui.View):
         """
         await self.handle_number(button, interaction)
 
-    @discord.ui.button(label="9", style=discord.ButtonStyle.success, row=3)
+    @discord.ui.button(
+        label="9", style=discord.ButtonStyle.success, row=3, custom_id="calculator:nine"
+    )
     async def nine(self, button: discord.ui.Button, interaction: discord.Interaction) -> None:
         """
         Handle the nine button.
@@ -292,7 +398,9 @@ class CalculatorView(discord.ui.View):
         """
         await self.handle_number(button, interaction)
 
-    @discord.ui.button(label="+", style=discord.ButtonStyle.secondary, row=3)
+    @discord.ui.button(
+        label="+", style=discord.ButtonStyle.secondary, row=3, custom_id="calculator:add"
+    )
     async def add(self, button: discord.ui.Button, interaction: discord.Interaction) -> None:
         """
         Handle the add button.
@@ -304,7 +412,9 @@ class CalculatorView(discord.ui.View):
         """
         await self.handle_operation(button, interaction)
 
-    @discord.ui.button(label="+/-", style=discord.ButtonStyle.primary, row=3)
+    @discord.ui.button(
+        label="+/-", style=discord.ButtonStyle.primary, row=3, custom_id="calculator:negate"
+    )
     async def negate(self, _: discord.ui.Button, interaction: discord.Interaction) -> None:
         """
         Handle the negate button.
@@ -314,17 +424,20 @@ class CalculatorView(discord.ui.View):
         :param interaction: The interaction.
         :type interaction: discord.Interaction
         """
-        if self.result == "0":
+        state = CalculatorState.from_message(interaction.message)
+        if state.result == "0":
             return await self.edit_skip(interaction)
-        if self.result.startswith("-"):
-            self.result = self.result[1:]
+        if state.result.startswith("-"):
+            state.result = state.result[1:]
         else:
-            self.result = f"-{self.result}"
-        if self.clear_next:
-            self.clear_next = False
-        await self.edit_embed(interaction)
+            state.result = f"-{state.result}"
+        if state.clear_next:
+            state.clear_next = False
+        await self.edit_embed(interaction, state)
 
-    @discord.ui.button(label="?", style=discord.ButtonStyle.primary, row=4)
+    @discord.ui.button(
+        label="?", style=discord.ButtonStyle.primary, row=4, custom_id="calculator:help"
+    )
     async def help(
         self, _: discord.ui.Button, interaction: discord.Interaction
     ) -> discord.Interaction:
@@ -347,7 +460,9 @@ class CalculatorView(discord.ui.View):
         )
         return await interaction.response.send_message(embed=embed, ephemeral=True)
 
-    @discord.ui.button(label="0", style=discord.ButtonStyle.success, row=4)
+    @discord.ui.button(
+        label="0", style=discord.ButtonStyle.success, row=4, custom_id="calculator:zero"
+    )
     async def zero(self, button: discord.ui.Button, interaction: discord.Interaction) -> None:
         """
         Handle the zero button.
@@ -359,7 +474,9 @@ class CalculatorView(discord.ui.View):
         """
         await self.handle_number(button, interaction)
 
-    @discord.ui.button(label=".", style=discord.ButtonStyle.success, row=4)
+    @discord.ui.button(
+        label=".", style=discord.ButtonStyle.success, row=4, custom_id="calculator:dot"
+    )
     async def dot(self, _: discord.ui.Button, interaction: discord.Interaction) -> None:
         """
         Handle the dot button.
@@ -369,16 +486,19 @@ class CalculatorView(discord.ui.View):
         :param interaction: The interaction.
         :type interaction: discord.Interaction
         """
-        if self.clear_next:
-            self.result = "0."
-            self.clear_next = False
-        elif "." in self.result:
-            await self.edit_skip(interaction)
+        state = CalculatorState.from_message(interaction.message)
+        if state.clear_next:
+            state.result = "0."
+            state.clear_next = False
+        elif "." in state.result:
+            return await self.edit_skip(interaction)
         else:
-            self.result = f"{self.result}."
-        await self.edit_embed(interaction)
+            state.result = f"{state.result}."
+        await self.edit_embed(interaction, state)
 
-    @discord.ui.button(label="=", style=discord.ButtonStyle.secondary, row=4)
+    @discord.ui.button(
+        label="=", style=discord.ButtonStyle.secondary, row=4, custom_id="calculator:equal"
+    )
     async def equal(self, _: discord.ui.Button, interaction: discord.Interaction) -> None:
         """
         Handle the equal button.
@@ -388,17 +508,20 @@ class CalculatorView(discord.ui.View):
         :param interaction: The interaction.
         :type interaction: discord.Interaction
         """
-        if not self.last_operation:
-            await self.edit_skip(interaction)
-        op_func = self.ops[self.last_operation]
-        result = op_func(float(self.last_number), float(self.result))
-        self.result = str(round(result, 10)).rstrip("0").rstrip(".")
-        self.last_number = "0"
-        self.last_operation = None
-        self.clear_next = True
-        await self.edit_embed(interaction)
-
-    @discord.ui.button(label="X", style=discord.ButtonStyle.danger, row=4)
+        state = CalculatorState.from_message(interaction.message)
+        if not state.last_operation:
+            return await self.edit_skip(interaction)
+        op_func = self.ops[state.last_operation]
+        result = op_func(float(state.last_number), float(state.result))
+        state.result = str(round(result, 10)).rstrip("0").rstrip(".")
+        state.last_number = "0"
+        state.last_operation = None
+        state.clear_next = True
+        await self.edit_embed(interaction, state)
+
+    @discord.ui.button(
+        label="X", style=discord.ButtonStyle.danger, row=4, custom_id="calculator:close"
+    )
     async def close(self, _: discord.ui.Button, interaction: discord.Interaction) -> None:
         """
         Handle the close button.
@@ -408,7 +531,6 @@ class CalculatorView(discord.ui.View):
         :param interaction: The interaction.
         :type interaction: discord.Interaction
         """
-        self.stop()
         await interaction.response.edit_message(
             content=I18n.get("calculator.closed", self.get_locale(interaction)),
             embed=None,
@@ -426,7 +548,11 @@ class CalculatorView(discord.ui.View):
         :return: Whether the interaction is valid.
         :rtype: bool
         """
-        return False if interaction.user is None else interaction.user.id == self.author_id
+        # the owner is the user of the slash command the calculator message answers
+        message = interaction.message
+        if interaction.user is None or message is None or message.interaction is None:
+            return False
+        return interaction.user.id == message.interaction.user.id
 
     async def on_check_failure(self, interaction: discord.Interaction) -> discord.Interaction:
         """
@@ -440,7 +566,7 @@ class CalculatorView(discord.ui.View):
         """
         return await interaction.response.send_message(
             I18n.get(
-                "calculator.check_failed",
+                "calculator.check-failed",
                 self.get_locale(interaction),
                 command_id=self.bot.get_command("calculator").id,
             ),
@@ -459,6 +585,13 @@ class CalculatorCog(Cog):
     def __init__(self, bot: discord.AutoShardedBot) -> None:
         self.bot = bot
 
+    @Cog.listener()
+    async def on_ready(self) -> None:
+        """
+        Register the view handling every calculator.
+        """
+        self.bot.add_view(CalculatorView(self.bot))
+
     @discord.slash_command(
         description="Open a calculator.",
         description_localizations={"zh-TW": "開啟一個計算機。", "zh-CN": "开启一个计算器。"},
@@ -477,8 +610,207 @@ class CalculatorCog(Cog):
         msg = await ctx.respond(
             content=I18n.get("calculator.opening", ctx.locale or ctx.guild_locale)
         )
-        embed = discord.Embed(description=f"```{'0'.rjust(30)}```", color=discord.Color.blurple())
-        await msg.edit(content="", embed=embed, view=CalculatorView(ctx.author.id, self.bot))
+        # the registered view handles the buttons, this one only lays them out and is not stored
+        view = CalculatorView(self.bot)
+        view.stop()
+        await msg.edit(content="", embed=CalculatorState().to_embed(), view=view)
+
+    @discord.slash_command(
+        description="Evaluate a math expression.",
+        description_localizations={"zh-TW": "計算數學算式。", "zh-CN": "计算数学算式。"},
+    )
+    @discord.option(
+        name="expression",
+        name_localizations={"zh-TW": "算式", "zh-CN": "算式"},
+        description="The expression, such as (1 + 2) * sqrt(2) ^ 3.",
+        description_localizations={
+            "zh-TW": "要計算的算式，例如 (1 + 2) * sqrt(2) ^ 3。",
+            "zh-CN": "要计算的算式，例如 (1 + 2) * sqrt(2) ^ 3。",
+        },
+        type=str,
+        max_length=Expression.max_length,
+    )
+    async def calc(
+        self, ctx: discord.ApplicationContext, expression: str
+    ) -> discord.Interaction | discord.WebhookMessage:
+        """
+        Evaluate a math expression.
+
+        :param ctx: The context.
+        :type ctx: discord.ApplicationContext
+        :param expression: The expression.
+        :type expression: str
+
+        :return: The response message.
+        :rtype: discord.Interaction | discord.WebhookMessage
+        """
+        locale = ctx.locale or ctx.guild_locale
+        try:
+            result = Expression.format(Expression.evaluate(expression))
+        except ExpressionError as e:
+            return await ctx.respond(
+                embed=Embed.error(I18n.get(f"calculator.calc.errors.{e.key}", locale, **e.kwargs)),
+                ephemeral=True,
+            )
+        # a valid expression has no backticks, it cannot break out of the code block
+        embed = discord.Embed(
+            description=f"```{expression.strip()}\n= {result}```",
+            color=discord.Color.blurple(),
+        )
+        return await ctx.respond(embed=embed)
+
+    @staticmethod
+    def table(
+        expression: str, start: float, stop: float, points: int, csv: bool
+    ) -> tuple[dict[str, str], bytes | None]:
+        """
+        Tabulate an expression and summarize it, this runs in a worker thread.
+
+        :param expression: The expression of x.
+        :type expression: str
+        :param start: The first value of x.
+        :type start: float
+        :param stop: The last value of x.
+        :type stop: float
+        :param points: The number of points.
+        :type points: int
+        :param csv: Whether to write the table as CSV.
+        :type csv: bool
+
+        :raises ExpressionError: If the expression is invalid or exceeds a limit.
+
+        :return: The statistics by locale key, and the CSV if it was requested.
+        :rtype: tuple[dict[str, str], bytes | None]
+        """
+        import numpy as np
+
+        x, y = Expression.tabulate(expression, start, stop, points)
+        defined = np.isfinite(y)
+        stats = {"points": f"{points:,}", "defined": f"{int(defined.sum()):,}"}
+        if defined.any():
+            values = y[defined]
+            low, high = int(np.argmin(values)), int(np.argmax(values))
+            stats["min"] = f"{values[low]:.10g} (x = {x[defined][low]:.10g})"
+            stats["max"] = f"{values[high]:.10g} (x = {x[defined][high]:.10g})"
+            stats["mean"] = f"{values.mean():.10g}"
+            stats["std"] = f"{values.std():.10g}"
+        data = None
+        if csv:
+            buffer = io.BytesIO()
+            np.savetxt(
+                buffer,
+                np.column_stack((x, y)),
+                fmt="%.15g",
+                delimiter=",",
+                header="x,y",
+                comments="",
+            )
+            data = buffer.getvalue()
+        return stats, data
+
+    @discord.slash_command(
+        description="Evaluate an expression of x over a range.",
+        description_localizations={
+            "zh-TW": "在一個範圍內計算 x 的算式。",
+            "zh-CN": "在一个范围内计算 x 的算式。",
+        },
+    )
+    @discord.option(
+        name="expression",
+        name_localizations={"zh-TW": "算式", "zh-CN": "算式"},
+        description="The expression of x, such as sin(x) * x ^ 2.",
+        description_localizations={
+            "zh-TW": "x 的算式，例如 sin(x) * x ^ 2。",
+            "zh-CN": "x 的算式，例如 sin(x) * x ^ 2。",
+        },
+        type=str,
+        max_length=Expression.max_length,
+    )
+    @discord.option(
+        name="start",
+        name_localizations={"zh-TW": "起點", "zh-CN": "起点"},
+        description="The first value of x.",
+        description_localizations={"zh-TW": "x 的第一個值。", "zh-CN": "x 的第一个值。"},
+        type=float,
+    )
+    @discord.option(
+        name="stop",
+        name_localizations={"zh-TW": "終點", "zh-CN": "终点"},
+        description="The last value of x.",
+        description_localizations={"zh-TW": "x 的最後一個值。", "zh-CN": "x 的最后一个值。"},
+        type=float,
+    )
+    @discord.option(
+        name="points",
+        name_localizations={"zh-TW": "點數", "zh-CN": "点数"},
+        description="The number of evenly spaced values of x.",
+        description_localizations={
+            "zh-TW": "x 的等距取值數量。",
+            "zh-CN": "x 的等距取值数量。",
+        },
+        type=int,
+        min_value=2,
+        max_value=Expression.max_points,
+        default=1000,
+    )
+    @discord.option(
+        name="csv",
+        description="Attach the table as a CSV file.",
+        description_localizations={
+            "zh-TW": "以 CSV 檔案附上表格。",
+            "zh-CN": "以 CSV 文件附上表格。",
+        },
+        type=bool,
+        default=False,
+    )
+    async def tabulate(
+        self,
+        ctx: discord.ApplicationContext,
+        expression: str,
+        start: float,
+        stop: float,
+        points: int = 1000,
+        csv: bool = False,
+    ) -> discord.Interaction | discord.WebhookMessage:
+        """
+        Evaluate an expression of x over a range, and summarize it or attach it as CSV.
+
+        :param ctx: The context.
+        :type ctx: discord.ApplicationContext
+        :param expression: The expression of x.
+        :type expression: str
+        :param start: The first value of x.
+        :type start: float
+        :param stop: The last value of x.
+        :type stop: float
+        :param points: The number of points.
+        :type points: int
+        :param csv: Whether to attach the table as CSV.
+        :type csv: bool
+
+        :return: The response message.
+        :rtype: discord.Interaction | discord.WebhookMessage
+        """
+        locale = ctx.locale or ctx.guild_locale
+        await ctx.defer()
+        try:
+            stats, data = await asyncio.to_thread(self.table, expression, start, stop, points, csv)
+        except ExpressionError as e:
+            return await ctx.respond(
+                embed=Embed.error(I18n.get(f"calculator.calc.errors.{e.key}", locale, **e.kwargs))
+            )
+        embed = discord.Embed(
+            title=I18n.get("calculator.table.title", locale),
+            description=f"```y = {expression.strip()}, x ∈ [{start:g}, {stop:g}]```",
+            color=discord.Color.blurple(),
+        )
+        for key, value in stats.items():
+            embed.add_field(name=I18n.get(f"calculator.table.{key}", locale), value=value)
+        if data is None:
+            return await ctx.respond(embed=embed)
+        return await ctx.respond(
+            embed=embed, file=discord.File(io.BytesIO(data), filename="table.csv")
+        )
 
 
 def setup(bot: discord.AutoShardedBot) -> None:
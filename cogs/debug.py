@@ -0,0 +1,384 @@
+"""
+The cog module for the owner-only diagnostic commands.
+
+This file is part of ouoteam/ouov3 which is released under GNU General Public License v3.0.
+See file LISENCE for full license details.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import datetime
+import threading
+import tracemalloc
+from io import StringIO
+
+import discord
+
+from utils.embed import Color, Embed
+from utils.i18n import I18n
+from utils.logging import Cog
+from utils.profiling import Memory, Sampler
+
+
+class Debug(Cog):
+    """
+    Diagnostic commands for the bot owners.
+
+    :param bot: The bot instance.
+    :type bot: discord.AutoShardedBot
+    """
+
+    debug = discord.SlashCommandGroup(
+        "debug",
+        "Diagnostic commands for the bot owners.",
+        default_member_permissions=discord.Permissions(administrator=True),
+    )
+    memory = debug.create_subgroup("memory", "Inspect the memory usage of the bot.")
+
+    def __init__(self, bot: discord.AutoShardedBot) -> None:
+        self.bot = bot
+
+    async def cog_check(self, ctx: discord.ApplicationContext) -> bool:
+        """
+        Only allow the bot owners to use the commands in this cog.
+
+        :param ctx: The context of the command.
+        :type ctx: discord.ApplicationContext
+
+        :return: Whether the user is an owner of the bot.
+        :rtype: bool
+        """
+        return await self.bot.is_owner(ctx.author)
+
+    async def cog_command_error(
+        self, ctx: discord.ApplicationContext, error: discord.DiscordException
+    ) -> None:
+        """
+        Handle the errors raised by the commands in this cog.
+
+        :param ctx: The context of the command.
+        :type ctx: discord.ApplicationContext
+        :param error: The error raised.
+        :type error: discord.DiscordException
+        """
+        if isinstance(error, discord.CheckFailure):
+            await ctx.respond(
+                embed=Embed.error(I18n.get("debug.not_owner", ctx.locale or ctx.guild_locale)),
+                ephemeral=True,
+            )
+        else:
+            self.logger.opt(exception=error).error(f"執行除錯指令 {ctx.command} 時出現錯誤")
+            # the commands defer first, respond follows up in that case
+            with contextlib.suppress(discord.HTTPException):
+                await ctx.respond(
+                    embed=Embed.error(
+                        I18n.get(
+                            "debug.failed",
+                            ctx.locale or ctx.guild_locale,
+                            error=type(getattr(error, "original", error)).__name__,
+                        )
+                    ),
+                    ephemeral=True,
+                )
+
+    async def send_report(
+        self, ctx: discord.ApplicationContext, title: str, report: str
+    ) -> discord.Interaction | discord.WebhookMessage:
+        """
+        Send a plain text report, as an attachment if it is too long for an embed.
+
+        :param ctx: The context of the command.
+        :type ctx: discord.ApplicationContext
+        :param title: The title of the report.
+        :type title: str
+        :param report: The report.
+        :type report: str
+
+        :return: The message sent.
+        :rtype: discord.Interaction | discord.WebhookMessage
+        """
+        if len(report) > 4000:
+            return await ctx.respond(title, file=discord.File(StringIO(report), "report.txt"))
+        return await ctx.respond(
+            embed=discord.Embed(
+                title=title, description=f"```\n{report}\n```", color=Color.invisible()
+            )
+        )
+
+    @memory.command(
+        name="stats",
+        description="Show the memory usage of the bot.",
+        description_localizations={"zh-TW": "顯示機器人的記憶體使用量", "zh-CN": "显示机器人的内存使用量"},
+    )
+    async def memory_stats(
+        self, ctx: discord.ApplicationContext
+    ) -> discord.Interaction | discord.WebhookMessage:
+        """
+        Show the memory usage of the bot.
+
+        :param ctx: The context of the command.
+        :type ctx: discord.ApplicationContext
+
+        :return: The message sent.
+        :rtype: discord.Interaction | discord.WebhookMessage
+        """
+        await ctx.defer(ephemeral=True)
+        locale = ctx.locale or ctx.guild_locale
+        report = I18n.get("debug.memory.rss", locale, rss=f"{Memory.rss() / 1024 ** 2:.2f}")
+        if Memory.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            report += "\n" + I18n.get(
+                "debug.memory.traced",
+                locale,
+                current=f"{current / 1024 ** 2:.2f}",
+                peak=f"{peak / 1024 ** 2:.2f}",
+                snapshots=len(Memory.snapshots),
+            )
+        else:
+            report += "\n" + I18n.get("debug.memory.not_tracing", locale)
+        return await ctx.respond(embed=discord.Embed(description=report, color=Color.invisible()))
+
+    @memory.command(
+        name="snapshot",
+        description="Take a snapshot of the traced memory allocations.",
+        description_localizations={"zh-TW": "擷取記憶體配置快照", "zh-CN": "截取内存分配快照"},
+    )
+    async def memory_snapshot(
+        self, ctx: discord.ApplicationContext
+    ) -> discord.Interaction | discord.WebhookMessage:
+        """
+        Take a snapshot of the traced memory allocations.
+
+        :param ctx: The context of the command.
+        :type ctx: discord.ApplicationContext
+
+        :return: The message sent.
+        :rtype: discord.Interaction | discord.WebhookMessage
+        """
+        await ctx.defer(ephemeral=True)
+        locale = ctx.locale or ctx.guild_locale
+        if not Memory.is_tracing():
+            return await ctx.respond(
+                embed=Embed.error(I18n.get("debug.memory.not_tracing", locale))
+            )
+
+        def snapshot() -> int:
+            return sum(stat.size for stat in Memory.take_snapshot().statistics("filename"))
+
+        # a snapshot of a large heap takes seconds, long enough to miss the gateway heartbeats
+        size = await asyncio.to_thread(snapshot)
+        return await ctx.respond(
+            embed=Embed.success(
+                I18n.get(
+                    "debug.memory.snapshot",
+                    locale,
+                    size=f"{size / 1024 ** 2:.2f}",
+                    snapshots=len(Memory.snapshots),
+                )
+            )
+        )
+
+    @memory.command(
+        name="top",
+        description="Show the top allocating sites of the latest snapshot.",
+        description_localizations={"zh-TW": "顯示最新快照中配置最多記憶體的位置", "zh-CN": "显示最新快照中分配最多内存的位置"},
+    )
+    @discord.option(
+        name="limit",
+        type=int,
+        description="The number of sites to show.",
+        description_localizations={"zh-TW": "要顯示的位置數量", "zh-CN": "要显示的位置数量"},
+        min_value=1,
+        max_value=50,
+    )
+    @discord.option(
+        name="group_by",
+        type=str,
+        description="How to group the allocations.",
+        description_localizations={"zh-TW": "配置的分組方式", "zh-CN": "分配的分组方式"},
+        choices=["lineno", "filename", "traceback"],
+    )
+    async def memory_top(
+        self, ctx: discord.ApplicationContext, limit: int = 10, group_by: str = "lineno"
+    ) -> discord.Interaction | discord.WebhookMessage:
+        """
+        Show the top allocating sites of the latest snapshot.
+
+        :param ctx: The context of the command.
+        :type ctx: discord.ApplicationContext
+        :param limit: The number of sites to show.
+        :type limit: int
+        :param group_by: How to group the allocations.
+        :type group_by: str
+
+        :return: The message sent.
+        :rtype: discord.Interaction | discord.WebhookMessage
+        """
+        await ctx.defer(ephemeral=True)
+        locale = ctx.locale or ctx.guild_locale
+        if not Memory.is_tracing():
+            return await ctx.respond(
+                embed=Embed.error(I18n.get("debug.memory.not_tracing", locale))
+            )
+        stats = await asyncio.to_thread(Memory.top, limit, group_by)
+        report = Memory.format_statistics(stats)
+        return await self.send_report(ctx, I18n.get("debug.memory.top", locale), report)
+
+    @memory.command(
+        name="diff",
+        description="Compare the two latest snapshots.",
+        description_localizations={"zh-TW": "比較最新的兩個快照", "zh-CN": "比较最新的两个快照"},
+    )
+    @discord.option(
+        name="limit",
+        type=int,
+        description="The number of sites to show.",
+        description_localizations={"zh-TW": "要顯示的位置數量", "zh-CN": "要显示的位置数量"},
+        min_value=1,
+        max_value=50,
+    )
+    @discord.option(
+        name="group_by",
+        type=str,
+        description="How to group the allocations.",
+        description_localizations={"zh-TW": "配置的分組方式", "zh-CN": "分配的分组方式"},
+        choices=["lineno", "filename", "traceback"],
+    )
+    async def memory_diff(
+        self, ctx: discord.ApplicationContext, limit: int = 10, group_by: str = "lineno"
+    ) -> discord.Interaction | discord.WebhookMessage:
+        """
+        Compare the two latest snapshots.
+
+        :param ctx: The context of the command.
+        :type ctx: discord.ApplicationContext
+        :param limit: The number of sites to show.
+        :type limit: int
+        :param group_by: How to group the allocations.
+        :type group_by: str
+
+        :return: The message sent.
+        :rtype: discord.Interaction | discord.WebhookMessage
+        """
+        await ctx.defer(ephemeral=True)
+        locale = ctx.locale or ctx.guild_locale
+        if not Memory.is_tracing():
+            return await ctx.respond(
+                embed=Embed.error(I18n.get("debug.memory.not_tracing", locale))
+            )
+        try:
+            stats = await asyncio.to_thread(Memory.diff, limit, group_by)
+        except ValueError:
+            return await ctx.respond(
+                embed=Embed.error(I18n.get("debug.memory.not_enough_snapshots", locale))
+            )
+        report = Memory.format_statistics(stats)
+        return await self.send_report(ctx, I18n.get("debug.memory.diff", locale), report)
+
+    @debug.command(
+        name="loop",
+        description="Show the event loop lag and the heartbeat latency of each shard.",
+        description_localizations={"zh-TW": "顯示事件迴圈延遲與各分片的心跳延遲", "zh-CN": "显示事件循环延迟与各分片的心跳延迟"},
+    )
+    async def loop(
+        self, ctx: discord.ApplicationContext
+    ) -> discord.Interaction | discord.WebhookMessage:
+        """
+        Show the event loop lag and the heartbeat latency of each shard.
+
+        :param ctx: The context of the command.
+        :type ctx: discord.ApplicationContext
+
+        :return: The message sent.
+        :rtype: discord.Interaction | discord.WebhookMessage
+        """
+        await ctx.defer(ephemeral=True)
+        locale = ctx.locale or ctx.guild_locale
+        watchdog = self.bot.watchdog
+        lines = [
+            I18n.get(
+                "debug.loop.lag",
+                locale,
+                lag=f"{watchdog.lag * 1000:.2f}",
+                average=f"{watchdog.average_lag * 1000:.2f}",
+                max=f"{watchdog.max_lag * 1000:.2f}",
+            ),
+            I18n.get(
+                "debug.loop.slow_callbacks",
+                locale,
+                count=watchdog.slow_callbacks,
+                threshold=f"{watchdog.threshold * 1000:.0f}",
+            ),
+        ]
+        lines.extend(f"  {stalled * 1000:>8.0f} ms  {name}" for stalled, name in watchdog.recent)
+        lines.append(I18n.get("debug.loop.shards", locale))
+        lines.extend(
+            f"  #{shard_id:<4} {latency * 1000:>8.2f} ms"
+            for shard_id, latency in self.bot.latencies
+        )
+        return await self.send_report(ctx, I18n.get("debug.loop.title", locale), "\n".join(lines))
+
+    @debug.command(
+        name="profile",
+        description="Sample the event loop thread and return a flamegraph compatible profile.",
+        description_localizations={
+            "zh-TW": "取樣事件迴圈執行緒並回傳火焰圖格式的分析結果",
+            "zh-CN": "采样事件循环线程并返回火焰图格式的分析结果",
+        },
+    )
+    @discord.option(
+        name="seconds",
+        type=int,
+        description="How long to sample for.",
+        description_localizations={"zh-TW": "取樣的秒數", "zh-CN": "采样的秒数"},
+        min_value=1,
+        max_value=120,
+    )
+    @discord.option(
+        name="interval",
+        type=int,
+        description="The interval between two samples in milliseconds.",
+        description_localizations={"zh-TW": "兩次取樣之間的毫秒數", "zh-CN": "两次采样之间的毫秒数"},
+        min_value=1,
+        max_value=100,
+    )
+    async def profile(
+        self, ctx: discord.ApplicationContext, seconds: int = 10, interval: int = 5
+    ) -> discord.Interaction | discord.WebhookMessage:
+        """
+        Sample the event loop thread and return a flamegraph compatible profile.
+
+        :param ctx: The context of the command.
+        :type ctx: discord.ApplicationContext
+        :param seconds: How long to sample for.
+        :type seconds: int
+        :param interval: The interval between two samples in milliseconds.
+        :type interval: int
+
+        :return: The message sent.
+        :rtype: discord.Interaction | discord.WebhookMessage
+        """
+        await ctx.defer(ephemeral=True)
+        locale = ctx.locale or ctx.guild_locale
+        try:
+            stacks, samples = await asyncio.to_thread(
+                Sampler.profile, threading.get_ident(), seconds, interval / 1000
+            )
+        except RuntimeError:
+            return await ctx.respond(embed=Embed.error(I18n.get("debug.profile.running", locale)))
+        filename = f"profile-{datetime.datetime.now():%Y%m%d-%H%M%S}.folded"
+        return await ctx.respond(
+            I18n.get("debug.profile.done", locale, samples=samples, seconds=seconds),
+            file=discord.File(StringIO(stacks), filename),
+        )
+
+
+def setup(bot: discord.AutoShardedBot) -> None:
+    """
+    The setup function for the cog.
+
+    :param bot: The bot instance.
+    :type bot: discord.AutoShardedBot
+    """
+    bot.add_cog(Debug(bot))
@@ -11,7 +11,6 @@ from io import BytesIO, StringIO
 from random import choice, randint
 from urllib.parse import quote_plus
 
-import aiofiles
 import aiohttp
 import discord
 import orjson
@@ -21,6 +20,8 @@ from utils.i18n import I18n
 from utils.logging import Cog
 from utils.utils import Utils
 
+aiofiles = Utils.lazy_import("aiofiles")
+
 
 class Fun(Cog):
     """
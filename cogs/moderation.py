@@ -17,6 +17,7 @@ from discord import (
 from discord.ui import InputText, Modal
 
 from utils.logging import Cog
+from utils.members import MemberCache
 
 
 class ReasonModalActionType(Enum):
@@ -79,7 +80,7 @@ class ModerationView(discord.ui.View):
 
     @discord.ui.button(label="踢出", style=discord.ButtonStyle.red)
     async def kick(self, button: discord.ui.Button, interaction: Interaction):
-        if not interaction.guild.get_member(self.user.id):
+        if not await MemberCache.get_member(interaction.guild, self.user.id):
             await interaction.response.send_message("❌ 不能對非伺服器成員進行踢出操作", ephemeral=True)
 
             return
@@ -88,7 +89,7 @@ class ModerationView(discord.ui.View):
 
     @discord.ui.button(label="禁言", style=discord.ButtonStyle.red)
     async def mute(self, button: discord.ui.Button, interaction: Interaction):
-        if not interaction.guild.get_member(self.user.id):
+        if not await MemberCache.get_member(interaction.guild, self.user.id):
             await interaction.response.send_message("❌ 不能對非伺服器成員進行禁言操作", ephemeral=True)
 
             return
@@ -128,7 +129,9 @@ class Moderation(Cog):
             return
 
         if not bool(user):
-            user = interaction.guild.get_member(int(user_id)) or self.bot.get_user(user_id)
+            user = await MemberCache.get_member(
+                interaction.guild, int(user_id)
+            ) or await self.bot.get_or_fetch_user(int(user_id))
 
         await interaction.response.send_message(
             embed=Embed(
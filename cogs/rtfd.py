@@ -6,30 +6,114 @@ See file LISENCE for full license details.
 """
 from __future__ import annotations
 
-from typing import List
+import asyncio
+import functools
+from typing import Dict, List, NamedTuple, Tuple
 from urllib.parse import quote
 
+import aiohttp
 import discord
-from discord.ext import pages
 
 from utils.embed import Color, Embed
 from utils.i18n import I18n
+from utils.inventory import InventoryIndex, Symbol
 from utils.logging import Cog
+from utils.paginator import LazyPaginator
 from utils.utils import Utils
 
 
+class Project(NamedTuple):
+    """
+    A documentation searchable with /rtfd.
+    """
+
+    name: str
+    url: str
+    icon: str
+    # the readthedocs search API, with a ``{query}`` placeholder
+    api: str
+
+
+class SearchResult(NamedTuple):
+    """
+    A page found by the readthedocs search API.
+    """
+
+    title: str
+    url: str
+    # the name, role, description and anchor of every documented object of the page
+    blocks: Tuple[Tuple[str, str, str, str], ...]
+
+
 class Rtfd(Cog):
     """
     Docs searching commands.
+    The API objects of every project are searched in an :class:`InventoryIndex` of their
+    ``objects.inv``, the readthedocs search API is only asked when no name matched exactly, by
+    prefix or by substring. Fuzzy matches are only suggested by the autocompletion.
 
     :param bot: The bot instance.
     :type bot: discord.AutoShardedBot
+
+    :cvar projects: The projects, by the name of their subcommand group.
+    :vartype projects: Dict[str, Project]
     """
 
     vaild_projects = ["interactionspy", "discordpy", "pycord", "disnake", "nextcord"]
+    projects: Dict[str, Project] = {
+        "pycord": Project(
+            "Pycord",
+            "https://docs.pycord.dev/en/stable/",
+            "https://avatars.githubusercontent.com/u/89700626?s=200&v=4",
+            "https://docs.pycord.dev/_/api/v2/search/?q={query}&project=pycord&version=stable&language=en",
+        ),
+        "dpy": Project(
+            "discord.py",
+            "https://discordpy.readthedocs.io/en/stable/",
+            "https://truth.bahamut.com.tw/s01/202106/f394bbeb4bfac8abdfafe49dbfd0427d.PNG",
+            "https://discordpy.readthedocs.io/_/api/v2/search/?q={query}&project=discordpy&version=stable&language=en",
+        ),
+        "ipy": Project(
+            "interactions.py",
+            "https://interactionspy.readthedocs.io/en/latest/",
+            "https://avatars.githubusercontent.com/u/98242689?s=200&v=4",
+            "https://interactionspy.readthedocs.io/_/api/v2/search/?q={query}&project=interactionspy&version=latest&language=en",
+        ),
+        "nextcord": Project(
+            "nextcord",
+            "https://docs.nextcord.dev/en/stable/",
+            "https://avatars.githubusercontent.com/u/89693200?s=200&v=4",
+            "https://docs.nextcord.dev/_/api/v2/search/?q={query}&project=nextcord&version=latest&language=en",
+        ),
+        "disnake": Project(
+            "disnake",
+            "https://disnake.readthedocs.io/en/latest/",
+            "https://avatars.githubusercontent.com/u/93640097?s=200&v=4",
+            "https://docs.disnake.dev/_/api/v2/search/?q={query}&project=disnake&version=latest&language=en",
+        ),
+    }
+    # the number of objects listed in the answer of the index
+    index_results = 10
+    # how long /rtfd all search waits for the search API of the projects missing in the index
+    all_timeout = 5.0
+    # the number of objects listed in the answer of /rtfd all search
+    all_results = 15
 
     def __init__(self, bot: discord.AutoShardedBot) -> None:
         self.bot = bot
+        self.index = InventoryIndex(
+            {slug: project.url for slug, project in self.projects.items()}, "data/inventory"
+        )
+
+    def cog_unload(self) -> None:
+        self.index.stop()
+
+    @Cog.listener()
+    async def on_ready(self) -> None:
+        """
+        Load the cached inventories and start refreshing them.
+        """
+        self.index.start()
 
     def escape_md(self, string: str) -> str:
         """
@@ -45,49 +129,191 @@ class Rtfd(Cog):
             string.replace("*", "\\*").replace("_", "\\_").replace("`", "\\`").replace("~", "\\~")
         )
 
-    def get_embeds(
-        self, data: dict, name: str, url: str, icon: str, locale: str | None
-    ) -> List[discord.Embed]:
+    def get_results(self, data: dict | int) -> List[SearchResult]:
         """
-        Return a list of Embeds from the given data.
+        Keep the pages of the given search API data having documented objects.
 
-        :param data: The data to convert.
-        :type data: dict
-        :param name: The name of the library.
-        :type name: str
-        :param url: The url of the library.
-        :type url: str
-        :param icon: The icon of the library.
-        :type icon: str
-        :param locale: The locale of the response.
-        :type locale: str
+        :param data: The data to convert, or the status code of a failed request.
+        :type data: dict | int
 
-        :return: The list of Embeds.
-        :rtype: List[discord.Embed]
+        :return: The list of pages.
+        :rtype: List[SearchResult]
         """
+        if not isinstance(data, dict):
+            return []
         results = []
-        link_text = I18n.get("rtfd.link_text", locale)
-        for i in data["results"]:
+        for i in data.get("results", []):
             if i["project"] not in self.vaild_projects:
                 continue
-            eb = discord.Embed(
-                title=i["title"], url=f"""{i["domain"]}{i["path"]}""", color=Color.random()
+            blocks = tuple(
+                # the roles of the API have the domain, like py:method
+                (j["name"], j.get("role", "").rpartition(":")[2], j["content"], j["id"])
+                for j in i["blocks"]
+                if j["type"] == "domain"
             )
-            eb.set_author(name=name, url=url, icon_url=icon)
-            for j in i["blocks"]:
-                if j["type"] == "domain":
-                    content = self.escape_md(j["content"])
-                    link = f"""\n[[{link_text}]({i["domain"]}{i["path"]}#{j["id"]})]"""
-                    if len(content) + len(link) > 1024:
-                        content = f"{content[:1020 - len(link)]}..."
-                    content += link
-                    eb.add_field(name=j["name"], value=content, inline=False)
-            if eb.fields:
-                results.append(eb)
+            if blocks:
+                results.append(SearchResult(i["title"], f"""{i["domain"]}{i["path"]}""", blocks))
         return results
 
+    def get_embed(
+        self, result: SearchResult, project: Project, locale: str | None
+    ) -> discord.Embed:
+        """
+        Return an Embed of a page found by the search API.
+
+        :param result: The page.
+        :type result: SearchResult
+        :param project: The project.
+        :type project: Project
+        :param locale: The locale of the response.
+        :type locale: str
+
+        :return: The Embed.
+        :rtype: discord.Embed
+        """
+        link_text = I18n.get("rtfd.link_text", locale)
+        eb = discord.Embed(title=result.title, url=result.url, color=Color.random())
+        eb.set_author(name=project.name, url=project.url, icon_url=project.icon)
+        for name, _, content, anchor in result.blocks:
+            content = self.escape_md(content)
+            link = f"\n[[{link_text}]({result.url}#{anchor})]"
+            if len(content) + len(link) > 1024:
+                content = f"{content[:1020 - len(link)]}..."
+            content += link
+            eb.add_field(name=name, value=content, inline=False)
+        return eb
+
+    def index_embed(
+        self, project: Project, query: str, symbols: List[Symbol], locale: str | None
+    ) -> discord.Embed:
+        """
+        Return an Embed listing the objects found in the index.
+
+        :param project: The project.
+        :type project: Project
+        :param query: The query.
+        :type query: str
+        :param symbols: The objects.
+        :type symbols: List[Symbol]
+        :param locale: The locale of the response.
+        :type locale: str
+
+        :return: The Embed.
+        :rtype: discord.Embed
+        """
+        eb = discord.Embed(
+            title=I18n.get("rtfd.index_title", locale, query=query[:200]),
+            description="\n".join(
+                f"[`{symbol.name}`]({symbol.url}) {symbol.role}" for symbol in symbols
+            ),
+            color=Color.random(),
+        )
+        eb.set_author(name=project.name, url=project.url, icon_url=project.icon)
+        return eb
+
+    async def _query_autocomplete(
+        self, ctx: discord.AutocompleteContext
+    ) -> List[discord.OptionChoice]:
+        """
+        Autocomplete for the query option, from the index of the project of the command.
+
+        :param ctx: The context of the autocomplete.
+        :type ctx: discord.AutocompleteContext
+
+        :return: The list of choices.
+        :rtype: List[discord.OptionChoice]
+        """
+        if not ctx.value:
+            return []
+        project = ctx.command.parent.name
+        names: Dict[str, None] = {}
+        for slug in self.projects if project == "all" else [project]:
+            inventory = self.index.get(slug)
+            if inventory is not None:
+                for symbol in inventory.search(ctx.value):
+                    names[symbol.name] = None
+        # choices are limited to 100 characters, longer names are left to the search
+        return [
+            discord.OptionChoice(name=name, value=name)
+            for name in sorted(names, key=lambda name: self.relevance(ctx.value, name))[:25]
+            if len(name) <= 100
+        ]
+
+    @staticmethod
+    def relevance(query: str, name: str) -> int:
+        """
+        Rank how well a name matches a query, the lower the better, to compare the results of
+        different projects.
+
+        :param query: The query.
+        :type query: str
+        :param name: The name of the result.
+        :type name: str
+
+        :return: 0 for an exact match, 1 for a prefix, 2 for a substring and 3 for anything else,
+            the last component of the name matching like the whole name.
+        :rtype: int
+        """
+        query, name = query.strip().lower(), name.lower()
+        tail = name.rsplit(".", 1)[-1]
+        if query in (name, tail):
+            return 0
+        if name.startswith(query) or tail.startswith(query):
+            return 1
+        if query in name:
+            return 2
+        return 3
+
+    async def _api_search(self, project: str, query: str) -> List[Symbol]:
+        """
+        Search the docs of a project with the readthedocs search API.
+        This is an internal method for the /rtfd all search command.
+
+        :param project: The name of the subcommand group of the project.
+        :type project: str
+        :param query: The query to search for.
+        :type query: str
+
+        :return: The documented objects found, most relevant first.
+        :rtype: List[Symbol]
+        """
+        try:
+            data = await Utils.api_request(self.projects[project].api.format(query=quote(query)))
+        except (aiohttp.ClientError, ValueError) as e:
+            self.logger.warning(f"無法搜尋 {project} 的文檔: {e!r}")
+            return []
+        return [
+            Symbol(name, role, f"{result.url}#{anchor}")
+            for result in self.get_results(data)
+            for name, role, _, anchor in result.blocks
+        ]
+
+    def merge(self, query: str, results: Dict[str, List[Symbol]]) -> List[Tuple[str, Symbol]]:
+        """
+        Merge the results of several projects by relevance, dropping the duplicated links.
+
+        :param query: The query.
+        :type query: str
+        :param results: The results of every project, most relevant first.
+        :type results: Dict[str, List[Symbol]]
+
+        :return: The project and the result, most relevant first.
+        :rtype: List[Tuple[str, Symbol]]
+        """
+        ranked = sorted(
+            (self.relevance(query, symbol.name), rank, order, project, symbol)
+            for order, project in enumerate(self.projects)
+            for rank, symbol in enumerate(results.get(project, []))
+        )
+        merged, seen = [], set()
+        for _, _, _, project, symbol in ranked:
+            if symbol.url not in seen:
+                seen.add(symbol.url)
+                merged.append((project, symbol))
+        return merged
+
     async def _docs_search(
-        self, ctx: discord.ApplicationContext, query_url: str, name: str, url: str, icon: str
+        self, ctx: discord.ApplicationContext, project: str, query: str
     ) -> discord.Message | discord.Interaction | discord.WebhookMessage:
         """
         Search the docs for a specific query.
@@ -95,33 +321,106 @@ class Rtfd(Cog):
 
         :param ctx: The context of the command.
         :type ctx: discord.ApplicationContext
+        :param project: The name of the subcommand group of the project.
+        :type project: str
         :param query: The query to search for.
         :type query: str
-        :param name: The name of the library.
-        :type name: str
-        :param url: The url of the library.
-        :type url: str
-        :param icon: The icon of the library.
-        :type icon: str
 
         :return: The message sent.
         :rtype: discord.Message | discord.Interaction | discord.WebhookMessage
         """
+        locale = ctx.locale or ctx.guild_locale
+        info = self.projects[project]
+        inventory = self.index.get(project)
+        symbols = (
+            inventory.search(query, self.index_results, fuzzy=False)
+            if inventory is not None
+            else []
+        )
+        if symbols:
+            return await ctx.respond(embed=self.index_embed(info, query, symbols, locale))
         await ctx.defer()
-        data = await Utils.api_request(query_url)
-        results = self.get_embeds(data, name, url, icon, ctx.locale or ctx.guild_locale)
+        data = await Utils.api_request(info.api.format(query=quote(query)))
+        results = self.get_results(data)
+        render = functools.partial(self.get_embed, project=info, locale=locale)
         if not results:
             return await ctx.respond(
                 embed=Embed.error(
-                    I18n.get("rtfd.no_results", ctx.locale or ctx.guild_locale),
+                    I18n.get("rtfd.no_results", locale),
                 )
             )
         elif len(results) == 1:
-            return await ctx.respond(embed=results[0])
+            return await ctx.respond(embed=render(results[0]))
         else:
-            paginator = pages.Paginator(results)
+            # most users only look at the first pages, the others are built when they are shown
+            paginator = LazyPaginator(results, render)
             return await paginator.respond(ctx.interaction)
 
+    async def _all_search(
+        self, ctx: discord.ApplicationContext, query: str
+    ) -> discord.Interaction | discord.WebhookMessage:
+        """
+        Search the docs of every project for a specific query.
+        The projects missing in the index are searched concurrently with the search API, and
+        the ones not answering within :attr:`all_timeout` are left out.
+        This is an internal method for the rtfd command response.
+
+        :param ctx: The context of the command.
+        :type ctx: discord.ApplicationContext
+        :param query: The query to search for.
+        :type query: str
+
+        :return: The message sent.
+        :rtype: discord.Interaction | discord.WebhookMessage
+        """
+        locale = ctx.locale or ctx.guild_locale
+        results: Dict[str, List[Symbol]] = {}
+        missing = []
+        for project in self.projects:
+            inventory = self.index.get(project)
+            symbols = (
+                inventory.search(query, self.index_results, fuzzy=False)
+                if inventory is not None
+                else []
+            )
+            if symbols:
+                results[project] = symbols
+            else:
+                missing.append(project)
+        timed_out = []
+        if missing:
+            await ctx.defer()
+            tasks = {asyncio.create_task(self._api_search(p, query)): p for p in missing}
+            done, pending = await asyncio.wait(tasks, timeout=self.all_timeout)
+            for task in done:
+                results[tasks[task]] = task.result()
+            for task in pending:
+                task.cancel()
+                timed_out.append(self.projects[tasks[task]].name)
+        merged = self.merge(query, results)[: self.all_results]
+        if not merged:
+            return await ctx.respond(embed=Embed.error(I18n.get("rtfd.no_results", locale)))
+        lines = []
+        length = 0
+        for project, symbol in merged:
+            line = (
+                f"**{self.projects[project].name}** [`{symbol.name}`]({symbol.url}) {symbol.role}"
+            )
+            length += len(line) + 1
+            if length > 4096:
+                break
+            lines.append(line)
+        eb = discord.Embed(
+            title=I18n.get("rtfd.index_title", locale, query=query[:200]),
+            description="\n".join(lines),
+            color=Color.random(),
+        )
+        if timed_out:
+            eb.set_footer(
+                text=I18n.get("rtfd.timed_out", locale, projects=", ".join(sorted(timed_out)))
+            )
+        return await ctx.respond(embed=eb)
+
     rtfd = discord.SlashCommandGroup("rtfd", "Search the docs for a specific query.")
 
     pycord = rtfd.create_subgroup(
@@ -138,6 +437,8 @@ class Rtfd(Cog):
         name="query",
         description="The query to search for.",
         description_localizations={"zh-TW": "要搜尋的內容", "zh-CN": "要搜索的内容"},
+        type=str,
+        autocomplete=_query_autocomplete,
     )
     async def pycord_search(
         self, ctx: discord.ApplicationContext, query: str
@@ -153,13 +454,7 @@ class Rtfd(Cog):
         :return: The message sent.
         :rtype: discord.Message | discord.Interaction | discord.WebhookMessage
         """
-        return await self._docs_search(
-            ctx,
-            f"https://docs.pycord.dev/_/api/v2/search/?q={quote(query)}&project=pycord&version=stable&language=en",
-            "Pycord",
-            "https://docs.pycord.dev/en/stable/",
-            "https://avatars.githubusercontent.com/u/89700626?s=200&v=4",
-        )
+        return await self._docs_search(ctx, "pycord", query)
 
     @pycord.command(
         name="docs",
@@ -195,6 +490,8 @@ class Rtfd(Cog):
         name="query",
         description="The query to search for.",
         description_localizations={"zh-TW": "要搜尋的內容", "zh-CN": "要搜索的内容"},
+        type=str,
+        autocomplete=_query_autocomplete,
     )
     async def dpy_search(
         self, ctx: discord.ApplicationContext, query: str
@@ -210,13 +507,7 @@ class Rtfd(Cog):
         :return: The message sent.
         :rtype: discord.Message | discord.Interaction | discord.WebhookMessage
         """
-        return await self._docs_search(
-            ctx,
-            f"https://discordpy.readthedocs.io/_/api/v2/search/?q={quote(query)}&project=discordpy&version=stable&language=en",
-            "discord.py",
-            "https://discordpy.readthedocs.io/en/stable/",
-            "https://truth.bahamut.com.tw/s01/202106/f394bbeb4bfac8abdfafe49dbfd0427d.PNG",
-        )
+        return await self._docs_search(ctx, "dpy", query)
 
     @dpy.command(
         name="docs",
@@ -255,6 +546,8 @@ class Rtfd(Cog):
         name="query",
         description="The query to search for.",
         description_localizations={"zh-TW": "要搜尋的內容", "zh-CN": "要搜索的内容"},
+        type=str,
+        autocomplete=_query_autocomplete,
     )
     async def ipy_search(
         self, ctx: discord.ApplicationContext, query: str
@@ -270,13 +563,7 @@ class Rtfd(Cog):
         :return: The message sent.
         :rtype: discord.Message | discord.Interaction | discord.WebhookMessage
         """
-        return await self._docs_search(
-            ctx,
-            f"https://interactionspy.readthedocs.io/_/api/v2/search/?q={quote(query)}&project=interactionspy&version=latest&language=en",
-            "interactions.py",
-            "https://interactionspy.readthedocs.io/en/latest/",
-            "https://avatars.githubusercontent.com/u/98242689?s=200&v=4",
-        )
+        return await self._docs_search(ctx, "ipy", query)
 
     @ipy.command(
         name="docs",
@@ -315,6 +602,8 @@ class Rtfd(Cog):
         name="query",
         description="The query to search for.",
         description_localizations={"zh-TW": "要搜尋的內容", "zh-CN": "要搜索的内容"},
+        type=str,
+        autocomplete=_query_autocomplete,
     )
     async def nextcord_search(
         self, ctx: discord.ApplicationContext, query: str
@@ -330,13 +619,7 @@ class Rtfd(Cog):
         :return: The message sent.
         :rtype: discord.Message | discord.Interaction | discord.WebhookMessage
         """
-        return await self._docs_search(
-            ctx,
-            f"https://docs.nextcord.dev/_/api/v2/search/?q={quote(query)}&project=nextcord&version=latest&language=en",
-            "nextcord",
-            "https://docs.nextcord.dev/en/stable/",
-            "https://avatars.githubusercontent.com/u/89693200?s=200&v=4",
-        )
+        return await self._docs_search(ctx, "nextcord", query)
 
     @nextcord.command(
         name="docs",
@@ -372,6 +655,8 @@ class Rtfd(Cog):
         name="query",
         description="The query to search for.",
         description_localizations={"zh-TW": "要搜尋的內容", "zh-CN": "要搜索的内容"},
+        type=str,
+        autocomplete=_query_autocomplete,
     )
     async def disnake_search(
         self, ctx: discord.ApplicationContext, query: str
@@ -387,13 +672,7 @@ class Rtfd(Cog):
         :return: The message sent.
         :rtype: discord.Message | discord.Interaction | discord.WebhookMessage
         """
-        return await self._docs_search(
-            ctx,
-            f"https://docs.disnake.dev/_/api/v2/search/?q={quote(query)}&project=disnake&version=latest&language=en",
-            "disnake",
-            "https://disnake.readthedocs.io/en/latest/",
-            "https://avatars.githubusercontent.com/u/93640097?s=200&v=4",
-        )
+        return await self._docs_search(ctx, "disnake", query)
 
     @disnake.command(
         name="docs",
@@ -415,6 +694,39 @@ class Rtfd(Cog):
         await ctx.defer()
         return await ctx.respond("https://docs.disnake.dev/en/stable/")
 
+    all_projects = rtfd.create_subgroup(
+        "all",
+        "Search the docs of every library for a specific query.",
+    )
+
+    @all_projects.command(
+        name="search",
+        description="Search the docs of every library for a specific query.",
+        description_localizations={"zh-TW": "在所有函式庫的文檔中搜尋", "zh-CN": "在所有库的文档中搜索"},
+    )
+    @discord.option(
+        name="query",
+        description="The query to search for.",
+        description_localizations={"zh-TW": "要搜尋的內容", "zh-CN": "要搜索的内容"},
+        type=str,
+        autocomplete=_query_autocomplete,
+    )
+    async def all_search(
+        self, ctx: discord.ApplicationContext, query: str
+    ) -> discord.Interaction | discord.WebhookMessage:
+        """
+        Search the docs of every library for a specific query.
+
+        :param ctx: The context of the command.
+        :type ctx: discord.ApplicationContext
+        :param query: The query to search for.
+        :type query: str
+
+        :return: The message sent.
+        :rtype: discord.Interaction | discord.WebhookMessage
+        """
+        return await self._all_search(ctx, query)
+
 
 def setup(bot: discord.AutoShardedBot) -> None:
     """
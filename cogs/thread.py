@@ -13,6 +13,7 @@ import discord
 from utils.embed import Embed
 from utils.i18n import I18n
 from utils.logging import Cog
+from utils.members import MemberCache
 
 
 class Thread(Cog):
@@ -119,7 +120,7 @@ class Thread(Cog):
                     I18n.get("thread.add.not_thread", ctx.locale or ctx.guild_locale),
                 )
             )
-        if user in ctx.channel.members:
+        if await MemberCache.in_thread(ctx.channel, user.id):
             return await ctx.respond(
                 embed=Embed.error(
                     I18n.get(
@@ -137,6 +138,7 @@ class Thread(Cog):
                     ),
                 )
             )
+        MemberCache.update_thread(ctx.channel.id, user.id, joined=True)
         return await ctx.respond(
             embed=Embed.success(
                 I18n.get("thread.add.success", ctx.locale or ctx.guild_locale, user=user.mention),
@@ -177,7 +179,7 @@ class Thread(Cog):
                     I18n.get("thread.remove.not_thread", ctx.locale or ctx.guild_locale),
                 )
             )
-        if user not in ctx.channel.members:
+        if not await MemberCache.in_thread(ctx.channel, user.id):
             return await ctx.respond(
                 embed=Embed.error(
                     I18n.get(
@@ -195,6 +197,7 @@ class Thread(Cog):
                     ),
                 )
             )
+        MemberCache.update_thread(ctx.channel.id, user.id, joined=False)
         return await ctx.respond(
             embed=Embed.success(
                 I18n.get(
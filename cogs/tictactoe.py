@@ -0,0 +1,401 @@
+"""
+The cog module for the Tic Tac Toe game.
+
+This file is part of ouoteam/ouov3 which is released under GNU General Public License v3.0.
+See file LISENCE for full license details.
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+import discord
+
+from utils.game_ai import GameAI
+from utils.i18n import I18n
+from utils.logging import Cog
+from utils.sessions import SessionManager
+from utils.tictactoe import Tictactoe
+
+# the number of marks in a row needed to win on each board size
+K = {3: 3, 4: 4, 5: 4}
+
+
+class Game:
+    """
+    A game against the bot, kept as a few integers.
+
+    :param user_id: The ID of the player.
+    :type user_id: int
+    :param size: The width and height of the board.
+    :type size: int
+    :param human: The side of the player, 0 for X who starts and 1 for O.
+    :type human: int
+    """
+
+    __slots__ = ("user_id", "x", "o", "size", "human")
+
+    def __init__(self, user_id: int, size: int, human: int) -> None:
+        self.user_id = user_id
+        self.x = 0
+        self.o = 0
+        self.size = size
+        self.human = human
+
+    def board(self) -> Tictactoe:
+        """
+        Get the engine view of the game.
+
+        :return: The board.
+        :rtype: Tictactoe
+        """
+        board = Tictactoe(self.size, K[self.size])
+        board.x, board.o = self.x, self.o
+        return board
+
+    def play(self, cell: int, side: int) -> None:
+        """
+        Play a move.
+
+        :param cell: The cell.
+        :type cell: int
+        :param side: The side playing, 0 for X and 1 for O.
+        :type side: int
+        """
+        if side == 0:
+            self.x |= 1 << cell
+        else:
+            self.o |= 1 << cell
+
+
+class TictactoeCog(Cog):
+    """
+    The Tic Tac Toe cog.
+    Games are kept by a :class:`SessionManager` and their messages carry the board in the
+    ``custom_id`` of every button, ``ttt:<game>:<size>:<x>:<o>:<cell>``. The views are only used to
+    lay the buttons out and are stopped before they are sent, so py-cord does not store them,
+    every click goes through :meth:`on_interaction` instead.
+    Game IDs start at a different offset in each cluster, so the games of every cluster can be
+    handed over to the next generation of clusters during a reshard.
+
+    :param bot: The bot.
+    :type bot: discord.AutoShardedBot
+
+    :cvar idle_timeout: How long a game waits for a move before it is dropped, in seconds.
+    :vartype idle_timeout: float
+    """
+
+    idle_timeout = 600.0
+
+    def __init__(self, bot: discord.AutoShardedBot) -> None:
+        self.bot = bot
+        self.games: SessionManager[Game] = SessionManager(
+            self.idle_timeout,
+            on_expire=self.on_game_expire,
+            first_id=((getattr(bot, "cluster_id", None) or 0) << 32) + 1,
+        )
+        self._searches: Dict[int, asyncio.Task] = {}
+
+    def cog_unload(self) -> None:
+        self.games.stop()
+        for task in self._searches.values():
+            task.cancel()
+
+    def export_state(self) -> List[List[int]]:
+        """
+        Export the running games for the next generation of clusters.
+
+        :return: The ID, player, size, side of the player and board of every game.
+        :rtype: List[List[int]]
+        """
+        return [
+            [game_id, game.user_id, game.size, game.human, game.x, game.o]
+            for game_id, game in self.games.items()
+        ]
+
+    def import_state(self, states: List[List[List[int]]]) -> None:
+        """
+        Import the games exported by the previous generation of clusters.
+
+        :param states: The games exported by each cluster.
+        :type states: List[List[List[int]]]
+        """
+        self.games.start()
+        for games in states:
+            for game_id, user_id, size, human, x, o in games:
+                game = Game(user_id, size, human)
+                game.x, game.o = x, o
+                self.games.restore(game_id, game)
+        self.logger.debug(f"已匯入 {len(self.games)} 場井字遊戲")
+
+    def on_game_expire(self, game_id: int, _: Game) -> None:
+        """
+        Stop the search of an expired game.
+
+        :param game_id: The ID of the game.
+        :type game_id: int
+        """
+        task = self._searches.pop(game_id, None)
+        if task is not None:
+            task.cancel()
+
+    @staticmethod
+    def render(
+        game_id: int,
+        size: int,
+        x: int,
+        o: int,
+        status: str,
+        over: bool = False,
+        busy: bool = False,
+    ) -> Tuple[discord.Embed, discord.ui.View]:
+        """
+        Render a game.
+
+        :param game_id: The ID of the game.
+        :type game_id: int
+        :param size: The width and height of the board.
+        :type size: int
+        :param x: The cells of X.
+        :type x: int
+        :param o: The cells of O.
+        :type o: int
+        :param status: The text under the title.
+        :type status: str
+        :param over: Whether the game is over, which disables every button.
+        :type over: bool
+        :param busy: Whether the bot is thinking, which disables the board.
+        :type busy: bool
+
+        :return: The embed and the stopped view of the buttons.
+        :rtype: Tuple[discord.Embed, discord.ui.View]
+        """
+        embed = discord.Embed(
+            title="Tic Tac Toe", description=status, color=discord.Color.blurple()
+        )
+        view = discord.ui.View(timeout=None)
+        prefix = f"ttt:{game_id}:{size}:{x}:{o}"
+        for cell in range(size * size):
+            mark = "X" if x >> cell & 1 else "O" if o >> cell & 1 else None
+            view.add_item(
+                discord.ui.Button(
+                    label=mark or "\u200b",
+                    style=(
+                        discord.ButtonStyle.primary
+                        if mark == "X"
+                        else discord.ButtonStyle.danger
+                        if mark == "O"
+                        else discord.ButtonStyle.secondary
+                    ),
+                    custom_id=f"{prefix}:{cell}",
+                    row=cell // size,
+                    disabled=over or busy or mark is not None,
+                )
+            )
+        if size < 5:
+            view.add_item(
+                discord.ui.Button(
+                    label="🏳️",
+                    style=discord.ButtonStyle.secondary,
+                    custom_id=f"{prefix}:q",
+                    row=size,
+                    disabled=over,
+                )
+            )
+        view.stop()
+        return embed, view
+
+    def status(self, game: Game, locale: Optional[str]) -> Tuple[str, bool]:
+        """
+        Describe the state of a game.
+
+        :param game: The game.
+        :type game: Game
+        :param locale: The locale.
+        :type locale: Optional[str]
+
+        :return: The text and whether the game is over.
+        :rtype: Tuple[str, bool]
+        """
+        result = game.board().evaluate_result()
+        if result is False:
+            return (
+                I18n.get(
+                    "tictactoe.turn",
+                    locale,
+                    user=f"<@{game.user_id}>",
+                    mark="XO"[game.human],
+                ),
+                False,
+            )
+        if result is None:
+            return I18n.get("tictactoe.draw", locale), True
+        if result == "XO"[game.human]:
+            return I18n.get("tictactoe.win", locale, user=f"<@{game.user_id}>"), True
+        return I18n.get("tictactoe.lose", locale, user=f"<@{game.user_id}>"), True
+
+    async def bot_move(self, game_id: int, game: Game) -> bool:
+        """
+        Let the bot play, in the pool of :class:`GameAI` on boards bigger than 3×3.
+
+        :param game_id: The ID of the game.
+        :type game_id: int
+        :param game: The game.
+        :type game: Game
+
+        :return: Whether the bot played, False if the search was cancelled.
+        :rtype: bool
+        """
+        task = asyncio.create_task(GameAI.best_move(game.board(), side=1 - game.human))
+        self._searches[game_id] = task
+        try:
+            move = await task
+        except asyncio.CancelledError:
+            return False
+        finally:
+            if self._searches.get(game_id) is task:
+                del self._searches[game_id]
+        if move is not None:
+            game.play(move[0] * game.size + move[1], 1 - game.human)
+        return True
+
+    @discord.slash_command(
+        description="Play Tic Tac Toe against the bot.",
+        description_localizations={"zh-TW": "和機器人玩井字遊戲。", "zh-CN": "和机器人玩井字游戏。"},
+    )
+    @discord.option(
+        name="size",
+        name_localizations={"zh-TW": "大小", "zh-CN": "大小"},
+        description="The size of the board, 4 in a row wins on 4×4 and 5×5.",
+        description_localizations={
+            "zh-TW": "棋盤大小，4×4 和 5×5 連成 4 個即獲勝。",
+            "zh-CN": "棋盘大小，4×4 和 5×5 连成 4 个即获胜。",
+        },
+        type=int,
+        choices=[3, 4, 5],
+        default=3,
+    )
+    @discord.option(
+        name="first",
+        name_localizations={"zh-TW": "先手", "zh-CN": "先手"},
+        description="Whether you play first.",
+        description_localizations={"zh-TW": "是否由你先下。", "zh-CN": "是否由你先下。"},
+        type=bool,
+        default=True,
+    )
+    async def tictactoe(
+        self, ctx: discord.ApplicationContext, size: int = 3, first: bool = True
+    ) -> discord.Interaction | discord.WebhookMessage:
+        """
+        Start a game of Tic Tac Toe.
+
+        :param ctx: The context.
+        :type ctx: discord.ApplicationContext
+        :param size: The width and height of the board.
+        :type size: int
+        :param first: Whether the player plays first.
+        :type first: bool
+
+        :return: The response message.
+        :rtype: discord.Interaction | discord.WebhookMessage
+        """
+        # the followup of a deferred response does not store the stopped view
+        await ctx.defer()
+        self.games.start()
+        locale = ctx.locale or ctx.guild_locale
+        game = Game(ctx.author.id, size, 0 if first else 1)
+        game_id = self.games.add(game)
+        if not first:
+            await self.bot_move(game_id, game)
+        status, over = self.status(game, locale)
+        embed, view = self.render(game_id, size, game.x, game.o, status, over)
+        return await ctx.respond(embed=embed, view=view)
+
+    @Cog.listener()
+    async def on_interaction(self, interaction: discord.Interaction) -> None:
+        """
+        Handle the buttons of every game.
+
+        :param interaction: The interaction.
+        :type interaction: discord.Interaction
+        """
+        if interaction.type is not discord.InteractionType.component:
+            return
+        custom_id = (interaction.data or {}).get("custom_id", "")
+        if not custom_id.startswith("ttt:"):
+            return
+        try:
+            game_id, size, x, o = map(int, custom_id.split(":")[1:5])
+            action = custom_id.split(":")[5]
+        except (ValueError, IndexError):
+            return
+        locale = interaction.locale or interaction.guild_locale
+        game = self.games.get(game_id)
+        if game is None:
+            embed, view = self.render(
+                game_id, size, x, o, I18n.get("tictactoe.expired", locale), over=True
+            )
+            return await interaction.response.edit_message(embed=embed, view=view)
+        if interaction.user is None or interaction.user.id != game.user_id:
+            return await interaction.response.send_message(
+                I18n.get("tictactoe.not_player", locale), ephemeral=True
+            )
+        if action == "q":
+            self.games.pop(game_id)
+            self.on_game_expire(game_id, game)
+            embed, view = self.render(
+                game_id,
+                size,
+                game.x,
+                game.o,
+                I18n.get("tictactoe.quit", locale, user=f"<@{game.user_id}>"),
+                over=True,
+            )
+            return await interaction.response.edit_message(embed=embed, view=view)
+        cell = int(action)
+        if x & game.x == game.x and o & game.o == game.o:
+            # the game went on in the previous generation of clusters after it was exported
+            game.x, game.o = x, o
+        if (x, o) != (game.x, game.o) or game_id in self._searches or (x | o) >> cell & 1:
+            # a click on an old board, or while the bot is thinking
+            return await interaction.response.defer()
+        game.play(cell, game.human)
+        status, over = self.status(game, locale)
+        if over:
+            self.games.pop(game_id)
+        elif size == 3:
+            # the 3×3 moves are a table lookup, answer in a single edit
+            await self.bot_move(game_id, game)
+            status, over = self.status(game, locale)
+            if over:
+                self.games.pop(game_id)
+        else:
+            embed, view = self.render(
+                game_id,
+                size,
+                game.x,
+                game.o,
+                I18n.get("tictactoe.thinking", locale),
+                busy=True,
+            )
+            await interaction.response.edit_message(embed=embed, view=view)
+            if not await self.bot_move(game_id, game) or game_id not in self.games:
+                return
+            status, over = self.status(game, locale)
+            if over:
+                self.games.pop(game_id)
+            embed, view = self.render(game_id, size, game.x, game.o, status, over)
+            await interaction.edit_original_response(embed=embed, view=view)
+            return
+        embed, view = self.render(game_id, size, game.x, game.o, status, over)
+        await interaction.response.edit_message(embed=embed, view=view)
+
+
+def setup(bot: discord.AutoShardedBot) -> None:
+    """
+    The setup function for the cog.
+
+    :param bot: The bot.
+    :type bot: discord.AutoShardedBot
+    """
+    bot.add_cog(TictactoeCog(bot))
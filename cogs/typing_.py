@@ -6,45 +6,203 @@ See file LISENCE for full license details.
 """
 from __future__ import annotations
 
-import aiofiles
+import asyncio
+import random
+from typing import List, Optional, Set
+
 import discord
-import orjson
-from discord.ext import tasks
 
+from utils.channels import ChannelStore
 from utils.embed import Embed
 from utils.i18n import I18n
 from utils.logging import Cog
+from utils.scheduler import RateLimiter, TimerWheel
 
 
 class Typing(Cog):
     """
     Typing commands and tasks cog.
+    Every channel is triggered once per period, at a random offset so the requests are spread
+    evenly over the period instead of bursting. A typing indicator lasts 10 seconds.
+    The channels are shared with the other clusters through the database: during a reshard each
+    generation only types in the guilds it handles, and the new generation reads the channels
+    again once the previous one is stopped.
 
     :param bot: The bot instance.
     :type bot: discord.AutoShardedBot
+
+    :cvar period: The interval between two triggers of a channel in seconds.
+    :vartype period: float
+    :cvar concurrency: The number of triggers in flight.
+    :vartype concurrency: int
+    :cvar rate: The number of triggers per second of the whole bot, kept below the global REST
+        limit of 50. Each cluster gets the share of its shards.
+    :vartype rate: int
     """
 
+    period = 8.0
+    concurrency = 16
+    rate = 40
+
     def __init__(self, bot: discord.AutoShardedBot) -> None:
         self.bot = bot
-        self._channels = None
-        self.typing_task.start()
-
-    @tasks.loop(seconds=5)
-    async def typing_task(self) -> None:
-        """
-        The typing task.
-        """
-        if self._channels is None:
-            async with aiofiles.open("data/typing.json", "rb") as f:
-                self._channels = orjson.loads(await f.read())
-        for c in self._channels:
-            try:
-                if channel := self.bot.get_channel(c):
-                    await channel.trigger_typing()
-            except Exception:
-                self._channels.remove(c)
-                async with aiofiles.open("data/typing.json", "wb") as f:
-                    await f.write(orjson.dumps(self._channels))
+        self._channels = ChannelStore("data/typing.db")
+        self._wheel = TimerWheel(tick=0.1, slots=int(self.period / 0.1))
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        # the REST limit is shared by every cluster of the bot
+        share = len(bot.shard_ids) / bot.shard_count if bot.shard_ids else 1
+        self._ratelimiter = RateLimiter(self.rate * share)
+        self._pending: Set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def cog_unload(self) -> None:
+        asyncio.create_task(self.close())
+
+    async def close(self) -> None:
+        """
+        Stop the typing scheduler and write the pending channel changes.
+        The bot awaits it when it closes, unloading the cog only schedules it.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self._channels.close()
+
+    @Cog.listener()
+    async def on_ready(self) -> None:
+        """
+        Load the channels and start the typing scheduler.
+        """
+        if self._task is not None:
+            return
+        await self._channels.load(legacy="data/typing.json", resolve=self.resolve_guild)
+        for channel_id, guild_id in self._channels.channels.items():
+            if self.is_local(guild_id):
+                self._wheel.schedule(channel_id, random.uniform(0, self.period))
+        self._task = asyncio.create_task(self._wheel.run(self.fire))
+
+    @Cog.listener()
+    async def on_clusters_retired(self, _: List[int]) -> None:
+        """
+        Pick up the channels changed by the previous generation of clusters during a reshard.
+        """
+        if self._task is None:
+            return
+        added, removed = await self._channels.reload()
+        for channel_id in removed:
+            self._wheel.cancel(channel_id)
+        for channel_id in added:
+            if self.is_local(self._channels.channels[channel_id]):
+                self._wheel.schedule(channel_id, random.uniform(0, self.period))
+
+    def resolve_guild(self, channel_id: int) -> int:
+        """
+        Get the guild ID of a channel imported from the old JSON file.
+
+        :param channel_id: The ID of the channel.
+        :type channel_id: int
+
+        :return: The guild ID, or 0 if the channel is not cached yet.
+        :rtype: int
+        """
+        channel = self.bot.get_channel(channel_id)
+        return channel.guild.id if channel is not None else 0
+
+    def is_local(self, guild_id: int) -> bool:
+        """
+        Check whether a guild is on the shards of this process.
+        Guilds that are not known yet (ID 0) are treated as local until they are resolved.
+
+        :param guild_id: The ID of the guild.
+        :type guild_id: int
+
+        :return: Whether the guild is local.
+        :rtype: bool
+        """
+        if not guild_id or self.bot.shard_ids is None:
+            return True
+        return (guild_id >> 22) % self.bot.shard_count in self.bot.shard_ids
+
+    @Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        """
+        Stop typing in the channels of a guild the bot left.
+
+        :param guild: The guild.
+        :type guild: discord.Guild
+        """
+        for channel_id in self._channels.remove_guild(guild.id):
+            self._wheel.cancel(channel_id)
+
+    @Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel) -> None:
+        """
+        Stop typing in a deleted channel.
+
+        :param channel: The channel.
+        :type channel: discord.abc.GuildChannel
+        """
+        self.remove(channel.id)
+
+    @Cog.listener()
+    async def on_raw_thread_delete(self, payload: discord.RawThreadDeleteEvent) -> None:
+        """
+        Stop typing in a deleted thread.
+
+        :param payload: The raw event payload.
+        :type payload: discord.RawThreadDeleteEvent
+        """
+        self.remove(payload.thread_id)
+
+    def fire(self, channel_id: int) -> None:
+        """
+        Trigger typing in a channel and schedule the next trigger one period later.
+        Channels that are not cached are not on the shards of this process and are skipped, so are
+        the guilds the other generation of clusters handles during a reshard.
+
+        :param channel_id: The ID of the channel.
+        :type channel_id: int
+        """
+        self._wheel.schedule(channel_id, self.period)
+        if channel_id in self._pending:
+            # the previous trigger is still waiting for the rate limit
+            return
+        channel = self.bot.get_channel(channel_id)
+        if channel is None:
+            return
+        if getattr(self.bot, "reshard", None) is not None and not self.bot.handles(channel):
+            return
+        # channels imported from the old JSON file have no guild yet
+        self._channels.add(channel_id, channel.guild.id)
+        self._pending.add(channel_id)
+        asyncio.create_task(self.trigger(channel))
+
+    async def trigger(self, channel: discord.abc.Messageable) -> None:
+        """
+        Trigger typing in a channel, removing the channel if the bot lost access to it.
+
+        :param channel: The channel.
+        :type channel: discord.abc.Messageable
+        """
+        try:
+            async with self._semaphore, self._ratelimiter:
+                await channel.trigger_typing()
+        except (discord.Forbidden, discord.NotFound):
+            self.remove(channel.id)
+        except discord.HTTPException as e:
+            self.logger.debug(f"無法在頻道 {channel.id} 中輸入: {e}")
+        finally:
+            self._pending.discard(channel.id)
+
+    def remove(self, channel_id: int) -> None:
+        """
+        Stop typing in a channel.
+
+        :param channel_id: The ID of the channel.
+        :type channel_id: int
+        """
+        self._wheel.cancel(channel_id)
+        self._channels.remove(channel_id)
 
     typing = discord.SlashCommandGroup(
         "typing",
@@ -109,9 +267,8 @@ class Typing(Cog):
                 )
             )
         else:
-            self._channels.append(channel.id)
-            async with aiofiles.open("data/typing.json", "wb") as f:
-                await f.write(orjson.dumps(self._channels))
+            self._channels.add(channel.id, ctx.guild.id)
+            self._wheel.schedule(channel.id, self.period)
             msg = await ctx.respond(
                 I18n.get(
                     "typing.start.typing", ctx.locale or ctx.guild_locale, channel=channel.mention
@@ -165,9 +322,7 @@ class Typing(Cog):
                     )
                 )
             )
-        self._channels.remove(channel.id)
-        async with aiofiles.open("data/typing.json", "wb") as f:
-            await f.write(orjson.dumps(self._channels))
+        self.remove(channel.id)
         return await ctx.respond(
             I18n.get("typing.stop.typing", ctx.locale or ctx.guild_locale, channel=channel.mention)
         )
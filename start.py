@@ -3,14 +3,50 @@ This file is part of ouoteam/ouov3 which is released under GNU General Public Li
 See file LISENCE for full license details.
 """
 
-import tracemalloc
+import decouple
 
-tracemalloc.start(25)
+from utils.profiling import Memory, Startup
+
+# Tracing has to start before the bot is imported to catch its allocations.
+if decouple.config("memory_profiling", default=False, cast=bool):
+    Memory.start_tracing(decouple.config("memory_profiling_frames", default=25, cast=int))
+if decouple.config("startup_profiling", default=False, cast=bool):
+    Startup.trace_imports()
+
+import asyncio
+import multiprocessing
+import pathlib
+from typing import Any, List, Optional
 
-import decouple
 import discord
 
+from utils.cluster import Cluster, IdentifyGate
+from utils.game_ai import GameAI
+from utils.ipc import IPC
 from utils.logging import Logging
+from utils.members import MemberCache
+from utils.sync import CommandSync, LazyExtensions
+from utils.utils import Utils
+from utils.watchdog import LoopWatchdog
+
+Utils.lazy_imports = decouple.config("lazy_imports", default=False, cast=bool)
+if Utils.lazy_imports:
+    LazyExtensions.extensions = set(
+        decouple.config(
+            "lazy_cogs",
+            default="cogs.debug,cogs.fun,cogs.translate,cogs.wiki",
+            cast=decouple.Csv(),
+        )
+    )
+if decouple.config("uvloop", default=False, cast=bool) and not Utils.install_uvloop():
+    Logging.get_logger().warning("未安裝 uvloop，將使用預設的事件迴圈")
+MemberCache.max_size = decouple.config("member_cache_size", default=1000, cast=int)
+MemberCache.chunk_guilds = set(
+    decouple.config("chunk_guilds", default="", cast=decouple.Csv(cast=int))
+)
+GameAI.workers = decouple.config("game_ai_workers", default=2, cast=int)
+GameAI.processes = decouple.config("game_ai_processes", default=True, cast=bool)
+GameAI.budget = decouple.config("game_ai_budget", default=1.0, cast=float)
 
 
 class Bot(discord.AutoShardedBot):
@@ -20,8 +56,42 @@ class Bot(discord.AutoShardedBot):
     """
 
     version = "v3"
+    lifecycle_events = {
+        "connect",
+        "disconnect",
+        "ready",
+        "resumed",
+        "shard_connect",
+        "shard_disconnect",
+        "shard_ready",
+        "shard_resumed",
+    }
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        *,
+        shard_ids: Optional[List[int]] = None,
+        shard_count: Optional[int] = None,
+        cluster_id: Optional[int] = None,
+        identify_gate: Optional[IdentifyGate] = None,
+        status_queue: Optional[multiprocessing.Queue] = None,
+        standby: bool = False,
+    ) -> None:
+        """
+        :param shard_ids: The shards to run in this process, or None to run all of them.
+        :type shard_ids: Optional[List[int]]
+        :param shard_count: The total number of shards, required with shard_ids.
+        :type shard_count: Optional[int]
+        :param cluster_id: The cluster this process runs as, None when not clustered.
+        :type cluster_id: Optional[int]
+        :param identify_gate: The identify rate limiter shared by the clusters.
+        :type identify_gate: Optional[IdentifyGate]
+        :param status_queue: The queue to report shard events to the cluster supervisor.
+        :type status_queue: Optional[multiprocessing.Queue]
+        :param standby: Whether this cluster is started by a reshard, handling no guild until the
+            supervisor hands it over.
+        :type standby: bool
+        """
         intents = discord.Intents.default()
         intents.members = True
         intents.message_content = True
@@ -29,14 +99,241 @@ class Bot(discord.AutoShardedBot):
             intents=intents,
             owner_ids={733920687751823372, 1068494523723944027},
             activity=discord.Game("OuO Bot V3"),
+            shard_ids=shard_ids,
+            shard_count=shard_count,
+            member_cache_flags=MemberCache.flags(),
+            chunk_guilds_at_startup=False,
         )
         self.logger = Logging.get_logger()
+        self.cluster_id = cluster_id
+        self.identify_gate = identify_gate
+        self.status_queue = status_queue
+        self.standby = standby
+        # the shard count and the handed over shards of the running reshard
+        self.reshard = (
+            {"shard_count": shard_count, "active": set(), "complete": False} if standby else None
+        )
+        self._state_imported = False
+        IPC.listen("reshard")(self.on_reshard_announced)
+        IPC.listen("retired")(self.on_retired_announced)
+        self._parse_interaction = self._connection.parsers["INTERACTION_CREATE"]
+        self._connection.parsers["INTERACTION_CREATE"] = self.parse_interaction_create
+        self.watchdog = LoopWatchdog(
+            interval=decouple.config("loop_watchdog_interval", default=0.5, cast=float),
+            threshold=decouple.config("loop_watchdog_threshold", default=0.25, cast=float),
+        )
         self._client_ready = False
-        for k, v in self.load_extension("cogs", recursive=True, store=True).items():
-            if v is True:
-                self.logger.debug(f"成功載入插件 {k}")
+        self._commands_synced = False
+        for path in sorted(pathlib.Path("cogs").rglob("*.py")):
+            name = ".".join(path.with_suffix("").parts)
+            if LazyExtensions.defer(name):
+                self.logger.debug(f"插件 {name} 將在首次使用時載入")
+                continue
+            loaded = set(map(id, self.pending_application_commands))
+            with Startup.measure(name):
+                result = self.load_extension(name, store=True)[name]
+            if result is True:
+                self.logger.debug(f"成功載入插件 {name} ({Startup.steps[name] * 1000:.1f} ms)")
+                LazyExtensions.record(
+                    self,
+                    name,
+                    [cmd for cmd in self.pending_application_commands if id(cmd) not in loaded],
+                )
             else:
-                self.logger.debug(f"載入插件 {k} 時出現錯誤: {v}")
+                self.logger.debug(f"載入插件 {name} 時出現錯誤: {result}")
+
+    async def on_connect(self) -> None:
+        """
+        The event that is triggered when the bot connected.
+        Syncs the application commands once, skipping the ones that did not change.
+        """
+        if self.auto_sync_commands and not self._commands_synced:
+            self._commands_synced = True
+            await CommandSync.sync(self, primary=not self.cluster_id)
+
+    async def process_application_commands(
+        self, interaction: discord.Interaction, auto_sync: Optional[bool] = None
+    ) -> None:
+        """
+        Process an application command, loading its extension first if it was deferred.
+
+        :param interaction: The interaction.
+        :type interaction: discord.Interaction
+        :param auto_sync: Whether to sync the commands if the command is unknown.
+        :type auto_sync: Optional[bool]
+        """
+        if interaction.type in (
+            discord.InteractionType.application_command,
+            discord.InteractionType.auto_complete,
+        ) and (name := LazyExtensions.extension((interaction.data or {}).get("name", ""))):
+            await LazyExtensions.load(self, name)
+        await super().process_application_commands(interaction, auto_sync)
+
+    async def before_identify_hook(self, shard_id: int, *, initial: bool = False) -> None:
+        """
+        Wait for the shard's identify bucket to be free.
+        When clustered the wait is shared with the other processes through the identify gate.
+
+        :param shard_id: The shard about to identify.
+        :type shard_id: int
+        :param initial: Whether this is the first shard identifying in this process.
+        :type initial: bool
+        """
+        if self.identify_gate is None:
+            return await super().before_identify_hook(shard_id, initial=initial)
+        await asyncio.get_running_loop().run_in_executor(None, self.identify_gate.wait, shard_id)
+
+    def dispatch(self, event_name: str, *args: Any, **kwargs: Any) -> None:
+        """
+        Dispatch an event, unless the other generation of clusters handles it during a reshard.
+        """
+        if (
+            self.reshard is not None
+            and event_name not in self.lifecycle_events
+            and not self.handles(args[0] if args else None)
+        ):
+            return
+        super().dispatch(event_name, *args, **kwargs)
+
+    def parse_interaction_create(self, data: dict) -> None:
+        """
+        Parse an interaction, unless the other generation of clusters handles it during a reshard.
+        Interactions are checked before they are parsed, as py-cord hands the components to the
+        persistent views before dispatching the interaction.
+
+        :param data: The raw interaction.
+        :type data: dict
+        """
+        guild_id = int(data["guild_id"]) if "guild_id" in data else None
+        if self.reshard is None or self.handles_guild(guild_id):
+            self._parse_interaction(data)
+
+    def handles(self, obj: Any) -> bool:
+        """
+        Check whether this cluster handles an event during a reshard.
+
+        :param obj: The first argument of the event.
+        :type obj: Any
+
+        :return: Whether to dispatch the event.
+        :rtype: bool
+        """
+        if isinstance(obj, discord.Guild):
+            guild_id = obj.id
+        else:
+            guild_id = getattr(obj, "guild_id", None) or getattr(
+                getattr(obj, "guild", None), "id", None
+            )
+        return self.handles_guild(guild_id)
+
+    def handles_guild(self, guild_id: Optional[int]) -> bool:
+        """
+        Check whether this cluster handles a guild during a reshard.
+        A guild is handled by the new generation once its new shard is active, by the current
+        generation before that. Events outside of guilds stay with the current generation until
+        the reshard is complete.
+
+        :param guild_id: The ID of the guild, or None outside of guilds.
+        :type guild_id: Optional[int]
+
+        :return: Whether this cluster handles the guild.
+        :rtype: bool
+        """
+        if guild_id is None:
+            return not self.standby and not self.reshard["complete"]
+        active = (guild_id >> 22) % self.reshard["shard_count"] in self.reshard["active"]
+        return active if self.standby else not active
+
+    async def on_reshard_announced(self, payload: dict) -> None:
+        """
+        Update the reshard state announced by the cluster supervisor.
+
+        :param payload: The new shard count, the shards that took over and whether it is complete.
+        :type payload: dict
+        """
+        if self.standby and payload["complete"]:
+            self.standby = False
+            self.reshard = None
+            self.logger.info("重新分片完成，此叢集已接手所有伺服器")
+            return
+        if not self.standby and self.reshard is None:
+            await self.export_state()
+        self.reshard = {
+            "shard_count": payload["shard_count"],
+            "active": set(payload["active"]),
+            "complete": payload["complete"],
+        }
+
+    def on_retired_announced(self, cluster_ids: List[int]) -> None:
+        """
+        Let the cogs know the previous generation of clusters is stopped, with the
+        ``clusters_retired`` event.
+
+        :param cluster_ids: The stopped clusters.
+        :type cluster_ids: List[int]
+        """
+        self.dispatch("clusters_retired", cluster_ids)
+
+    async def export_state(self) -> None:
+        """
+        Share the state of the cogs with the new generation of clusters.
+        Cogs opt in by implementing ``export_state()`` and ``import_state(states)``.
+        """
+        for name, cog in self.cogs.items():
+            if hasattr(cog, "export_state"):
+                await IPC.set(f"state:{name}:{self.cluster_id}", cog.export_state(), ttl=3600)
+
+    async def import_state(self) -> None:
+        """
+        Load the state the previous generation of clusters shared.
+        Each cog receives the states exported by every previous cluster.
+        """
+        for name, cog in self.cogs.items():
+            if hasattr(cog, "import_state"):
+                states = await IPC.items(f"state:{name}:")
+                if states:
+                    cog.import_state(list(states.values()))
+
+    def report_status(self, shard_id: int, event: str) -> None:
+        """
+        Report a shard event to the cluster supervisor.
+
+        :param shard_id: The shard ID.
+        :type shard_id: int
+        :param event: The event, one of connect, ready, resumed and disconnect.
+        :type event: str
+        """
+        if self.status_queue is not None:
+            self.status_queue.put_nowait((self.cluster_id, shard_id, event))
+
+    async def on_guild_available(self, guild: discord.Guild) -> None:
+        """
+        The event that is triggered when a guild becomes available.
+        Chunks the guild if it opted in to full chunking.
+
+        :param guild: The guild.
+        :type guild: discord.Guild
+        """
+        await MemberCache.chunk(guild)
+
+    async def on_guild_join(self, guild: discord.Guild) -> None:
+        """
+        The event that is triggered when the bot joins a guild.
+        Chunks the guild if it opted in to full chunking.
+
+        :param guild: The guild.
+        :type guild: discord.Guild
+        """
+        await MemberCache.chunk(guild)
+
+    async def on_raw_member_remove(self, payload: discord.RawMemberRemoveEvent) -> None:
+        """
+        The event that is triggered when a member leaves a guild, cached or not.
+
+        :param payload: The raw event payload.
+        :type payload: discord.RawMemberRemoveEvent
+        """
+        MemberCache.discard(payload.guild_id, payload.user.id)
 
     async def on_shard_connect(self, shard_id: int) -> None:
         """
@@ -46,6 +343,7 @@ class Bot(discord.AutoShardedBot):
         :type shard_id: int
         """
         self.logger.debug(f"分片 {shard_id} 已連線至 Discord")
+        self.report_status(shard_id, "connect")
 
     async def on_shard_ready(self, shard_id: int) -> None:
         """
@@ -55,6 +353,10 @@ class Bot(discord.AutoShardedBot):
         :type shard_id: int
         """
         self.logger.debug(f"分片 {shard_id} 已準備就緒")
+        if self.standby and not self._state_imported:
+            self._state_imported = True
+            await self.import_state()
+        self.report_status(shard_id, "ready")
 
     async def on_shard_resumed(self, shard_id: int) -> None:
         """
@@ -64,6 +366,7 @@ class Bot(discord.AutoShardedBot):
         :type shard_id: int
         """
         self.logger.debug(f"分片 {shard_id} 已恢復連線至 Discord")
+        self.report_status(shard_id, "resumed")
 
     async def on_shard_disconnect(self, shard_id: int) -> None:
         """
@@ -73,6 +376,7 @@ class Bot(discord.AutoShardedBot):
         :type shard_id: int
         """
         self.logger.debug(f"分片 {shard_id} 已斷線")
+        self.report_status(shard_id, "disconnect")
 
     async def on_ready(self) -> None:
         """
@@ -86,16 +390,43 @@ class Bot(discord.AutoShardedBot):
 -------------------------
 已登入: {self.user.name}#{self.user.discriminator} ({self.user.id})
 分片數量: {self.shard_count}
-記憶體使用量: {tracemalloc.get_traced_memory()[0] / 1024 ** 2:.2f} MB
+記憶體使用量: {Memory.rss() / 1024 ** 2:.2f} MB
 API 延遲: {self.latency * 1000:.2f} ms
+事件迴圈: {type(self.loop).__module__}.{type(self.loop).__name__}
 -------------------------"""
         )
+        if Startup.imports:
+            Startup.stop_tracing_imports()
+            self.logger.info(f"啟動時間分析:\n{Startup.report()}")
         self._client_ready = True
 
+    async def start(self, token: str, *, reconnect: bool = True) -> None:
+        """
+        Starts the loop watchdog and IPC when clustered, then connects to Discord.
+
+        :param token: The bot token.
+        :type token: str
+        :param reconnect: Whether to reconnect on network failures.
+        :type reconnect: bool
+        """
+        self.watchdog.start(asyncio.get_running_loop())
+        if self.cluster_id is not None:
+            await IPC.start(self.cluster_id, self.shard_ids, self.shard_count)
+        await super().start(token, reconnect=reconnect)
+
     async def close(self) -> None:
         """
-        Closes the bot.
+        Closes the bot, after the cogs that implement ``close()`` finished their cleanup.
         """
+        self.watchdog.stop()
+        for name, cog in list(self.cogs.items()):
+            if hasattr(cog, "close"):
+                try:
+                    await cog.close()
+                except Exception as e:
+                    self.logger.opt(exception=e).error(f"關閉插件 {name} 時出現錯誤")
+        GameAI.stop()
+        await IPC.stop()
         await super().close()
 
     def run(self) -> None:
@@ -106,4 +437,14 @@ API 延遲: {self.latency * 1000:.2f} ms
 
 
 if __name__ == "__main__":
-    Bot().run()
+    clusters = decouple.config("clusters", default=1, cast=int)
+    if clusters > 1:
+        Cluster(
+            Bot,
+            decouple.config("token"),
+            clusters,
+            decouple.config("shard_count", default=0, cast=int) or None,
+            decouple.config("reshard_interval", default=0, cast=float),
+        ).run()
+    else:
+        Bot().run()
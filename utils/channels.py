@@ -0,0 +1,218 @@
+"""
+A persistent set of channels indexed by guild, for features enabled per channel.
+
+This file is part of ouoteam/ouov3 which is released under GNU General Public License v3.0.
+See file LISENCE for full license details.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import os
+import sqlite3
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+import orjson
+
+from utils.logging import Logging
+
+__all__ = ["ChannelStore"]
+
+
+class ChannelStore:
+    """
+    A set of channels kept in memory and backed by SQLite.
+    Lookups and changes only touch the in-memory index, the changes are written to the database
+    in batches by a background task, each batch in a single transaction.
+
+    :param path: The path of the database.
+    :type path: str
+    :param flush_interval: The interval between two batches in seconds.
+    :type flush_interval: float
+    """
+
+    logger = Logging.get_logger()
+
+    def __init__(self, path: str, flush_interval: float = 1.0) -> None:
+        self.path = path
+        self.flush_interval = flush_interval
+        self.channels: Dict[int, int] = {}
+        self.guilds: Dict[int, Set[int]] = {}
+        self._pending: Dict[int, Optional[int]] = {}
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def __contains__(self, channel_id: int) -> bool:
+        return channel_id in self.channels
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.channels)
+
+    def __len__(self) -> int:
+        return len(self.channels)
+
+    async def load(
+        self, legacy: Optional[str] = None, resolve: Callable[[int], int] = lambda c: 0
+    ) -> None:
+        """
+        Load the channels and start writing changes in the background.
+
+        :param legacy: A JSON list of channel IDs to import if the database does not exist yet.
+        :type legacy: Optional[str]
+        :param resolve: The function giving the guild ID of an imported channel.
+        :type resolve: Callable[[int], int]
+        """
+        created = not os.path.exists(self.path)
+        rows = await asyncio.to_thread(self._open)
+        for channel_id, guild_id in rows:
+            self._index(channel_id, guild_id)
+        if created and legacy is not None:
+            with contextlib.suppress(FileNotFoundError):
+                with open(legacy, "rb") as f:
+                    for channel_id in orjson.loads(f.read()):
+                        self.add(channel_id, resolve(channel_id))
+                self.logger.info(f"已從 {legacy} 匯入 {len(self._pending)} 個頻道")
+        self._task = asyncio.create_task(self._flush_loop())
+
+    def _open(self) -> List[tuple]:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS channels "
+            "(channel_id INTEGER PRIMARY KEY, guild_id INTEGER NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS guild ON channels (guild_id)")
+        return self._select()
+
+    def _select(self) -> List[tuple]:
+        return self._connection.execute("SELECT channel_id, guild_id FROM channels").fetchall()
+
+    async def reload(self) -> Tuple[Set[int], Set[int]]:
+        """
+        Read the channels again, to pick up the changes other processes wrote to the database.
+        The changes of this process that are not written yet are kept.
+
+        :return: The IDs of the channels that were added and removed.
+        :rtype: Tuple[Set[int], Set[int]]
+        """
+        if self._connection is None:
+            return set(), set()
+        async with self._lock:
+            channels = dict(await asyncio.to_thread(self._select))
+        for channel_id, guild_id in self._pending.items():
+            if guild_id is None:
+                channels.pop(channel_id, None)
+            else:
+                channels[channel_id] = guild_id
+        added = channels.keys() - self.channels.keys()
+        removed = self.channels.keys() - channels.keys()
+        self.channels, self.guilds = {}, {}
+        for channel_id, guild_id in channels.items():
+            self._index(channel_id, guild_id)
+        return added, removed
+
+    def _index(self, channel_id: int, guild_id: int) -> None:
+        self.channels[channel_id] = guild_id
+        self.guilds.setdefault(guild_id, set()).add(channel_id)
+
+    def add(self, channel_id: int, guild_id: int) -> bool:
+        """
+        Add a channel, or move it to another guild if the guild was not known.
+
+        :param channel_id: The ID of the channel.
+        :type channel_id: int
+        :param guild_id: The ID of the guild of the channel.
+        :type guild_id: int
+
+        :return: Whether the channel was added or updated.
+        :rtype: bool
+        """
+        if self.channels.get(channel_id) == guild_id:
+            return False
+        self.remove(channel_id)
+        self._index(channel_id, guild_id)
+        self._pending[channel_id] = guild_id
+        return True
+
+    def remove(self, channel_id: int) -> bool:
+        """
+        Remove a channel.
+
+        :param channel_id: The ID of the channel.
+        :type channel_id: int
+
+        :return: Whether the channel existed.
+        :rtype: bool
+        """
+        guild_id = self.channels.pop(channel_id, None)
+        if guild_id is None:
+            return False
+        channels = self.guilds[guild_id]
+        channels.discard(channel_id)
+        if not channels:
+            del self.guilds[guild_id]
+        self._pending[channel_id] = None
+        return True
+
+    def remove_guild(self, guild_id: int) -> Set[int]:
+        """
+        Remove every channel of a guild.
+
+        :param guild_id: The ID of the guild.
+        :type guild_id: int
+
+        :return: The IDs of the removed channels.
+        :rtype: Set[int]
+        """
+        channels = set(self.guilds.get(guild_id, ()))
+        for channel_id in channels:
+            self.remove(channel_id)
+        return channels
+
+    async def flush(self) -> None:
+        """
+        Write the pending changes to the database.
+        """
+        async with self._lock:
+            if not self._pending or self._connection is None:
+                return
+            pending, self._pending = self._pending, {}
+            try:
+                await asyncio.to_thread(self._write, pending)
+            except sqlite3.Error:
+                # keep the batch, unless a newer change of the same channel replaced it
+                self._pending = {**pending, **self._pending}
+                raise
+
+    def _write(self, pending: Dict[int, Optional[int]]) -> None:
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO channels VALUES (?, ?)",
+                [(c, g) for c, g in pending.items() if g is not None],
+            )
+            self._connection.executemany(
+                "DELETE FROM channels WHERE channel_id = ?",
+                [(c,) for c, g in pending.items() if g is None],
+            )
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except sqlite3.Error as e:
+                self.logger.warning(f"寫入 {self.path} 時出現錯誤: {e}")
+
+    async def close(self) -> None:
+        """
+        Write the pending changes and close the database.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
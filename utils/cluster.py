@@ -0,0 +1,390 @@
+"""
+Multi-process shard clustering.
+
+This file is part of ouoteam/ouov3 which is released under GNU General Public License v3.0.
+See file LISENCE for full license details.
+"""
+from __future__ import annotations
+
+import math
+import multiprocessing
+import queue
+import signal
+import sys
+import time
+import urllib.request
+from typing import Dict, List, Optional, Set, Tuple, Type
+
+import discord
+import orjson
+
+from utils.ipc import IPC
+from utils.logging import Logging
+
+__all__ = ["IdentifyGate", "Cluster"]
+
+
+class IdentifyGate:
+    """
+    Space out the identifies of all processes according to the gateway's ``max_concurrency``.
+    Shards in the same bucket (``shard_id % max_concurrency``) must identify at least 5 seconds
+    apart, while different buckets may identify at the same time.
+
+    :param context: The multiprocessing context to create the shared state with.
+    :type context: multiprocessing.context.BaseContext
+    :param max_concurrency: The number of identify buckets.
+    :type max_concurrency: int
+    """
+
+    interval = 5.0
+
+    def __init__(self, context: multiprocessing.context.BaseContext, max_concurrency: int) -> None:
+        self.max_concurrency = max_concurrency
+        self.locks = [context.Lock() for _ in range(max_concurrency)]
+        self.last = context.Array("d", max_concurrency, lock=False)
+
+    def wait(self, shard_id: int) -> None:
+        """
+        Block until the shard is allowed to identify.
+        This blocks the calling thread, run it in an executor from the event loop.
+
+        :param shard_id: The shard about to identify.
+        :type shard_id: int
+        """
+        bucket = shard_id % self.max_concurrency
+        with self.locks[bucket]:
+            delay = self.last[bucket] + self.interval - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            self.last[bucket] = time.time()
+
+
+class Cluster:
+    """
+    Supervisor that splits the shards across several bot processes.
+    Crashed processes are restarted with an exponential backoff, and the shard events of every
+    process are aggregated in the supervisor's log.
+
+    When the recommended shard count grows, the clusters are resharded without downtime: a new
+    generation of clusters is started in standby next to the current one, and every guild is
+    handed over as soon as its new shard is ready. The current generation is stopped once every
+    new shard took over, and its processes are reaped while the new generation is supervised.
+    Resharding is checked every ``reshard_interval`` hours and on SIGUSR1.
+
+    :param bot_class: The bot class to run in each process.
+    :type bot_class: Type[discord.AutoShardedBot]
+    :param token: The bot token.
+    :type token: str
+    :param clusters: The number of processes.
+    :type clusters: int
+    :param shard_count: The total number of shards, or None to use the recommended count.
+    :type shard_count: Optional[int]
+    :param reshard_interval: The interval between two reshard checks in hours, 0 to disable.
+    :type reshard_interval: float
+    """
+
+    gateway_url = "https://discord.com/api/v10/gateway/bot"
+    min_backoff = 5.0
+    max_backoff = 300.0
+    stable_after = 600.0
+    stop_timeout = 30.0
+
+    def __init__(
+        self,
+        bot_class: Type[discord.AutoShardedBot],
+        token: str,
+        clusters: int,
+        shard_count: Optional[int] = None,
+        reshard_interval: float = 0,
+    ) -> None:
+        self.bot_class = bot_class
+        self.token = token
+        self.clusters = clusters
+        self.shard_count = shard_count
+        self.reshard_interval = reshard_interval * 3600
+        self.logger = Logging.get_logger()
+        self.context = multiprocessing.get_context("spawn")
+        self.status_queue = self.context.Queue()
+        self.status: Dict[Tuple[int, int], str] = {}
+        self.processes: Dict[int, multiprocessing.Process] = {}
+        self.assignments: Dict[int, List[int]] = {}
+        self.identify_gate: Optional[IdentifyGate] = None
+        self.standby: Dict[int, List[int]] = {}
+        self.standby_shard_count: Optional[int] = None
+        self.active: Set[int] = set()
+        self.retiring: Dict[int, multiprocessing.Process] = {}
+        self._retiring_ids: List[int] = []
+        self._kill_at = math.inf
+        self._reshard_requested = False
+        self._next_reshard_check = math.inf
+        self._started: Dict[int, float] = {}
+        self._backoff: Dict[int, float] = {}
+        self._restart_at: Dict[int, float] = {}
+
+    def fetch_gateway(self) -> dict:
+        """
+        Fetch the recommended shard count and the session start limits.
+
+        :return: The gateway information.
+        :rtype: dict
+        """
+        request = urllib.request.Request(
+            self.gateway_url,
+            headers={"Authorization": f"Bot {self.token}", "User-Agent": "OuO Bot"},
+        )
+        with urllib.request.urlopen(request, timeout=30) as r:
+            return orjson.loads(r.read())
+
+    @classmethod
+    def split(cls, shard_count: int, clusters: int) -> List[List[int]]:
+        """
+        Split the shards into contiguous ranges, one per cluster.
+
+        :param shard_count: The total number of shards.
+        :type shard_count: int
+        :param clusters: The number of clusters.
+        :type clusters: int
+
+        :return: The shard ids of each cluster, empty clusters are left out.
+        :rtype: List[List[int]]
+        """
+        size = math.ceil(shard_count / clusters)
+        return [
+            list(range(start, min(start + size, shard_count)))
+            for start in range(0, shard_count, size)
+        ]
+
+    @classmethod
+    def _worker(
+        cls,
+        bot_class: Type[discord.AutoShardedBot],
+        cluster_id: int,
+        shard_ids: List[int],
+        shard_count: int,
+        identify_gate: IdentifyGate,
+        status_queue: multiprocessing.Queue,
+        standby: bool,
+    ) -> None:
+        """
+        The entry point of a cluster process.
+        """
+        bot_class(
+            shard_ids=shard_ids,
+            shard_count=shard_count,
+            cluster_id=cluster_id,
+            identify_gate=identify_gate,
+            status_queue=status_queue,
+            standby=standby,
+        ).run()
+
+    def spawn(self, cluster_id: int) -> None:
+        """
+        Start the process of a cluster.
+
+        :param cluster_id: The cluster to start.
+        :type cluster_id: int
+        """
+        standby = cluster_id in self.standby
+        shards = self.standby[cluster_id] if standby else self.assignments[cluster_id]
+        process = self.context.Process(
+            target=self._worker,
+            name=f"cluster-{cluster_id}",
+            args=(
+                self.bot_class,
+                cluster_id,
+                shards,
+                self.standby_shard_count if standby else self.shard_count,
+                self.identify_gate,
+                self.status_queue,
+                standby,
+            ),
+        )
+        process.start()
+        self.processes[cluster_id] = process
+        self._started[cluster_id] = time.monotonic()
+        self.logger.info(f"叢集 {cluster_id} 已啟動 (PID {process.pid}，分片 {shards[0]}-{shards[-1]})")
+
+    def supervise(self) -> None:
+        """
+        Restart the clusters that exited, with an exponential backoff for crash loops.
+        """
+        now = time.monotonic()
+        if self.retiring:
+            self.reap(now)
+        for cluster_id, process in list(self.processes.items()):
+            if process.is_alive():
+                if now - self._started[cluster_id] > self.stable_after:
+                    self._backoff.pop(cluster_id, None)
+                continue
+            if cluster_id not in self._restart_at:
+                backoff = self._backoff.get(cluster_id, self.min_backoff / 2) * 2
+                self._backoff[cluster_id] = min(backoff, self.max_backoff)
+                self._restart_at[cluster_id] = now + self._backoff[cluster_id]
+                self.logger.error(
+                    f"叢集 {cluster_id} 已結束 (代碼 {process.exitcode})，"
+                    f"{self._backoff[cluster_id]:.0f} 秒後重新啟動"
+                )
+            elif now >= self._restart_at.pop(cluster_id):
+                self.spawn(cluster_id)
+
+    def reap(self, now: float) -> None:
+        """
+        Collect the processes of the stopped generation, killing the ones that did not exit in
+        time, and unregister the generation once every process exited.
+
+        :param now: The current monotonic time.
+        :type now: float
+        """
+        for cluster_id, process in list(self.retiring.items()):
+            if not process.is_alive():
+                process.join()
+                del self.retiring[cluster_id]
+            elif now >= self._kill_at:
+                process.kill()
+        if not self.retiring:
+            IPC.retire(self._retiring_ids)
+            self.logger.info(f"叢集 {', '.join(map(str, self._retiring_ids))} 已結束")
+            self._retiring_ids = []
+
+    def collect_status(self, timeout: float) -> None:
+        """
+        Aggregate the shard events reported by the clusters.
+
+        :param timeout: How long to wait for the first event.
+        :type timeout: float
+        """
+        try:
+            cluster_id, shard_id, event = self.status_queue.get(timeout=timeout)
+        except queue.Empty:
+            return
+        self.status[cluster_id, shard_id] = event
+        self.logger.debug(f"叢集 {cluster_id} 分片 {shard_id}: {event}")
+        if cluster_id in self.standby:
+            if event == "ready" and shard_id not in self.active:
+                self.activate(shard_id)
+        elif event == "ready":
+            ready = sum(
+                self.status.get((cluster_id, shard_id)) in ("ready", "resumed")
+                for cluster_id, shards in self.assignments.items()
+                for shard_id in shards
+            )
+            if ready == self.shard_count:
+                self.logger.info(f"{ready}/{self.shard_count} 個分片已準備就緒")
+
+    def reshard(self) -> None:
+        """
+        Start a new generation of clusters in standby if the recommended shard count grew.
+        The new clusters get new ids, so both generations can run side by side.
+        """
+        if self.standby or self.retiring:
+            return
+        shard_count = self.fetch_gateway()["shards"]
+        if shard_count <= self.shard_count:
+            self.logger.debug(f"不需要重新分片 (建議分片數量 {shard_count})")
+            return
+        self.logger.info(f"開始重新分片: {self.shard_count} -> {shard_count} 個分片")
+        self.standby_shard_count = shard_count
+        offset = max(self.processes) + 1
+        self.standby = {
+            offset + i: shards for i, shards in enumerate(self.split(shard_count, self.clusters))
+        }
+        self.active = set()
+        # tell the current generation to export its state before the new one starts
+        IPC.announce("reshard", {"shard_count": shard_count, "active": [], "complete": False})
+        for cluster_id in self.standby:
+            self.spawn(cluster_id)
+
+    def activate(self, shard_id: int) -> None:
+        """
+        Hand the guilds of a ready standby shard over to it.
+        The current generation is stopped once every standby shard is active.
+
+        :param shard_id: The standby shard that is ready.
+        :type shard_id: int
+        """
+        self.active.add(shard_id)
+        complete = len(self.active) == self.standby_shard_count
+        IPC.announce(
+            "reshard",
+            {
+                "shard_count": self.standby_shard_count,
+                "active": sorted(self.active),
+                "complete": complete,
+            },
+        )
+        self.logger.debug(f"分片 {shard_id} 已接手 ({len(self.active)}/{self.standby_shard_count})")
+        if not complete:
+            return
+        # the old processes are reaped by supervise, waiting for them would stall the supervisor
+        self._retiring_ids = list(self.assignments)
+        for cluster_id in self._retiring_ids:
+            process = self.retiring[cluster_id] = self.processes.pop(cluster_id)
+            if process.is_alive():
+                process.terminate()
+            self._restart_at.pop(cluster_id, None)
+            self._backoff.pop(cluster_id, None)
+        self._kill_at = time.monotonic() + self.stop_timeout
+        self.status = {k: v for k, v in self.status.items() if k[0] in self.standby}
+        self.assignments, self.standby = self.standby, {}
+        self.shard_count, self.standby_shard_count = self.standby_shard_count, None
+        self.logger.info(f"重新分片完成，目前共有 {self.shard_count} 個分片")
+
+    def run(self) -> None:
+        """
+        Start all clusters and supervise them until interrupted.
+        """
+        gateway = self.fetch_gateway()
+        self.shard_count = self.shard_count or gateway["shards"]
+        max_concurrency = gateway["session_start_limit"]["max_concurrency"]
+        self.identify_gate = IdentifyGate(self.context, max_concurrency)
+        IPC.reset()
+        self.assignments = dict(enumerate(self.split(self.shard_count, self.clusters)))
+        self.logger.info(
+            f"以 {len(self.assignments)} 個叢集啟動 {self.shard_count} 個分片"
+            f" (max_concurrency={max_concurrency})"
+        )
+        for cluster_id in self.assignments:
+            self.spawn(cluster_id)
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda *_: setattr(self, "_reshard_requested", True))
+        if self.reshard_interval:
+            self._next_reshard_check = time.monotonic() + self.reshard_interval
+        try:
+            while True:
+                self.collect_status(timeout=1.0)
+                self.supervise()
+                if self._reshard_requested or time.monotonic() >= self._next_reshard_check:
+                    self._reshard_requested = False
+                    if self.reshard_interval:
+                        self._next_reshard_check = time.monotonic() + self.reshard_interval
+                    try:
+                        self.reshard()
+                    except OSError as e:
+                        self.logger.warning(f"無法取得建議分片數量: {e}")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """
+        Stop all clusters.
+        """
+        self.stop([*self.processes.values(), *self.retiring.values()])
+
+    @classmethod
+    def stop(cls, processes: List[multiprocessing.Process]) -> None:
+        """
+        Stop cluster processes, killing the ones that did not exit in time.
+
+        :param processes: The processes to stop.
+        :type processes: List[multiprocessing.Process]
+        """
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join(timeout=cls.stop_timeout)
+            if process.is_alive():
+                process.kill()
@@ -0,0 +1,482 @@
+"""
+A safe arithmetic expression evaluator, with a Pratt parser, Decimal arithmetic and numpy tables.
+
+This file is part of ouoteam/ouov3 which is released under GNU General Public License v3.0.
+See file LISENCE for full license details.
+"""
+from __future__ import annotations
+
+import decimal
+import functools
+import math
+import re
+from decimal import Decimal
+from typing import TYPE_CHECKING, Callable, Dict, List, Tuple, Union
+
+if TYPE_CHECKING:
+    import numpy as np
+
+__all__ = ["Expression", "ExpressionError"]
+
+# an AST node is a tuple whose first item is its kind:
+# ("num", Decimal), ("var", name), ("neg", node), ("fact", node),
+# ("bin", operator, left, right) and ("call", name, (arguments, ...))
+Node = Tuple
+
+_TOKEN = re.compile(
+    r"\s*(?:"
+    r"(?P<num>(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)"
+    r"|(?P<name>[A-Za-z_]\w*)"
+    r"|(?P<op>\*\*|//|[-+*/%^!(),×÷])"
+    r")"
+)
+_ALIASES = {"×": "*", "÷": "/", "**": "^"}
+# left binding powers of the infix and postfix operators
+_INFIX = {"+": 10, "-": 10, "*": 20, "/": 20, "//": 20, "%": 20, "^": 40}
+_PREFIX = 30
+_POSTFIX = 50
+
+
+class ExpressionError(ValueError):
+    """
+    An expression could not be parsed or evaluated.
+
+    :param key: The locale key of the message, under ``calculator.calc.errors``.
+    :type key: str
+    :param kwargs: The arguments of the message.
+    :type kwargs: dict
+    """
+
+    def __init__(self, key: str, **kwargs) -> None:
+        super().__init__(key, kwargs)
+        self.key = key
+        self.kwargs = kwargs
+
+
+class Expression:
+    """
+    Evaluate arithmetic expressions from untrusted input without ``eval``.
+    Expressions are tokenized, parsed into tuples by a Pratt parser and evaluated with Decimal
+    arithmetic. The parsed trees of recent expressions are kept in an LRU cache.
+
+    Every evaluation is bounded: expressions have a maximum length and nesting, evaluations a
+    maximum number of operations, powers a maximum exponent and factorials a maximum argument,
+    and the decimal context raises on overflow, so no input can use much CPU or memory.
+
+    :cvar max_length: The maximum length of an expression.
+    :vartype max_length: int
+    :cvar max_depth: The maximum nesting of an expression.
+    :vartype max_depth: int
+    :cvar max_operations: The maximum number of operations of an evaluation.
+    :vartype max_operations: int
+    :cvar max_exponent: The maximum absolute exponent of a power.
+    :vartype max_exponent: int
+    :cvar max_factorial: The maximum argument of a factorial.
+    :vartype max_factorial: int
+    :cvar max_points: The maximum number of points of a table.
+    :vartype max_points: int
+    :cvar max_elements: The maximum number of array elements computed for a table, the number
+        of points times the number of operations.
+    :vartype max_elements: int
+    :cvar context: The decimal context of the evaluations.
+    :vartype context: decimal.Context
+    """
+
+    max_length = 500
+    max_depth = 50
+    max_operations = 10_000
+    max_exponent = 100_000
+    max_factorial = 1000
+    max_points = 100_000
+    max_elements = 20_000_000
+    context = decimal.Context(
+        prec=50,
+        Emax=999_999,
+        Emin=-999_999,
+        traps=[decimal.InvalidOperation, decimal.DivisionByZero, decimal.Overflow],
+    )
+    constants: Dict[str, Decimal] = {
+        "pi": Decimal("3.14159265358979323846264338327950288419716939937510"),
+        "e": Decimal("2.71828182845904523536028747135266249775724709369995"),
+    }
+    functions: Dict[str, Tuple[int, Callable[..., Decimal]]] = {
+        "abs": (1, abs),
+        "sqrt": (1, lambda x: x.sqrt()),
+        "exp": (1, lambda x: x.exp()),
+        "ln": (1, lambda x: x.ln()),
+        "log": (1, lambda x: x.log10()),
+        "floor": (1, lambda x: x.to_integral_value(rounding=decimal.ROUND_FLOOR)),
+        "ceil": (1, lambda x: x.to_integral_value(rounding=decimal.ROUND_CEILING)),
+        "round": (1, lambda x: x.to_integral_value(rounding=decimal.ROUND_HALF_EVEN)),
+        "sin": (1, lambda x: Decimal(repr(math.sin(x)))),
+        "cos": (1, lambda x: Decimal(repr(math.cos(x)))),
+        "tan": (1, lambda x: Decimal(repr(math.tan(x)))),
+        "min": (-1, lambda *x: min(x)),
+        "max": (-1, lambda *x: max(x)),
+    }
+
+    @classmethod
+    def tokenize(cls, expression: str) -> List[Tuple[str, Union[str, Decimal], int]]:
+        """
+        Split an expression into tokens.
+
+        :param expression: The expression.
+        :type expression: str
+
+        :raises ExpressionError: If the expression is too long or has an unknown character.
+
+        :return: The kind, the value and the position of every token, then an end token.
+        :rtype: List[Tuple[str, Union[str, Decimal], int]]
+        """
+        if len(expression) > cls.max_length:
+            raise ExpressionError("too_long", max=cls.max_length)
+        tokens = []
+        position = 0
+        expression = expression.rstrip()
+        while position < len(expression):
+            match = _TOKEN.match(expression, position)
+            if match is None or match.end() == position:
+                position = len(expression) - len(expression[position:].lstrip())
+                raise ExpressionError("unexpected", token=expression[position], position=position)
+            kind = match.lastgroup
+            value: Union[str, Decimal] = match.group(kind)
+            if kind == "num":
+                value = Decimal(value)
+                if abs(value.adjusted()) > cls.context.Emax:
+                    raise ExpressionError("overflow")
+            elif kind == "op":
+                value = _ALIASES.get(value, value)
+            tokens.append((kind, value, match.start(kind)))
+            position = match.end()
+        tokens.append(("end", "", len(expression)))
+        return tokens
+
+    @classmethod
+    @functools.lru_cache(maxsize=1024)
+    def parse(cls, expression: str, variables: Tuple[str, ...] = ()) -> Node:
+        """
+        Parse an expression, the trees of the recent expressions are cached.
+
+        :param expression: The expression.
+        :type expression: str
+        :param variables: The names of the variables the expression may use.
+        :type variables: Tuple[str, ...]
+
+        :raises ExpressionError: If the expression is invalid.
+
+        :return: The tree of the expression.
+        :rtype: Node
+        """
+        tokens = cls.tokenize(expression)
+        if len(tokens) == 1:
+            raise ExpressionError("empty")
+        parser = _Parser(tokens, cls.max_depth, variables)
+        node = parser.expression(0)
+        kind, value, position = parser.peek()
+        if kind != "end":
+            raise ExpressionError("unexpected", token=str(value), position=position)
+        return node
+
+    @classmethod
+    def evaluate(cls, expression: str) -> Decimal:
+        """
+        Evaluate an expression.
+
+        :param expression: The expression.
+        :type expression: str
+
+        :raises ExpressionError: If the expression is invalid, exceeds a limit or is undefined.
+
+        :return: The value.
+        :rtype: Decimal
+        """
+        node = cls.parse(expression)
+        budget = [cls.max_operations]
+        try:
+            with decimal.localcontext(cls.context):
+                value = +cls._evaluate(node, budget)
+        except ExpressionError:
+            raise
+        except decimal.DivisionByZero:
+            raise ExpressionError("division_by_zero") from None
+        except decimal.Overflow:
+            raise ExpressionError("overflow") from None
+        except (decimal.InvalidOperation, ValueError, OverflowError):
+            # such as the square root of a negative number, or 0 ^ -1
+            raise ExpressionError("undefined") from None
+        if not value.is_finite():
+            raise ExpressionError("undefined")
+        return value
+
+    @classmethod
+    def tabulate(
+        cls, expression: str, start: float, stop: float, points: int, variable: str = "x"
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Evaluate an expression of one variable at evenly spaced points.
+        The tree is evaluated once with numpy arrays, in float64, so every operation runs over
+        all the points at once. Undefined values, such as the square root of a negative number,
+        are NaN.
+
+        :param expression: The expression.
+        :type expression: str
+        :param start: The first value of the variable.
+        :type start: float
+        :param stop: The last value of the variable.
+        :type stop: float
+        :param points: The number of points.
+        :type points: int
+        :param variable: The name of the variable.
+        :type variable: str
+
+        :raises ExpressionError: If the expression is invalid or exceeds a limit.
+
+        :return: The values of the variable and of the expression.
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        if not 2 <= points <= cls.max_points:
+            raise ExpressionError("points", max=cls.max_points)
+        if not (math.isfinite(start) and math.isfinite(stop)):
+            raise ExpressionError("overflow")
+        node = cls.parse(expression, (variable,))
+        if _size(node) * points > cls.max_elements:
+            raise ExpressionError("too_complex", max=cls.max_elements // points)
+        # numpy is only imported by the first table, it is not needed to evaluate expressions
+        import numpy as np
+
+        x = np.linspace(start, stop, points)
+        with np.errstate(all="ignore"):
+            y = np.broadcast_to(cls._vectorize(node, x, variable), x.shape).astype(np.float64)
+        return x, y
+
+    @classmethod
+    def format(cls, value: Decimal, digits: int = 30) -> str:
+        """
+        Format a value for display.
+
+        :param value: The value.
+        :type value: Decimal
+        :param digits: The number of significant digits.
+        :type digits: int
+
+        :return: The value in positional notation, or in scientific notation if it is very large
+            or very small.
+        :rtype: str
+        """
+        with decimal.localcontext(cls.context) as context:
+            context.prec = digits
+            value = (+value).normalize()
+        if value.is_zero():
+            return "0"
+        if -10 <= value.adjusted() < digits:
+            return f"{value:f}"
+        return f"{value:e}".replace("e+", "e")
+
+    @classmethod
+    def _evaluate(cls, node: Node, budget: List[int]) -> Decimal:
+        budget[0] -= 1
+        if budget[0] < 0:
+            raise ExpressionError("too_complex", max=cls.max_operations)
+        kind = node[0]
+        if kind == "num":
+            return node[1]
+        if kind == "var":
+            return cls.constants[node[1]]
+        if kind == "neg":
+            return -cls._evaluate(node[1], budget)
+        if kind == "fact":
+            value = cls._evaluate(node[1], budget)
+            if value != value.to_integral_value() or value < 0:
+                raise ExpressionError("undefined")
+            if value > cls.max_factorial:
+                raise ExpressionError("factorial_too_large", max=cls.max_factorial)
+            budget[0] -= int(value)
+            if budget[0] < 0:
+                raise ExpressionError("too_complex", max=cls.max_operations)
+            result = Decimal(1)
+            for i in range(2, int(value) + 1):
+                result *= i
+            return result
+        if kind == "call":
+            arguments = [cls._evaluate(argument, budget) for argument in node[2]]
+            return cls.functions[node[1]][1](*arguments)
+        _, operator, left, right = node
+        left = cls._evaluate(left, budget)
+        right = cls._evaluate(right, budget)
+        if operator == "+":
+            return left + right
+        if operator == "-":
+            return left - right
+        if operator == "*":
+            return left * right
+        if operator == "/":
+            return left / right
+        if operator == "//":
+            return (left / right).to_integral_value(rounding=decimal.ROUND_FLOOR)
+        if operator == "%":
+            return left - right * (left / right).to_integral_value(rounding=decimal.ROUND_FLOOR)
+        if abs(right) > cls.max_exponent:
+            raise ExpressionError("exponent_too_large", max=cls.max_exponent)
+        return left**right
+
+    @classmethod
+    def _vectorize(cls, node: Node, x: np.ndarray, variable: str) -> Union[np.ndarray, float]:
+        import numpy as np
+
+        factorials, binary, ufuncs = _tables()
+        kind = node[0]
+        if kind == "num":
+            return float(node[1])
+        if kind == "var":
+            return x if node[1] == variable else float(cls.constants[node[1]])
+        if kind == "neg":
+            return np.negative(cls._vectorize(node[1], x, variable))
+        if kind == "fact":
+            value = np.asarray(cls._vectorize(node[1], x, variable))
+            # the factorials that fit in a float64, NaN elsewhere
+            integral = (value == np.floor(value)) & (value >= 0) & (value < len(factorials))
+            return np.where(integral, factorials[np.where(integral, value, 0).astype(int)], np.nan)
+        if kind == "call":
+            arguments = [cls._vectorize(argument, x, variable) for argument in node[2]]
+            return ufuncs[node[1]](*arguments)
+        _, operator, left, right = node
+        return binary[operator](
+            cls._vectorize(left, x, variable), cls._vectorize(right, x, variable)
+        )
+
+
+def _size(node: Node) -> int:
+    if node[0] == "bin":
+        return 1 + _size(node[2]) + _size(node[3])
+    if node[0] == "call":
+        return 1 + sum(_size(argument) for argument in node[2])
+    if node[0] in ("neg", "fact"):
+        return 1 + _size(node[1])
+    return 1
+
+
+@functools.lru_cache(maxsize=None)
+def _tables() -> Tuple[np.ndarray, Dict[str, Callable], Dict[str, Callable]]:
+    # the factorials that fit in a float64, then the numpy versions of the operators and functions
+    import numpy as np
+
+    factorials = np.array([math.factorial(n) for n in range(171)], dtype=np.float64)
+    binary: Dict[str, Callable] = {
+        "+": np.add,
+        "-": np.subtract,
+        "*": np.multiply,
+        "/": np.true_divide,
+        "//": np.floor_divide,
+        "%": np.mod,
+        "^": lambda a, b: np.power(np.asarray(a, dtype=np.float64), b),
+    }
+    ufuncs: Dict[str, Callable] = {
+        "abs": np.abs,
+        "sqrt": np.sqrt,
+        "exp": np.exp,
+        "ln": np.log,
+        "log": np.log10,
+        "floor": np.floor,
+        "ceil": np.ceil,
+        "round": np.rint,
+        "sin": np.sin,
+        "cos": np.cos,
+        "tan": np.tan,
+        "min": lambda *a: functools.reduce(np.minimum, a),
+        "max": lambda *a: functools.reduce(np.maximum, a),
+    }
+    return factorials, binary, ufuncs
+
+
+class _Parser:
+    """
+    A Pratt parser over the tokens of an expression.
+    """
+
+    __slots__ = ("tokens", "index", "max_depth", "variables", "depth")
+
+    def __init__(
+        self,
+        tokens: List[Tuple[str, Union[str, Decimal], int]],
+        max_depth: int,
+        variables: Tuple[str, ...] = (),
+    ):
+        self.tokens = tokens
+        self.index = 0
+        self.max_depth = max_depth
+        self.variables = variables
+        self.depth = 0
+
+    def peek(self) -> Tuple[str, Union[str, Decimal], int]:
+        return self.tokens[self.index]
+
+    def next(self) -> Tuple[str, Union[str, Decimal], int]:
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def expect(self, value: str) -> None:
+        kind, token, position = self.next()
+        if token != value or kind != "op":
+            if kind == "end":
+                raise ExpressionError("unexpected_end")
+            raise ExpressionError("unexpected", token=str(token), position=position)
+
+    def expression(self, binding_power: int) -> Node:
+        self.depth += 1
+        if self.depth > self.max_depth:
+            raise ExpressionError("too_deep", max=self.max_depth)
+        left = self.prefix()
+        while True:
+            kind, token, _ = self.peek()
+            if kind != "op":
+                break
+            if token == "!":
+                if _POSTFIX <= binding_power:
+                    break
+                self.next()
+                left = ("fact", left)
+                continue
+            power = _INFIX.get(token)
+            if power is None or power <= binding_power:
+                break
+            self.next()
+            # ^ is right associative, so its right side binds one less
+            right = self.expression(power - 1 if token == "^" else power)
+            left = ("bin", token, left, right)
+        self.depth -= 1
+        return left
+
+    def prefix(self) -> Node:
+        kind, token, position = self.next()
+        if kind == "num":
+            return ("num", token)
+        if kind == "name":
+            if token in Expression.constants or token in self.variables:
+                return ("var", token)
+            if token not in Expression.functions:
+                raise ExpressionError("unknown_name", name=token, position=position)
+            return self.call(token, position)
+        if token == "-":
+            return ("neg", self.expression(_PREFIX))
+        if token == "+":
+            return self.expression(_PREFIX)
+        if token == "(":
+            node = self.expression(0)
+            self.expect(")")
+            return node
+        if kind == "end":
+            raise ExpressionError("unexpected_end")
+        raise ExpressionError("unexpected", token=str(token), position=position)
+
+    def call(self, name: str, position: int) -> Node:
+        self.expect("(")
+        arguments = [self.expression(0)]
+        while self.peek()[1] == ",":
+            self.next()
+            arguments.append(self.expression(0))
+        self.expect(")")
+        arity = Expression.functions[name][0]
+        if arity >= 0 and len(arguments) != arity:
+            raise ExpressionError("arguments", name=name, count=arity, position=position)
+        return ("call", name, tuple(arguments))
@@ -0,0 +1,205 @@
+"""
+Run game AI searches off the event loop, in a pool shared by every game.
+
+This file is part of ouoteam/ouov3 which is released under GNU General Public License v3.0.
+See file LISENCE for full license details.
+"""
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import multiprocessing
+import time
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from utils.logging import Logging
+
+if TYPE_CHECKING:
+    from utils.tictactoe import SearchResult, Tictactoe
+
+__all__ = ["GameAI"]
+
+# the cancel flags of the worker, set by the pool initializer
+_flags = None
+
+
+def _init(flags) -> None:
+    global _flags
+    _flags = flags
+    # the engines are imported by the workers, not by every process importing this module
+    import utils.tictactoe  # noqa: F401
+
+
+def _search(
+    size: int,
+    k: int,
+    mover: int,
+    opponent: int,
+    side: int,
+    max_depth: Optional[int],
+    time_limit: float,
+    slot: int,
+) -> SearchResult:
+    from utils.tictactoe import Engine
+
+    return Engine.get(size, k).search(
+        mover, opponent, side, max_depth, time_limit, stop=lambda: _flags[slot]
+    )
+
+
+class GameAI:
+    """
+    Search the moves of the computer player in a process pool, or a thread pool, shared by all
+    games. Each search has a time budget and returns the best move found when it runs out, and
+    cancelling the awaiting task stops the search in the worker at its next time check.
+
+    Every search in flight holds one of ``workers`` slots, each slot owning a cancel flag in
+    shared memory, so a search waiting for a slot is not yet in the pool and its wait counts
+    towards its budget.
+
+    :cvar workers: The number of workers.
+    :vartype workers: int
+    :cvar processes: Whether the workers are processes, otherwise threads.
+    :vartype processes: bool
+    :cvar budget: The default time budget of a move in seconds.
+    :vartype budget: float
+    """
+
+    workers = 2
+    processes = True
+    budget = 1.0
+    logger = Logging.get_logger()
+    _executor: Optional[concurrent.futures.Executor] = None
+    _flags = None
+    _slots: Optional[asyncio.Queue] = None
+
+    @classmethod
+    def start(cls) -> None:
+        """
+        Start the pool. It is started by the first search if it was not started before.
+        """
+        if cls._executor is not None:
+            return
+        if cls.processes:
+            context = multiprocessing.get_context("spawn")
+            cls._flags = context.RawArray("b", cls.workers)
+            cls._executor = concurrent.futures.ProcessPoolExecutor(
+                cls.workers, mp_context=context, initializer=_init, initargs=(cls._flags,)
+            )
+        else:
+            cls._flags = [0] * cls.workers
+            cls._executor = concurrent.futures.ThreadPoolExecutor(
+                cls.workers, "game-ai", initializer=_init, initargs=(cls._flags,)
+            )
+        cls._slots = asyncio.Queue()
+        for slot in range(cls.workers):
+            cls._slots.put_nowait(slot)
+        cls.logger.info(f"遊戲 AI 已啟動 {cls.workers} 個{'程序' if cls.processes else '執行緒'}")
+
+    @classmethod
+    def stop(cls) -> None:
+        """
+        Stop the searches in flight and shut the pool down.
+        """
+        if cls._executor is None:
+            return
+        for slot in range(cls.workers):
+            cls._flags[slot] = 1
+        cls._executor.shutdown(wait=False, cancel_futures=True)
+        cls._executor = None
+        cls._slots = None
+
+    @classmethod
+    async def search(
+        cls,
+        game: Tictactoe,
+        side: int = 0,
+        budget: Optional[float] = None,
+        max_depth: Optional[int] = None,
+    ) -> SearchResult:
+        """
+        Search the best move of a player in the pool.
+
+        :param game: The game.
+        :type game: Tictactoe
+        :param side: The player to move, 0 for X and 1 for O.
+        :type side: int
+        :param budget: The time budget in seconds, :attr:`budget` by default.
+        :type budget: Optional[float]
+        :param max_depth: The maximum search depth in plies, unlimited by default.
+        :type max_depth: Optional[int]
+
+        :raises asyncio.CancelledError: If the search was cancelled.
+
+        :return: The result of the search.
+        :rtype: SearchResult
+        """
+        deadline = time.monotonic() + (cls.budget if budget is None else budget)
+        mover, opponent = (game.x, game.o) if side == 0 else (game.o, game.x)
+        cls.start()
+        slots = cls._slots
+        slot = await slots.get()
+        cls._flags[slot] = 0
+        future = cls._executor.submit(
+            _search,
+            game.size,
+            game.k,
+            mover,
+            opponent,
+            side,
+            max_depth,
+            # the first depth always completes, even if the budget was spent waiting for a slot
+            max(0.0, deadline - time.monotonic()),
+            slot,
+        )
+        # the slot is only free again once the worker let go of its flag, the callback runs in
+        # the thread of the pool
+        loop = asyncio.get_running_loop()
+
+        def release(_) -> None:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(slots.put_nowait, slot)
+
+        future.add_done_callback(release)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            cls._flags[slot] = 1
+            raise
+
+    @classmethod
+    async def best_move(
+        cls,
+        game: Tictactoe,
+        side: int = 0,
+        budget: Optional[float] = None,
+        max_depth: Optional[int] = None,
+    ) -> Optional[Tuple[int, int]]:
+        """
+        Get the best move of a player. A 3×3 game is looked up in the solver table without
+        going through the pool.
+
+        :param game: The game.
+        :type game: Tictactoe
+        :param side: The player to move, 0 for X and 1 for O.
+        :type side: int
+        :param budget: The time budget in seconds, :attr:`budget` by default.
+        :type budget: Optional[float]
+        :param max_depth: The maximum search depth in plies, unlimited by default.
+        :type max_depth: Optional[int]
+
+        :raises asyncio.CancelledError: If the search was cancelled.
+
+        :return: The row and column indices of the move, or None if the game is over.
+        :rtype: Optional[Tuple[int, int]]
+        """
+        if game.evaluate_result() is not False:
+            return None
+        if game.size == 3 and game.k == 3:
+            from utils.tictactoe import Solver
+
+            mover, opponent = (game.x, game.o) if side == 0 else (game.o, game.x)
+            cell = Solver.solve(mover, opponent)[1]
+        else:
+            cell = (await cls.search(game, side, budget, max_depth)).move
+        return divmod(cell, game.size)
@@ -0,0 +1,358 @@
+"""
+An offline index of the API symbols of Sphinx documentations, from their objects.inv.
+
+This file is part of ouoteam/ouov3 which is released under GNU General Public License v3.0.
+See file LISENCE for full license details.
+"""
+from __future__ import annotations
+
+import array
+import asyncio
+import bisect
+import contextlib
+import os
+import re
+import zlib
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import aiohttp
+
+from utils.logging import Logging
+
+__all__ = ["Symbol", "Inventory", "InventoryIndex"]
+
+_LINE = re.compile(r"(.+?)\s+(\S+):(\S+)\s+(-?\d+)\s+(\S*)\s+(.*)")
+# among equally good matches, classes come first, then functions, then attributes and data
+_ROLE_RANKS = {
+    "class": 0,
+    "exception": 0,
+    "function": 1,
+    "decorator": 1,
+    "method": 1,
+    "classmethod": 1,
+    "staticmethod": 1,
+}
+
+
+class Symbol(NamedTuple):
+    """
+    A documented object.
+    """
+
+    name: str
+    role: str
+    url: str
+
+
+class Inventory:
+    """
+    The Python objects of one documentation, searchable by prefix and fuzzily.
+    Names are kept in sorted arrays, once by full name and once by their last component, so
+    exact and prefix lookups are binary searches. Substring and fuzzy lookups only look at the
+    names having every character of the query, found with a bit mask of the characters of every
+    name.
+
+    :param base: The URL the relative URLs of the inventory are relative to.
+    :type base: str
+    :param entries: The name, role and relative URL of every object, the URL ending with ``$``
+        when the anchor is the name.
+    :type entries: List[Tuple[str, str, str]]
+    """
+
+    def __init__(self, base: str, entries: List[Tuple[str, str, str]]) -> None:
+        # numpy is imported by the first inventory, the cogs using it may never need one
+        import numpy as np
+
+        self.base = base
+        entries.sort(key=lambda e: e[0].lower())
+        self.names = [name for name, _, _ in entries]
+        self.keys = [name.lower() for name in self.names]
+        self.roles = sorted({role for _, role, _ in entries})
+        role_ids = {role: i for i, role in enumerate(self.roles)}
+        self.role_ids = array.array("B", (role_ids[role] for _, role, _ in entries))
+        self.role_ranks = [_ROLE_RANKS.get(role, 2) for role in self.roles]
+        self.uris = [uri for _, _, uri in entries]
+        tails = sorted((key.rsplit(".", 1)[-1], i) for i, key in enumerate(self.keys))
+        self.tail_keys = [tail for tail, _ in tails]
+        self.tail_ids = array.array("I", (i for _, i in tails))
+        self.masks = np.array([self._mask(key) for key in self.keys], dtype=np.uint64)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def parse(cls, data: bytes, base: str) -> Inventory:
+        """
+        Parse a version 2 Sphinx inventory, keeping the objects of the Python domain.
+
+        :param data: The content of objects.inv.
+        :type data: bytes
+        :param base: The URL of the documentation.
+        :type base: str
+
+        :raises ValueError: If the data is not a version 2 inventory.
+
+        :return: The inventory.
+        :rtype: Inventory
+        """
+        header, _, rest = data.partition(b"\n")
+        if header.strip() != b"# Sphinx inventory version 2":
+            raise ValueError("Not a Sphinx inventory version 2")
+        # the project, the version and the compression notice
+        for _ in range(3):
+            _, _, rest = rest.partition(b"\n")
+        entries = []
+        for line in zlib.decompress(rest).decode("utf-8").splitlines():
+            match = _LINE.match(line.rstrip())
+            if match is None:
+                continue
+            name, domain, role, _, uri, _ = match.groups()
+            if domain == "py":
+                entries.append((name, role, uri))
+        return cls(base, entries)
+
+    def symbol(self, i: int) -> Symbol:
+        """
+        Get an object.
+
+        :param i: The index of the object.
+        :type i: int
+
+        :return: The object.
+        :rtype: Symbol
+        """
+        name, uri = self.names[i], self.uris[i]
+        if uri.endswith("$"):
+            uri = uri[:-1] + name
+        return Symbol(name, self.roles[self.role_ids[i]], self.base + uri)
+
+    def search(self, query: str, limit: int = 25, fuzzy: bool = True) -> List[Symbol]:
+        """
+        Search objects, ranked by exact names, then prefixes, then substrings, then names
+        containing the characters of the query in order if fuzzy. Exact names and prefixes list classes,
+        then functions, then the other objects, shorter names first, while substrings list
+        shorter names first.
+
+        :param query: The query.
+        :type query: str
+        :param limit: The maximum number of objects.
+        :type limit: int
+        :param fuzzy: Whether to add the names containing the characters of the query in order,
+            which match almost anything in a large inventory but suit autocompletion.
+        :type fuzzy: bool
+
+        :return: The objects.
+        :rtype: List[Symbol]
+        """
+        return [self.symbol(i) for i in self.find(query, limit, fuzzy)]
+
+    def find(self, query: str, limit: int = 25, fuzzy: bool = True) -> List[int]:
+        """
+        Search objects, like :meth:`search`, by index.
+
+        :param query: The query.
+        :type query: str
+        :param limit: The maximum number of objects.
+        :type limit: int
+        :param fuzzy: Whether to add the names containing the characters of the query in order.
+        :type fuzzy: bool
+
+        :return: The indexes of the objects.
+        :rtype: List[int]
+        """
+        query = query.strip().lower()
+        if not query:
+            return []
+        found: Dict[int, None] = {}
+        for i in sorted(self._exact(query), key=self._rank):
+            found[i] = None
+        if len(found) < limit:
+            for i in sorted(self._prefix(query, limit * 4), key=self._rank):
+                found[i] = None
+        if len(found) < limit:
+            candidates = self._candidates(query)
+            substrings = [i for i in candidates if query in self.keys[i]]
+            for i in sorted(substrings, key=lambda i: len(self.keys[i]))[:limit]:
+                found[i] = None
+            if fuzzy and len(found) < limit and len(query) > 2:
+                for i in self._subsequences(query, candidates, limit * 4):
+                    found[i] = None
+        return list(found)[:limit]
+
+    def _rank(self, i: int) -> Tuple[int, int, int]:
+        key = self.keys[i]
+        return self.role_ranks[self.role_ids[i]], len(key), key.count(".")
+
+    def _exact(self, query: str) -> List[int]:
+        result = []
+        i = bisect.bisect_left(self.keys, query)
+        if i < len(self.keys) and self.keys[i] == query:
+            result.append(i)
+        j = bisect.bisect_left(self.tail_keys, query)
+        while j < len(self.tail_keys) and self.tail_keys[j] == query:
+            result.append(self.tail_ids[j])
+            j += 1
+        return result
+
+    def _prefix(self, query: str, limit: int) -> List[int]:
+        result = []
+        for keys, ids in ((self.keys, None), (self.tail_keys, self.tail_ids)):
+            i = bisect.bisect_left(keys, query)
+            while i < len(keys) and keys[i].startswith(query) and len(result) < limit:
+                result.append(i if ids is None else ids[i])
+                i += 1
+        return result
+
+    def _candidates(self, query: str) -> List[int]:
+        import numpy as np
+
+        mask = np.uint64(self._mask(query))
+        return np.flatnonzero(self.masks & mask == mask).tolist()
+
+    def _subsequences(self, query: str, candidates: List[int], limit: int) -> List[int]:
+        # each gap only takes the characters before the next one, so the pattern never backtracks
+        pattern = re.compile(
+            re.escape(query[0]) + "".join(f"[^{re.escape(c)}]*{re.escape(c)}" for c in query[1:])
+        )
+        found = []
+        for i in candidates:
+            key = self.keys[i]
+            match = pattern.search(key)
+            if match is not None:
+                # matches within the last component first, then the tightest ones
+                tail = pattern.search(key, key.rfind(".") + 1)
+                match = tail or match
+                found.append((tail is None, match.end() - match.start(), len(key), i))
+                if len(found) >= limit:
+                    break
+        return [i for *_, i in sorted(found)]
+
+    @staticmethod
+    def _mask(key: str) -> int:
+        mask = 0
+        for c in set(key):
+            mask |= 1 << (ord(c) & 63)
+        return mask
+
+
+class InventoryIndex:
+    """
+    The inventories of several documentations, refreshed in the background.
+    Inventories are cached on disk with their ETag, so they are available as soon as the bot
+    starts, and a refresh only downloads the inventories that changed.
+
+    :param urls: The URL of the documentation of every project, ending with a slash.
+    :type urls: Dict[str, str]
+    :param path: The directory of the cache.
+    :type path: str
+    :param interval: The interval between two refreshes in seconds.
+    :type interval: float
+    """
+
+    logger = Logging.get_logger()
+
+    def __init__(self, urls: Dict[str, str], path: str, interval: float = 21600.0) -> None:
+        self.urls = urls
+        self.path = path
+        self.interval = interval
+        self.inventories: Dict[str, Inventory] = {}
+        self._etags: Dict[str, str] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def get(self, project: str) -> Optional[Inventory]:
+        """
+        Get the inventory of a project.
+
+        :param project: The project.
+        :type project: str
+
+        :return: The inventory, or None if it was not loaded.
+        :rtype: Optional[Inventory]
+        """
+        return self.inventories.get(project)
+
+    def start(self) -> None:
+        """
+        Load the cached inventories and start refreshing them.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        """
+        Stop refreshing the inventories.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        for project in self.urls:
+            await self.load(project)
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.interval)
+
+    async def load(self, project: str) -> None:
+        """
+        Load the cached inventory of a project.
+
+        :param project: The project.
+        :type project: str
+        """
+        path = os.path.join(self.path, f"{project}.inv")
+        with contextlib.suppress(FileNotFoundError):
+            with open(f"{path}.etag", encoding="utf-8") as f:
+                self._etags[project] = f.read().strip()
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            self.inventories[project] = await asyncio.to_thread(
+                Inventory.parse, data, self.urls[project]
+            )
+        except FileNotFoundError:
+            self._etags.pop(project, None)
+        except (ValueError, zlib.error) as e:
+            self._etags.pop(project, None)
+            self.logger.warning(f"無法讀取 {project} 的文檔索引快取: {e}")
+
+    async def refresh(self) -> None:
+        """
+        Download the inventories that changed since the last refresh.
+        """
+        timeout = aiohttp.ClientTimeout(total=30)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            for project, url in self.urls.items():
+                try:
+                    await self._refresh(session, project, url)
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, zlib.error) as e:
+                    self.logger.warning(f"無法更新 {project} 的文檔索引: {e!r}")
+
+    async def _refresh(self, session: aiohttp.ClientSession, project: str, url: str) -> None:
+        headers = {}
+        if project in self._etags and project in self.inventories:
+            headers["If-None-Match"] = self._etags[project]
+        async with session.get(f"{url}objects.inv", headers=headers) as r:
+            if r.status == 304:
+                return
+            r.raise_for_status()
+            data = await r.read()
+            etag = r.headers.get("ETag")
+        inventory = await asyncio.to_thread(Inventory.parse, data, url)
+        self.inventories[project] = inventory
+        await asyncio.to_thread(self._save, project, data, etag)
+        self.logger.info(f"已更新 {project} 的文檔索引，共 {len(inventory)} 個項目")
+
+    def _save(self, project: str, data: bytes, etag: Optional[str]) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        path = os.path.join(self.path, f"{project}.inv")
+        with open(path, "wb") as f:
+            f.write(data)
+        if etag:
+            self._etags[project] = etag
+            with open(f"{path}.etag", "w", encoding="utf-8") as f:
+                f.write(etag)
+        else:
+            self._etags.pop(project, None)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(f"{path}.etag")
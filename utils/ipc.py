@@ -0,0 +1,543 @@
+"""
+Inter-process state and messaging for clustered deployments.
+
+This file is part of ouoteam/ouov3 which is released under GNU General Public License v3.0.
+See file LISENCE for full license details.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    MutableMapping,
+    Optional,
+)
+
+import orjson
+
+from utils.logging import Logging
+
+__all__ = ["IPC"]
+
+
+class IPC:
+    """
+    Shared state, broadcasts and requests between the bot processes of a single host.
+    Everything goes through a SQLite database in WAL mode, so no broker has to be running and
+    the state survives a crashed process. The database is only touched from a dedicated thread.
+
+    :cvar path: The path of the database.
+    :vartype path: str
+    :cvar poll_interval: The interval between two polls for events and requests in seconds.
+    :vartype poll_interval: float
+    :cvar heartbeat_interval: The interval between two heartbeats of a cluster in seconds.
+    :vartype heartbeat_interval: float
+    :cvar stale_after: How long a cluster without a heartbeat is still considered running.
+    :vartype stale_after: float
+    :cvar retention: How long events and answered requests are kept in seconds.
+    :vartype retention: float
+    :cvar cluster_id: The cluster this process runs as, None if IPC is not started.
+    :vartype cluster_id: Optional[int]
+    """
+
+    path = "data/ipc.db"
+    poll_interval = 0.2
+    heartbeat_interval = 5.0
+    stale_after = 15.0
+    retention = 60.0
+    logger = Logging.get_logger()
+    cluster_id: Optional[int] = None
+    shard_count: Optional[int] = None
+    _executor: Optional[ThreadPoolExecutor] = None
+    _connection: Optional[sqlite3.Connection] = None
+    _task: Optional[asyncio.Task] = None
+    _last_event = 0
+    _listeners: Dict[str, List[Callable[[Any], Any]]] = {}
+    _handlers: Dict[str, Callable[..., Awaitable[Any]]] = {}
+    _caches: Dict[str, MutableMapping] = {}
+    _schema = """
+        CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB, expires REAL);
+        CREATE TABLE IF NOT EXISTS ratelimits (key TEXT PRIMARY KEY, reset REAL);
+        CREATE TABLE IF NOT EXISTS clusters (
+            cluster_id INTEGER PRIMARY KEY, pid INTEGER, shards BLOB, shard_count INTEGER,
+            heartbeat REAL
+        );
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT, origin INTEGER, payload BLOB,
+            created REAL
+        );
+        CREATE TABLE IF NOT EXISTS requests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, target INTEGER, method TEXT, payload BLOB,
+            state INTEGER DEFAULT 0, response BLOB, created REAL
+        );
+        CREATE INDEX IF NOT EXISTS requests_target ON requests (target, state);
+    """
+
+    @classmethod
+    def running(cls) -> bool:
+        """
+        Check whether IPC is started in this process.
+
+        :return: Whether IPC is started.
+        :rtype: bool
+        """
+        return cls._connection is not None
+
+    @classmethod
+    def reset(cls) -> None:
+        """
+        Delete the database, called by the cluster supervisor before the clusters start.
+        """
+        for suffix in ("", "-wal", "-shm"):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(cls.path + suffix)
+
+    @classmethod
+    async def start(cls, cluster_id: int, shard_ids: List[int], shard_count: int) -> None:
+        """
+        Open the database, register this cluster and start polling.
+
+        :param cluster_id: The cluster this process runs as.
+        :type cluster_id: int
+        :param shard_ids: The shards of this cluster.
+        :type shard_ids: List[int]
+        :param shard_count: The total number of shards.
+        :type shard_count: int
+        """
+        cls.cluster_id = cluster_id
+        cls.shard_count = shard_count
+        cls._executor = ThreadPoolExecutor(1, thread_name_prefix="ipc")
+        await cls._run(cls._connect)
+        await cls._execute(
+            "INSERT OR REPLACE INTO clusters VALUES (?, ?, ?, ?, ?)",
+            (cluster_id, os.getpid(), orjson.dumps(shard_ids), shard_count, time.time()),
+        )
+        # stale requests addressed to the previous process of this cluster will never be answered
+        await cls._execute("DELETE FROM requests WHERE target = ? AND state < 2", (cluster_id,))
+        ((cls._last_event,),) = await cls._execute("SELECT COALESCE(MAX(id), 0) FROM events")
+        cls._task = asyncio.create_task(cls._poll())
+        cls.logger.debug(f"IPC 已啟動 (叢集 {cluster_id})")
+
+    @classmethod
+    async def stop(cls) -> None:
+        """
+        Stop polling, unregister this cluster and close the database.
+        """
+        if cls._task is not None:
+            cls._task.cancel()
+            cls._task = None
+        if cls._connection is not None:
+            with contextlib.suppress(sqlite3.Error):
+                await cls._execute("DELETE FROM clusters WHERE cluster_id = ?", (cls.cluster_id,))
+            await cls._run(cls._connection.close)
+            cls._connection = None
+            cls.cluster_id = None
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=False)
+            cls._executor = None
+
+    @classmethod
+    def _connect(cls) -> None:
+        os.makedirs(os.path.dirname(cls.path), exist_ok=True)
+        connection = sqlite3.connect(cls.path, timeout=10, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(cls._schema)
+        cls._connection = connection
+
+    @classmethod
+    async def _run(cls, func: Callable, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(cls._executor, func, *args)
+
+    @classmethod
+    async def _execute(cls, sql: str, parameters: tuple = ()) -> List[tuple]:
+        def execute() -> List[tuple]:
+            with cls._connection:
+                return cls._connection.execute(sql, parameters).fetchall()
+
+        return await cls._run(execute)
+
+    @classmethod
+    async def get(cls, key: str, default: Any = None) -> Any:
+        """
+        Get a shared value.
+
+        :param key: The key of the value.
+        :type key: str
+        :param default: The value to return if the key is not set or expired.
+        :type default: Any
+
+        :return: The value.
+        :rtype: Any
+        """
+        rows = await cls._execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (key, time.time()),
+        )
+        return orjson.loads(rows[0][0]) if rows else default
+
+    @classmethod
+    async def set(cls, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Set a shared value.
+
+        :param key: The key of the value.
+        :type key: str
+        :param value: The value, it must be serializable to JSON.
+        :type value: Any
+        :param ttl: How long the value is kept in seconds, or None to keep it forever.
+        :type ttl: Optional[float]
+        """
+        expires = None if ttl is None else time.time() + ttl
+        await cls._execute(
+            "INSERT OR REPLACE INTO kv VALUES (?, ?, ?)", (key, orjson.dumps(value), expires)
+        )
+
+    @classmethod
+    async def items(cls, prefix: str) -> Dict[str, Any]:
+        """
+        Get every shared value whose key starts with a prefix.
+
+        :param prefix: The prefix of the keys.
+        :type prefix: str
+
+        :return: The values, keyed by their full key.
+        :rtype: Dict[str, Any]
+        """
+        rows = await cls._execute(
+            "SELECT key, value FROM kv WHERE substr(key, 1, ?) = ? AND (expires IS NULL OR expires > ?)",
+            (len(prefix), prefix, time.time()),
+        )
+        return {key: orjson.loads(value) for key, value in rows}
+
+    @classmethod
+    async def delete(cls, key: str) -> None:
+        """
+        Delete a shared value.
+
+        :param key: The key of the value.
+        :type key: str
+        """
+        await cls._execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    @classmethod
+    async def get_ratelimit(cls, key: str) -> float:
+        """
+        Get the time a shared rate limit resets at.
+
+        :param key: The name of the rate limit.
+        :type key: str
+
+        :return: The UNIX timestamp the rate limit resets at, 0 if it is not limited.
+        :rtype: float
+        """
+        rows = await cls._execute("SELECT reset FROM ratelimits WHERE key = ?", (key,))
+        return rows[0][0] if rows else 0.0
+
+    @classmethod
+    async def set_ratelimit(cls, key: str, reset: float) -> None:
+        """
+        Record a rate limit for every process.
+        An earlier reset never overrides a later one.
+
+        :param key: The name of the rate limit.
+        :type key: str
+        :param reset: The UNIX timestamp the rate limit resets at.
+        :type reset: float
+        """
+        await cls._execute(
+            "INSERT INTO ratelimits VALUES (?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET reset = MAX(reset, excluded.reset)",
+            (key, reset),
+        )
+
+    @classmethod
+    def listen(cls, channel: str) -> Callable:
+        """
+        Register a listener for the broadcasts of a channel.
+        Listeners are called with the payload and may be coroutine functions.
+
+        :param channel: The channel to listen to.
+        :type channel: str
+        """
+
+        def decorator(func: Callable[[Any], Any]) -> Callable[[Any], Any]:
+            cls._listeners.setdefault(channel, []).append(func)
+            return func
+
+        return decorator
+
+    @classmethod
+    async def publish(cls, channel: str, payload: Any = None) -> None:
+        """
+        Broadcast a payload to the other processes.
+        Nothing is sent if IPC is not started, as there is no other process to notify.
+
+        :param channel: The channel to publish to.
+        :type channel: str
+        :param payload: The payload, it must be serializable to JSON.
+        :type payload: Any
+        """
+        if cls.running():
+            await cls._execute(
+                "INSERT INTO events (channel, origin, payload, created) VALUES (?, ?, ?, ?)",
+                (channel, cls.cluster_id, orjson.dumps(payload), time.time()),
+            )
+
+    @classmethod
+    def announce(cls, channel: str, payload: Any = None) -> None:
+        """
+        Broadcast a payload to every bot process without an event loop.
+        This is meant for the cluster supervisor, it blocks while writing the event.
+
+        :param channel: The channel to publish to.
+        :type channel: str
+        :param payload: The payload, it must be serializable to JSON.
+        :type payload: Any
+        """
+        cls._execute_blocking(
+            "INSERT INTO events (channel, origin, payload, created) VALUES (?, ?, ?, ?)",
+            [(channel, None, orjson.dumps(payload), time.time())],
+        )
+
+    @classmethod
+    def retire(cls, cluster_ids: Iterable[int]) -> None:
+        """
+        Unregister stopped clusters and broadcast their IDs on the ``retired`` channel.
+        This is meant for the cluster supervisor once the processes of a resharded generation
+        exited, it blocks while writing to the database.
+
+        :param cluster_ids: The clusters to unregister.
+        :type cluster_ids: Iterable[int]
+        """
+        cluster_ids = list(cluster_ids)
+        cls._execute_blocking(
+            "DELETE FROM clusters WHERE cluster_id = ?",
+            [(cluster_id,) for cluster_id in cluster_ids],
+        )
+        cls.announce("retired", cluster_ids)
+
+    @classmethod
+    def _execute_blocking(cls, sql: str, parameters: List[tuple]) -> None:
+        os.makedirs(os.path.dirname(cls.path), exist_ok=True)
+        connection = sqlite3.connect(cls.path, timeout=10)
+        try:
+            connection.executescript(cls._schema)
+            with connection:
+                connection.executemany(sql, parameters)
+        finally:
+            connection.close()
+
+    @classmethod
+    def register_cache(cls, name: str, cache: MutableMapping) -> None:
+        """
+        Register a cache whose keys can be invalidated by other processes.
+
+        :param name: The name of the cache.
+        :type name: str
+        :param cache: The cache.
+        :type cache: MutableMapping
+        """
+        cls._caches[name] = cache
+
+    @classmethod
+    async def invalidate(cls, name: str, key: Any) -> None:
+        """
+        Remove a key from a registered cache in every process.
+
+        :param name: The name of the cache.
+        :type name: str
+        :param key: The key to remove, it must be serializable to JSON.
+        :type key: Any
+        """
+        cls._caches.get(name, {}).pop(key, None)
+        await cls.publish("invalidate", [name, key])
+
+    @classmethod
+    def handler(cls, method: str) -> Callable:
+        """
+        Register the coroutine function answering the requests of a method.
+        It is called with the keyword arguments of the request.
+
+        :param method: The method to answer.
+        :type method: str
+        """
+
+        def decorator(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+            cls._handlers[method] = func
+            return func
+
+        return decorator
+
+    @classmethod
+    async def request(cls, target: int, method: str, *, timeout: float = 5.0, **kwargs) -> Any:
+        """
+        Call a method on another cluster and wait for the answer.
+
+        :param target: The cluster to call.
+        :type target: int
+        :param method: The method to call.
+        :type method: str
+        :param timeout: How long to wait for the answer in seconds.
+        :type timeout: float
+
+        :raises asyncio.TimeoutError: If the cluster did not answer in time or dropped the request.
+        :raises RuntimeError: If the handler raised an error.
+
+        :return: The answer.
+        :rtype: Any
+        """
+        if target == cls.cluster_id or not cls.running():
+            return await cls._handlers[method](**kwargs)
+
+        def insert() -> int:
+            with cls._connection:
+                return cls._connection.execute(
+                    "INSERT INTO requests (target, method, payload, created) VALUES (?, ?, ?, ?)",
+                    (target, method, orjson.dumps(kwargs), time.time()),
+                ).lastrowid
+
+        request_id = await cls._run(insert)
+        deadline = time.monotonic() + timeout
+        try:
+            while time.monotonic() < deadline:
+                await asyncio.sleep(cls.poll_interval)
+                rows = await cls._execute(
+                    "SELECT state, response FROM requests WHERE id = ?", (request_id,)
+                )
+                if not rows:
+                    # swept by the retention or by the target restarting, it will never be answered
+                    break
+                ((state, response),) = rows
+                if state == 2:
+                    return orjson.loads(response)
+                if state == 3:
+                    raise RuntimeError(orjson.loads(response))
+            raise asyncio.TimeoutError
+        finally:
+            await cls._execute("DELETE FROM requests WHERE id = ?", (request_id,))
+
+    @classmethod
+    async def clusters(cls) -> Dict[int, List[int]]:
+        """
+        Get the running clusters, the ones that sent a heartbeat recently.
+
+        :return: The shard ids of each cluster.
+        :rtype: Dict[int, List[int]]
+        """
+        rows = await cls._execute(
+            "SELECT cluster_id, shards FROM clusters WHERE heartbeat > ?",
+            (time.time() - cls.stale_after,),
+        )
+        return {cluster_id: orjson.loads(shards) for cluster_id, shards in rows}
+
+    @classmethod
+    async def owner(cls, guild_id: int) -> Optional[int]:
+        """
+        Get the running cluster whose shards include the guild.
+        Each cluster is matched with its own shard count, so during a reshard both generations
+        match and the current one, with fewer shards, is returned until it is retired.
+
+        :param guild_id: The ID of the guild.
+        :type guild_id: int
+
+        :return: The cluster, or None if no running cluster has the shard.
+        :rtype: Optional[int]
+        """
+        if not cls.running():
+            return None
+        rows = await cls._execute(
+            "SELECT cluster_id, shards, shard_count FROM clusters WHERE heartbeat > ? "
+            "ORDER BY shard_count, cluster_id",
+            (time.time() - cls.stale_after,),
+        )
+        for cluster_id, shards, shard_count in rows:
+            if (guild_id >> 22) % shard_count in orjson.loads(shards):
+                return cluster_id
+        return None
+
+    @classmethod
+    async def _poll(cls) -> None:
+        """
+        Dispatch the broadcasts and answer the requests of the other processes.
+        """
+        heartbeat = 0.0
+        while True:
+            try:
+                events = await cls._execute(
+                    "SELECT id, channel, origin, payload FROM events WHERE id > ? ORDER BY id",
+                    (cls._last_event,),
+                )
+                for event_id, channel, origin, payload in events:
+                    cls._last_event = event_id
+                    if origin != cls.cluster_id:
+                        await cls._dispatch(channel, orjson.loads(payload))
+                for request_id, method, payload in await cls._run(cls._claim):
+                    asyncio.create_task(cls._answer(request_id, method, orjson.loads(payload)))
+                if time.monotonic() - heartbeat > cls.heartbeat_interval:
+                    heartbeat = time.monotonic()
+                    await cls._execute(
+                        "UPDATE clusters SET heartbeat = ? WHERE cluster_id = ?",
+                        (time.time(), cls.cluster_id),
+                    )
+                    await cls._execute(
+                        "DELETE FROM events WHERE created < ?", (time.time() - cls.retention,)
+                    )
+                    await cls._execute(
+                        "DELETE FROM requests WHERE created < ?", (time.time() - cls.retention,)
+                    )
+                    await cls._execute("DELETE FROM kv WHERE expires < ?", (time.time(),))
+            except sqlite3.Error as e:
+                cls.logger.warning(f"IPC 輪詢時出現錯誤: {e}")
+            await asyncio.sleep(cls.poll_interval)
+
+    @classmethod
+    def _claim(cls) -> List[tuple]:
+        with cls._connection:
+            rows = cls._connection.execute(
+                "SELECT id, method, payload FROM requests WHERE target = ? AND state = 0",
+                (cls.cluster_id,),
+            ).fetchall()
+            cls._connection.executemany(
+                "UPDATE requests SET state = 1 WHERE id = ?", [(row[0],) for row in rows]
+            )
+        return rows
+
+    @classmethod
+    async def _dispatch(cls, channel: str, payload: Any) -> None:
+        for listener in cls._listeners.get(channel, []):
+            try:
+                result = listener(payload)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                cls.logger.opt(exception=e).error(f"處理 IPC 廣播 {channel} 時出現錯誤")
+
+    @classmethod
+    async def _answer(cls, request_id: int, method: str, kwargs: dict) -> None:
+        try:
+            state, response = 2, await cls._handlers[method](**kwargs)
+        except Exception as e:
+            state, response = 3, f"{type(e).__name__}: {e}"
+        await cls._execute(
+            "UPDATE requests SET state = ?, response = ? WHERE id = ?",
+            (state, orjson.dumps(response), request_id),
+        )
+
+
+@IPC.listen("invalidate")
+def _invalidate(payload: list) -> None:
+    name, key = payload
+    # JSON turns tuples into lists, which are not hashable
+    key = tuple(key) if isinstance(key, list) else key
+    IPC._caches.get(name, {}).pop(key, None)
@@ -0,0 +1,160 @@
+"""
+Member cache policy: no chunking at startup, on-demand fetches kept in a bounded LRU.
+
+This file is part of ouoteam/ouov3 which is released under GNU General Public License v3.0.
+See file LISENCE for full license details.
+"""
+from __future__ import annotations
+
+import collections
+import time
+from typing import Optional, OrderedDict, Set, Tuple
+
+import discord
+
+from utils.logging import Logging
+
+__all__ = ["MemberCache"]
+
+
+class MemberCache:
+    """
+    Look up members without keeping every member of every guild in memory.
+    py-cord only caches the members seen in interactions and voice channels (see :meth:`flags`),
+    everything else is fetched on demand and kept in a bounded LRU. Guilds listed in
+    ``chunk_guilds`` are still fully chunked when they become available.
+
+    :cvar max_size: The number of fetched members to keep.
+    :vartype max_size: int
+    :cvar ttl: How long a fetched member is considered fresh in seconds.
+    :vartype ttl: float
+    :cvar thread_ttl: How long the fetched members of a thread are considered fresh in seconds.
+    :vartype thread_ttl: float
+    :cvar chunk_guilds: The guilds that opted in to full chunking.
+    :vartype chunk_guilds: Set[int]
+    """
+
+    max_size = 1000
+    ttl = 300.0
+    thread_ttl = 60.0
+    chunk_guilds: Set[int] = set()
+    logger = Logging.get_logger()
+    _members: OrderedDict[Tuple[int, int], Tuple[float, discord.Member]] = collections.OrderedDict()
+    _threads: OrderedDict[int, Tuple[float, Set[int]]] = collections.OrderedDict()
+
+    @classmethod
+    def flags(cls) -> discord.MemberCacheFlags:
+        """
+        Get the member cache flags of the policy.
+
+        :return: The flags caching only interaction and voice members.
+        :rtype: discord.MemberCacheFlags
+        """
+        flags = discord.MemberCacheFlags.none()
+        flags.interaction = True
+        flags.voice = True
+        return flags
+
+    @classmethod
+    async def get_member(cls, guild: discord.Guild, user_id: int) -> Optional[discord.Member]:
+        """
+        Get a member from the guild's cache, the LRU or the API, in this order.
+
+        :param guild: The guild of the member.
+        :type guild: discord.Guild
+        :param user_id: The ID of the member.
+        :type user_id: int
+
+        :return: The member, or None if the user is not in the guild or could not be fetched.
+        :rtype: Optional[discord.Member]
+        """
+        member = guild.get_member(user_id)
+        if member is not None:
+            return member
+        key = (guild.id, user_id)
+        entry = cls._members.get(key)
+        if entry is not None and time.monotonic() - entry[0] < cls.ttl:
+            cls._members.move_to_end(key)
+            return entry[1]
+        try:
+            member = await guild.fetch_member(user_id)
+        except discord.NotFound:
+            cls._members.pop(key, None)
+            return None
+        except discord.HTTPException as e:
+            cls.logger.warning(f"無法取得伺服器 {guild.id} 的成員 {user_id}: {e}")
+            return None
+        cls._members[key] = (time.monotonic(), member)
+        cls._members.move_to_end(key)
+        while len(cls._members) > cls.max_size:
+            cls._members.popitem(last=False)
+        return member
+
+    @classmethod
+    def discard(cls, guild_id: int, user_id: int) -> None:
+        """
+        Forget a fetched member, for example after it left the guild.
+
+        :param guild_id: The ID of the guild.
+        :type guild_id: int
+        :param user_id: The ID of the member.
+        :type user_id: int
+        """
+        cls._members.pop((guild_id, user_id), None)
+
+    @classmethod
+    async def in_thread(cls, thread: discord.Thread, user_id: int) -> bool:
+        """
+        Check whether a user is a member of a thread.
+        Thread members are only cached for the bot itself, so on a cache miss the members of the
+        thread are fetched and kept for ``thread_ttl``.
+
+        :param thread: The thread.
+        :type thread: discord.Thread
+        :param user_id: The ID of the user.
+        :type user_id: int
+
+        :return: Whether the user is in the thread.
+        :rtype: bool
+        """
+        if thread.get_member(user_id) is not None:
+            return True
+        entry = cls._threads.get(thread.id)
+        if entry is None or time.monotonic() - entry[0] >= cls.thread_ttl:
+            members = {member.id for member in await thread.fetch_members()}
+            entry = cls._threads[thread.id] = (time.monotonic(), members)
+        cls._threads.move_to_end(thread.id)
+        while len(cls._threads) > cls.max_size:
+            cls._threads.popitem(last=False)
+        return user_id in entry[1]
+
+    @classmethod
+    def update_thread(cls, thread_id: int, user_id: int, joined: bool) -> None:
+        """
+        Record that a user joined or left a thread whose members were fetched.
+
+        :param thread_id: The ID of the thread.
+        :type thread_id: int
+        :param user_id: The ID of the user.
+        :type user_id: int
+        :param joined: Whether the user joined the thread, False if they left it.
+        :type joined: bool
+        """
+        entry = cls._threads.get(thread_id)
+        if entry is not None:
+            if joined:
+                entry[1].add(user_id)
+            else:
+                entry[1].discard(user_id)
+
+    @classmethod
+    async def chunk(cls, guild: discord.Guild) -> None:
+        """
+        Chunk a guild if it opted in to full chunking.
+
+        :param guild: The guild.
+        :type guild: discord.Guild
+        """
+        if guild.id in cls.chunk_guilds and not guild.chunked:
+            await guild.chunk()
+            cls.logger.debug(f"已快取伺服器 {guild.id} 的 {len(guild.members)} 位成員")
@@ -0,0 +1,96 @@
+"""
+Paginators building their pages only when they are shown.
+
+This file is part of ouoteam/ouov3 which is released under GNU General Public License v3.0.
+See file LISENCE for full license details.
+"""
+from __future__ import annotations
+
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    List,
+    Sequence,
+    TypeVar,
+    Union,
+    overload,
+)
+
+import discord
+from discord.ext import pages
+
+__all__ = ["LazyPages", "LazyPaginator"]
+
+T = TypeVar("T")
+PageContent = Union[pages.Page, str, discord.Embed, List[discord.Embed]]
+
+
+class LazyPages(Sequence[PageContent], Generic[T]):
+    """
+    The pages of a paginator, rendered from their data the first time they are read and kept
+    afterwards, so a page looks the same when it is shown again.
+
+    :param items: The data of every page.
+    :type items: Sequence[T]
+    :param render: The function building a page from its data.
+    :type render: Callable[[T], PageContent]
+    """
+
+    __slots__ = ("items", "render", "_pages")
+
+    def __init__(self, items: Sequence[T], render: Callable[[T], PageContent]) -> None:
+        self.items = items
+        self.render = render
+        self._pages: Dict[int, PageContent] = {}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    @overload
+    def __getitem__(self, index: int) -> PageContent:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[PageContent]:
+        ...
+
+    def __getitem__(self, index: int | slice) -> PageContent | List[PageContent]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        page = self._pages.get(index)
+        if page is None:
+            page = self._pages[index] = self.render(self.items[index])
+        return page
+
+    @property
+    def rendered(self) -> int:
+        """
+        The number of pages rendered so far.
+
+        :return: The number of pages.
+        :rtype: int
+        """
+        return len(self._pages)
+
+
+class LazyPaginator(pages.Paginator, Generic[T]):
+    """
+    A :class:`discord.ext.pages.Paginator` keeping the data of its pages and building each page
+    when it is first shown, instead of building every page before the first one is sent.
+
+    :param items: The data of every page.
+    :type items: Sequence[T]
+    :param render: The function building a page from its data.
+    :type render: Callable[[T], PageContent]
+    :param kwargs: The keyword arguments of :class:`discord.ext.pages.Paginator`.
+    :type kwargs: Any
+    """
+
+    def __init__(
+        self, items: Sequence[T], render: Callable[[T], PageContent], **kwargs: Any
+    ) -> None:
+        super().__init__(LazyPages(items, render), **kwargs)
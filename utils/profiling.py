@@ -0,0 +1,342 @@
+"""
+Profiling utilities for diagnosing memory and performance issues.
+
+This file is part of ouoteam/ouov3 which is released under GNU General Public License v3.0.
+See file LISENCE for full license details.
+"""
+from __future__ import annotations
+
+import builtins
+import collections
+import contextlib
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Dict, Iterator, List, Tuple, Union
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+__all__ = ["Memory", "Sampler", "Startup"]
+
+
+class Memory:
+    """
+    Memory usage statistics and the opt-in tracemalloc profiler.
+    Tracing slows down every allocation, so it is only active when :meth:`start_tracing` is
+    called before the bot is imported (see the ``memory_profiling`` option).
+
+    :cvar max_snapshots: The number of snapshots to keep for diffing.
+    :vartype max_snapshots: int
+    :cvar snapshots: The snapshots taken so far, oldest first.
+    :vartype snapshots: List[tracemalloc.Snapshot]
+    """
+
+    max_snapshots = 5
+    snapshots: List[tracemalloc.Snapshot] = []
+    filters = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+    stdlib = os.path.dirname(os.__file__)
+
+    @classmethod
+    def rss(cls) -> int:
+        """
+        Get the resident set size of the process.
+        This is cheap enough to be called at any time, unlike the tracemalloc statistics.
+
+        :return: The resident set size in bytes, or 0 if it is not available.
+        :rtype: int
+        """
+        try:
+            with open("/proc/self/statm", "rb") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            pass
+        if resource is None:
+            return 0
+        # Not on Linux, fall back to the peak resident set size.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+    @classmethod
+    def start_tracing(cls, frames: int = 25) -> None:
+        """
+        Start tracing memory allocations.
+
+        :param frames: The number of frames to store for each traceback.
+        :type frames: int
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    @classmethod
+    def is_tracing(cls) -> bool:
+        """
+        Check whether memory allocations are being traced.
+
+        :return: Whether the profiler is enabled.
+        :rtype: bool
+        """
+        return tracemalloc.is_tracing()
+
+    @classmethod
+    def take_snapshot(cls) -> tracemalloc.Snapshot:
+        """
+        Take a snapshot of the traced allocations and keep it for diffing.
+
+        :raises RuntimeError: If memory allocations are not being traced.
+
+        :return: The snapshot.
+        :rtype: tracemalloc.Snapshot
+        """
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("Memory profiling is not enabled.")
+        snapshot = tracemalloc.take_snapshot().filter_traces(cls.filters)
+        cls.snapshots.append(snapshot)
+        del cls.snapshots[: -cls.max_snapshots]
+        return snapshot
+
+    @classmethod
+    def top(cls, limit: int = 10, key_type: str = "lineno") -> List[tracemalloc.Statistic]:
+        """
+        Get the top allocating sites of the latest snapshot.
+        A snapshot is taken if there is none yet.
+
+        :param limit: The number of sites to return.
+        :type limit: int
+        :param key_type: The key to group the allocations by, one of lineno, filename and traceback.
+        :type key_type: str
+
+        :return: The statistics of the top allocating sites.
+        :rtype: List[tracemalloc.Statistic]
+        """
+        snapshot = cls.snapshots[-1] if cls.snapshots else cls.take_snapshot()
+        return snapshot.statistics(key_type)[:limit]
+
+    @classmethod
+    def diff(cls, limit: int = 10, key_type: str = "lineno") -> List[tracemalloc.StatisticDiff]:
+        """
+        Compare the two latest snapshots.
+
+        :param limit: The number of sites to return.
+        :type limit: int
+        :param key_type: The key to group the allocations by, one of lineno, filename and traceback.
+        :type key_type: str
+
+        :raises ValueError: If fewer than two snapshots were taken.
+
+        :return: The statistics of the sites with the largest growth.
+        :rtype: List[tracemalloc.StatisticDiff]
+        """
+        if len(cls.snapshots) < 2:
+            raise ValueError("At least two snapshots are required.")
+        return cls.snapshots[-1].compare_to(cls.snapshots[-2], key_type)[:limit]
+
+    @classmethod
+    def format_statistics(
+        cls, stats: List[Union[tracemalloc.Statistic, tracemalloc.StatisticDiff]]
+    ) -> str:
+        """
+        Format statistics into a human readable report.
+
+        :param stats: The statistics to format.
+        :type stats: List[Union[tracemalloc.Statistic, tracemalloc.StatisticDiff]]
+
+        :return: The report.
+        :rtype: str
+        """
+        lines = []
+        for stat in stats:
+            # tracebacks are stored oldest frame first
+            frame, *callers = reversed(stat.traceback)
+            line = f"{stat.size / 1024:>10.1f} KiB {stat.count:>8} "
+            if isinstance(stat, tracemalloc.StatisticDiff):
+                line += f"{stat.size_diff / 1024:>+10.1f} KiB {stat.count_diff:>+8} "
+            lines.append(f"{line}{cls._short_path(frame.filename)}:{frame.lineno}")
+            lines.extend(f"{' ' * 8}{cls._short_path(f.filename)}:{f.lineno}" for f in callers)
+        return "\n".join(lines)
+
+    @classmethod
+    def _short_path(cls, path: str) -> str:
+        """
+        Shorten a file path for display.
+
+        :param path: The path to shorten.
+        :type path: str
+
+        :return: The path relative to the project, site-packages or the standard library.
+        :rtype: str
+        """
+        if "site-packages" in path:
+            return path.rsplit("site-packages", 1)[1].lstrip("\\/")
+        if path.startswith(os.getcwd()):
+            return os.path.relpath(path)
+        if path.startswith(cls.stdlib):
+            return path[len(cls.stdlib) :].lstrip("\\/")
+        return path
+
+
+class Sampler:
+    """
+    A sampling profiler for a running thread, usually the one running the event loop.
+    The stacks are sampled from the calling thread, so there is no overhead while it is not running.
+
+    :cvar lock: Held while a profile is running, only one profile can run at a time.
+    :vartype lock: threading.Lock
+    """
+
+    lock = threading.Lock()
+
+    @classmethod
+    def profile(cls, thread_id: int, duration: float, interval: float = 0.005) -> Tuple[str, int]:
+        """
+        Sample the stack of a thread.
+        This blocks for the whole duration and must not be called from the sampled thread.
+
+        :param thread_id: The identifier of the thread to sample.
+        :type thread_id: int
+        :param duration: How long to sample for in seconds.
+        :type duration: float
+        :param interval: The interval between two samples in seconds.
+        :type interval: float
+
+        :raises RuntimeError: If a profile is already running.
+
+        :return: The stacks in the collapsed format used by flamegraph.pl and speedscope,
+            and the number of samples taken.
+        :rtype: Tuple[str, int]
+        """
+        if not cls.lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running.")
+        try:
+            counts = collections.Counter()
+            samples = 0
+            end = time.monotonic() + duration
+            while time.monotonic() < end:
+                frame = sys._current_frames().get(thread_id)
+                if frame is not None:
+                    counts[cls._collapse(frame)] += 1
+                    samples += 1
+                    del frame
+                time.sleep(interval)
+        finally:
+            cls.lock.release()
+        return "\n".join(f"{stack} {count}" for stack, count in counts.most_common()), samples
+
+    @classmethod
+    def _collapse(cls, frame) -> str:
+        """
+        Collapse a stack into a single line, outermost frame first.
+
+        :param frame: The innermost frame of the stack.
+        :type frame: types.FrameType
+
+        :return: The collapsed stack.
+        :rtype: str
+        """
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            path = Memory._short_path(code.co_filename)
+            stack.append(f"{code.co_name} ({path}:{code.co_firstlineno})".replace(";", ":"))
+            frame = frame.f_back
+        return ";".join(reversed(stack))
+
+
+class Startup:
+    """
+    Record where the time goes while the bot starts.
+    Import tracing wraps ``builtins.__import__``, so it is only enabled with ``startup_profiling``.
+
+    :cvar started: The time this module was imported, close enough to the start of the process.
+    :vartype started: float
+    :cvar imports: The inclusive and self time of every module imported while tracing.
+    :vartype imports: Dict[str, Tuple[float, float]]
+    :cvar steps: The time spent in each measured startup step, such as loading a cog.
+    :vartype steps: Dict[str, float]
+    """
+
+    started = time.perf_counter()
+    imports: Dict[str, Tuple[float, float]] = {}
+    steps: Dict[str, float] = {}
+    _import = None
+    _children: List[float] = []
+
+    @classmethod
+    def trace_imports(cls) -> None:
+        """
+        Start recording the time spent importing each module.
+        """
+        if cls._import is not None:
+            return
+        cls._import = builtins.__import__
+
+        def _traced_import(name, globals=None, locals=None, fromlist=(), level=0):
+            if level or name in sys.modules:
+                return cls._import(name, globals, locals, fromlist, level)
+            cls._children.append(0.0)
+            start = time.perf_counter()
+            try:
+                return cls._import(name, globals, locals, fromlist, level)
+            finally:
+                elapsed = time.perf_counter() - start
+                children = cls._children.pop()
+                if cls._children:
+                    cls._children[-1] += elapsed
+                cls.imports.setdefault(name, (elapsed, elapsed - children))
+
+        builtins.__import__ = _traced_import
+
+    @classmethod
+    def stop_tracing_imports(cls) -> None:
+        """
+        Stop recording imports.
+        """
+        if cls._import is not None:
+            builtins.__import__ = cls._import
+            cls._import = None
+
+    @classmethod
+    @contextlib.contextmanager
+    def measure(cls, step: str) -> Iterator[None]:
+        """
+        Measure the time spent in a startup step.
+
+        :param step: The name of the step.
+        :type step: str
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls.steps[step] = time.perf_counter() - start
+
+    @classmethod
+    def report(cls, limit: int = 15) -> str:
+        """
+        Format the recorded startup times.
+
+        :param limit: The number of slowest imports to include.
+        :type limit: int
+
+        :return: The report.
+        :rtype: str
+        """
+        lines = [f"{'total':<40} {(time.perf_counter() - cls.started) * 1000:>10.1f} ms"]
+        lines.extend(f"{step:<40} {t * 1000:>10.1f} ms" for step, t in cls.steps.items())
+        if cls.imports:
+            lines.append(f"{'import':<40} {'inclusive':>13} {'self':>13}")
+            slowest = sorted(cls.imports.items(), key=lambda i: i[1][0], reverse=True)[:limit]
+            lines.extend(
+                f"{name:<40} {total * 1000:>10.1f} ms {own * 1000:>10.1f} ms"
+                for name, (total, own) in slowest
+            )
+        return "\n".join(lines)
@@ -0,0 +1,149 @@
+"""
+Timer wheel and rate limiter for scheduling many small periodic jobs.
+
+This file is part of ouoteam/ouov3 which is released under GNU General Public License v3.0.
+See file LISENCE for full license details.
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+from typing import Callable, Dict, Hashable, List
+
+__all__ = ["TimerWheel", "RateLimiter"]
+
+
+class TimerWheel:
+    """
+    A hashed timing wheel: timers are stored in the slot they expire in, so scheduling, cancelling
+    and expiring a timer are O(1) however many timers there are. Timers further away than one
+    revolution wait the remaining number of rounds in their slot.
+
+    :param tick: The duration of a slot in seconds, the resolution of the timers.
+    :type tick: float
+    :param slots: The number of slots.
+    :type slots: int
+    """
+
+    def __init__(self, tick: float, slots: int) -> None:
+        self.tick = tick
+        self.position = 0
+        self._slots: List[Dict[Hashable, int]] = [{} for _ in range(slots)]
+        self._where: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._where
+
+    def schedule(self, key: Hashable, delay: float) -> None:
+        """
+        Schedule a timer, replacing the previous timer of the key.
+
+        :param key: The key of the timer.
+        :type key: Hashable
+        :param delay: The delay in seconds, rounded up to the next tick.
+        :type delay: float
+        """
+        self.cancel(key)
+        ticks = max(1, math.ceil(delay / self.tick - 1e-9))
+        slot = (self.position + ticks) % len(self._slots)
+        self._slots[slot][key] = (ticks - 1) // len(self._slots)
+        self._where[key] = slot
+
+    def cancel(self, key: Hashable) -> bool:
+        """
+        Cancel a timer.
+
+        :param key: The key of the timer.
+        :type key: Hashable
+
+        :return: Whether the timer existed.
+        :rtype: bool
+        """
+        slot = self._where.pop(key, None)
+        if slot is None:
+            return False
+        del self._slots[slot][key]
+        return True
+
+    def advance(self) -> List[Hashable]:
+        """
+        Move the wheel one tick forward.
+
+        :return: The keys of the timers that expired.
+        :rtype: List[Hashable]
+        """
+        self.position = (self.position + 1) % len(self._slots)
+        slot = self._slots[self.position]
+        expired = [key for key, rounds in slot.items() if rounds == 0]
+        for key in expired:
+            del slot[key]
+            del self._where[key]
+        for key in slot:
+            slot[key] -= 1
+        return expired
+
+    async def run(self, callback: Callable[[Hashable], None]) -> None:
+        """
+        Turn the wheel forever, calling the callback with every expired key.
+        Ticks are computed from the start time, so the wheel does not drift however long the
+        callbacks take: a late wheel catches up on the missed ticks without sleeping.
+
+        :param callback: The function to call with each expired key.
+        :type callback: Callable[[Hashable], None]
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            deadline += self.tick
+            await asyncio.sleep(max(0.0, deadline - loop.time()))
+            for key in self.advance():
+                callback(key)
+
+
+class RateLimiter:
+    """
+    A token bucket limiting how often an action happens, such as REST requests sharing a limit.
+    The bucket holds at least one action, so a rate below one per period still lets actions
+    through at that rate.
+
+    :param rate: The number of actions allowed per period.
+    :type rate: float
+    :param per: The period in seconds.
+    :type per: float
+    """
+
+    def __init__(self, rate: float, per: float = 1.0) -> None:
+        self.rate = rate
+        self.per = per
+        self.capacity = max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """
+        Wait until an action is allowed.
+        """
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self._updated:
+                    self._tokens = min(
+                        self.capacity, self._tokens + (now - self._updated) * self.rate / self.per
+                    )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) * self.per / self.rate)
+
+    async def __aenter__(self) -> RateLimiter:
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        pass
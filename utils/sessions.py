@@ -0,0 +1,142 @@
+"""
+Sessions of interactive commands, evicted by a timer wheel when they are idle.
+
+This file is part of ouoteam/ouov3 which is released under GNU General Public License v3.0.
+See file LISENCE for full license details.
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+from typing import Callable, Dict, Generic, Iterator, Optional, Tuple, TypeVar
+
+from utils.scheduler import TimerWheel
+
+__all__ = ["SessionManager"]
+
+T = TypeVar("T")
+
+
+class SessionManager(Generic[T]):
+    """
+    Sessions keyed by an increasing integer, each evicted once it was not used for ``ttl``.
+    One timer wheel expires every session, instead of a timeout task per view, so a session
+    costs the session object and two dictionary entries.
+
+    :param ttl: How long an idle session is kept in seconds.
+    :type ttl: float
+    :param tick: The resolution of the eviction in seconds.
+    :type tick: float
+    :param on_expire: The function called with the ID and the session of every evicted session.
+    :type on_expire: Optional[Callable[[int, T], None]]
+    :param first_id: The ID of the first session, processes sharing sessions start apart.
+    :type first_id: int
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        tick: float = 1.0,
+        on_expire: Optional[Callable[[int, T], None]] = None,
+        first_id: int = 1,
+    ) -> None:
+        self.ttl = ttl
+        self.on_expire = on_expire
+        self._sessions: Dict[int, T] = {}
+        self._wheel = TimerWheel(tick, math.ceil(ttl / tick) + 1)
+        self._next_id = first_id
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: int) -> bool:
+        return session_id in self._sessions
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._sessions)
+
+    def start(self) -> None:
+        """
+        Start evicting the idle sessions.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._wheel.run(self._expire))
+
+    def stop(self) -> None:
+        """
+        Stop evicting the idle sessions.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def add(self, session: T) -> int:
+        """
+        Add a session.
+
+        :param session: The session.
+        :type session: T
+
+        :return: The ID of the session.
+        :rtype: int
+        """
+        session_id = self._next_id
+        self._next_id += 1
+        self._sessions[session_id] = session
+        self._wheel.schedule(session_id, self.ttl)
+        return session_id
+
+    def get(self, session_id: int) -> Optional[T]:
+        """
+        Get a session and keep it for another ``ttl``.
+
+        :param session_id: The ID of the session.
+        :type session_id: int
+
+        :return: The session, or None if it ended or expired.
+        :rtype: Optional[T]
+        """
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self._wheel.schedule(session_id, self.ttl)
+        return session
+
+    def pop(self, session_id: int) -> Optional[T]:
+        """
+        End a session.
+
+        :param session_id: The ID of the session.
+        :type session_id: int
+
+        :return: The session, or None if it ended or expired already.
+        :rtype: Optional[T]
+        """
+        self._wheel.cancel(session_id)
+        return self._sessions.pop(session_id, None)
+
+    def items(self) -> Iterator[Tuple[int, T]]:
+        """
+        Iterate over the sessions without keeping them any longer.
+
+        :return: The IDs and the sessions.
+        :rtype: Iterator[Tuple[int, T]]
+        """
+        return iter(self._sessions.items())
+
+    def restore(self, session_id: int, session: T) -> None:
+        """
+        Add a session under the ID it had in another process.
+
+        :param session_id: The ID of the session.
+        :type session_id: int
+        :param session: The session.
+        :type session: T
+        """
+        self._sessions[session_id] = session
+        self._wheel.schedule(session_id, self.ttl)
+
+    def _expire(self, session_id: int) -> None:
+        session = self._sessions.pop(session_id, None)
+        if session is not None and self.on_expire is not None:
+            self.on_expire(session_id, session)
@@ -0,0 +1,433 @@
+"""
+Application command syncing with a local cache of the registered payload, and extensions loaded
+by their first command.
+
+This file is part of ouoteam/ouov3 which is released under GNU General Public License v3.0.
+See file LISENCE for full license details.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import hashlib
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+import discord
+import orjson
+
+from utils.logging import Logging
+
+__all__ = ["CommandSync", "LazyExtensions"]
+
+# a command, or the cached payload of a command whose extension is not loaded yet
+Command = Union[discord.ApplicationCommand, dict]
+
+
+class CommandSync:
+    """
+    Sync application commands only when their payload has changed.
+    The payload hash and the ids of the registered commands are stored per scope (global or guild),
+    so an unchanged scope costs no API calls at all. Delete the cache file to force a full sync.
+
+    :cvar path: The path of the cache file.
+    :vartype path: str
+    :cvar secondary_timeout: How long a secondary cluster waits for the primary to sync.
+    :vartype secondary_timeout: float
+    """
+
+    path = "data/commands.json"
+    secondary_timeout = 60.0
+    logger = Logging.get_logger()
+
+    @classmethod
+    def payload_hash(cls, commands: List[Command]) -> str:
+        """
+        Compute a stable hash of the payload of the commands.
+
+        :param commands: The commands to hash.
+        :type commands: List[Command]
+
+        :return: The hex digest of the payload.
+        :rtype: str
+        """
+        payload = sorted(
+            (cmd if isinstance(cmd, dict) else cmd.to_dict() for cmd in commands),
+            key=lambda c: (c.get("type", 1), c["name"]),
+        )
+        return hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+    @classmethod
+    def scopes(cls, bot: discord.Bot) -> Dict[Optional[int], List[Command]]:
+        """
+        Group the pending commands of the bot, and the cached ones of the extensions not loaded
+        yet, by the scope they are registered in.
+
+        :param bot: The bot instance.
+        :type bot: discord.Bot
+
+        :return: The commands of each scope, None being the global scope.
+        :rtype: Dict[Optional[int], List[Command]]
+        """
+        scopes: Dict[Optional[int], List[Command]] = {None: []}
+        for cmd in bot.pending_application_commands:
+            for guild_id in cmd.guild_ids or [None]:
+                scopes.setdefault(guild_id, []).append(cmd)
+        for guild_ids, payload in LazyExtensions.payloads():
+            for guild_id in guild_ids or [None]:
+                scopes.setdefault(guild_id, []).append(payload)
+        return scopes
+
+    @staticmethod
+    def key(cmd: Command) -> str:
+        """
+        Get the key of a command in the cached ids.
+
+        :param cmd: The command.
+        :type cmd: Command
+
+        :return: The type and the name of the command.
+        :rtype: str
+        """
+        if isinstance(cmd, dict):
+            return f"{cmd.get('type', 1)}:{cmd['name']}"
+        return f"{cmd.type}:{cmd.name}"
+
+    @classmethod
+    async def load(cls) -> dict:
+        """
+        Load the cache file.
+
+        :return: The cached entries, keyed by scope.
+        :rtype: dict
+        """
+        try:
+            return orjson.loads(await asyncio.to_thread(cls._read))
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            return {}
+
+    @classmethod
+    async def save(cls, cache: dict) -> None:
+        """
+        Save the cache file.
+
+        :param cache: The entries to save, keyed by scope.
+        :type cache: dict
+        """
+        await asyncio.to_thread(cls._write, orjson.dumps(cache, option=orjson.OPT_INDENT_2))
+
+    @classmethod
+    def _read(cls) -> bytes:
+        with open(cls.path, "rb") as f:
+            return f.read()
+
+    @classmethod
+    def _write(cls, data: bytes) -> None:
+        os.makedirs(os.path.dirname(cls.path), exist_ok=True)
+        with open(f"{cls.path}.tmp", "wb") as f:
+            f.write(data)
+        os.replace(f"{cls.path}.tmp", cls.path)
+
+    @classmethod
+    def bind(cls, bot: discord.Bot, commands: List[Command], ids: Dict[str, str]) -> bool:
+        """
+        Bind cached ids to the commands, so interactions can be routed without a sync.
+        The cached payloads of the extensions not loaded yet are only checked, their commands are
+        bound by :meth:`attach` once they are loaded.
+
+        :param bot: The bot instance.
+        :type bot: discord.Bot
+        :param commands: The commands to bind.
+        :type commands: List[Command]
+        :param ids: The cached ids, keyed by command type and name.
+        :type ids: Dict[str, str]
+
+        :return: Whether every command had a cached id.
+        :rtype: bool
+        """
+        if any(cls.key(cmd) not in ids for cmd in commands):
+            return False
+        for cmd in commands:
+            if not isinstance(cmd, dict):
+                cmd.id = ids[cls.key(cmd)]
+                bot._application_commands[cmd.id] = cmd
+        return True
+
+    @classmethod
+    async def attach(cls, bot: discord.Bot, commands: List[discord.ApplicationCommand]) -> None:
+        """
+        Bind the cached ids to commands added after the sync, such as the commands of a lazily
+        loaded extension.
+
+        :param bot: The bot instance.
+        :type bot: discord.Bot
+        :param commands: The commands to bind.
+        :type commands: List[discord.ApplicationCommand]
+        """
+        cache = await cls.load()
+        if cache.get("application_id") != (bot.application_id or bot.user.id):
+            return
+        for cmd in commands:
+            for guild_id in cmd.guild_ids or [None]:
+                key = "global" if guild_id is None else str(guild_id)
+                ids = cache["scopes"].get(key, {}).get("ids", {})
+                if cls.key(cmd) in ids:
+                    cmd.id = ids[cls.key(cmd)]
+                    bot._application_commands[cmd.id] = cmd
+
+    @classmethod
+    async def wait_for_primary(cls, bot: discord.Bot) -> bool:
+        """
+        Wait for the primary cluster to sync, then bind the ids it cached.
+
+        :param bot: The bot instance.
+        :type bot: discord.Bot
+
+        :return: Whether every scope was bound before the timeout.
+        :rtype: bool
+        """
+        application_id = bot.application_id or bot.user.id
+        scopes = {
+            "global" if guild_id is None else str(guild_id): (cls.payload_hash(commands), commands)
+            for guild_id, commands in cls.scopes(bot).items()
+        }
+        deadline = asyncio.get_running_loop().time() + cls.secondary_timeout
+        while True:
+            cache = await cls.load()
+            cached_scopes = (
+                cache.get("scopes", {}) if cache.get("application_id") == application_id else {}
+            )
+            if all(
+                key in cached_scopes and cached_scopes[key]["hash"] == digest
+                for key, (digest, _) in scopes.items()
+            ) and all(
+                cls.bind(bot, commands, cached_scopes[key]["ids"])
+                for key, (_, commands) in scopes.items()
+            ):
+                cls.logger.debug("已使用主要叢集同步的指令")
+                return True
+            if asyncio.get_running_loop().time() >= deadline:
+                return False
+            await asyncio.sleep(2)
+
+    @classmethod
+    async def sync(cls, bot: discord.Bot, *, primary: bool = True) -> None:
+        """
+        Sync the commands of the bot, skipping every scope whose payload did not change.
+        Changed scopes are diffed against Discord and only the changed commands are updated.
+        When clustered only the primary cluster syncs, the others reuse the ids it cached and
+        only sync themselves if the primary did not finish in time.
+
+        :param bot: The bot instance.
+        :type bot: discord.Bot
+        :param primary: Whether this process is responsible for syncing.
+        :type primary: bool
+        """
+        if not primary:
+            if await cls.wait_for_primary(bot):
+                return
+            cls.logger.warning("等待主要叢集同步指令逾時，改為自行同步")
+        cache = await cls.load()
+        application_id = bot.application_id or bot.user.id
+        if cache.get("application_id") != application_id:
+            cache = {"application_id": application_id, "scopes": {}}
+        cached_scopes = cache["scopes"]
+        scopes = cls.scopes(bot)
+        if LazyExtensions.pending and any(
+            cached_scopes.get("global" if guild_id is None else str(guild_id), {}).get("hash")
+            != cls.payload_hash(commands)
+            for guild_id, commands in scopes.items()
+        ):
+            # registering needs the command objects, load the extensions of the cached payloads
+            await LazyExtensions.load_all(bot)
+            scopes = cls.scopes(bot)
+        for guild_id, commands in scopes.items():
+            key = "global" if guild_id is None else str(guild_id)
+            digest = cls.payload_hash(commands)
+            entry = cached_scopes.get(key)
+            if entry and entry["hash"] == digest and cls.bind(bot, commands, entry["ids"]):
+                cls.logger.debug(f"指令未變更，略過同步 ({key})")
+                continue
+            try:
+                registered = await bot.register_commands(commands, guild_id=guild_id, method="auto")
+            except discord.Forbidden:
+                cls.logger.warning(f"沒有權限同步指令 ({key})")
+                continue
+            cached_scopes[key] = {
+                "hash": digest,
+                "ids": {f"{i.get('type', 1)}:{i['name']}": i["id"] for i in registered},
+            }
+            cls.logger.info(f"已同步 {len(registered)} 個指令 ({key})")
+        for key in [k for k in cached_scopes if k != "global" and int(k) not in scopes]:
+            # the guild has no commands anymore, remove the ones registered there
+            with contextlib.suppress(discord.Forbidden):
+                await bot.register_commands([], guild_id=int(key), method="auto")
+            del cached_scopes[key]
+        await cls.save(cache)
+
+
+class LazyExtensions:
+    """
+    Extensions loaded by the first interaction with one of their commands.
+    The payloads of their commands are cached the first time they are loaded, with a hash of their
+    source, so on the next start the commands are still synced and routed to the extension while
+    it is not imported. An extension whose source changed is loaded at startup and cached again.
+    Extensions with event listeners are always loaded at startup, as their listeners would miss
+    every event before their first command.
+
+    :cvar path: The path of the cache file.
+    :vartype path: str
+    :cvar extensions: The extensions to load lazily, empty unless lazy imports are enabled.
+    :vartype extensions: Set[str]
+    :cvar pending: The cached commands of every extension not loaded yet, each command as its
+        guild IDs and its payload.
+    :vartype pending: Dict[str, List[dict]]
+    """
+
+    path = "data/lazy_extensions.json"
+    extensions: Set[str] = set()
+    pending: Dict[str, List[dict]] = {}
+    logger = Logging.get_logger()
+    _cache: Optional[Dict[str, dict]] = None
+    _names: Dict[str, str] = {}
+
+    @classmethod
+    def digest(cls, name: str) -> str:
+        """
+        Hash the source of an extension.
+
+        :param name: The name of the extension.
+        :type name: str
+
+        :return: The hex digest of the source, empty if it has no source file.
+        :rtype: str
+        """
+        try:
+            with open(f"{name.replace('.', os.sep)}.py", "rb") as f:
+                return hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            return ""
+
+    @classmethod
+    def defer(cls, name: str) -> bool:
+        """
+        Defer loading an extension, if it is lazy and its commands are cached.
+        This runs while the bot is created, before the event loop.
+
+        :param name: The name of the extension.
+        :type name: str
+
+        :return: Whether the extension was deferred.
+        :rtype: bool
+        """
+        if name not in cls.extensions:
+            return False
+        if cls._cache is None:
+            try:
+                with open(cls.path, "rb") as f:
+                    cls._cache = orjson.loads(f.read())
+            except (FileNotFoundError, orjson.JSONDecodeError):
+                cls._cache = {}
+        entry = cls._cache.get(name)
+        digest = cls.digest(name)
+        if entry is None or not digest or entry["digest"] != digest:
+            return False
+        cls.pending[name] = entry["commands"]
+        for command in entry["commands"]:
+            cls._names[command["payload"]["name"]] = name
+        return True
+
+    @classmethod
+    def record(
+        cls, bot: discord.Bot, name: str, commands: Iterable[discord.ApplicationCommand]
+    ) -> None:
+        """
+        Cache the commands of a lazy extension loaded at startup, to defer it on the next start.
+
+        :param bot: The bot instance.
+        :type bot: discord.Bot
+        :param name: The name of the extension.
+        :type name: str
+        :param commands: The commands the extension added.
+        :type commands: Iterable[discord.ApplicationCommand]
+        """
+        if name not in cls.extensions:
+            return
+        if cls._cache is None:
+            cls._cache = {}
+        if any(cog.get_listeners() for cog in bot.cogs.values() if cog.__module__ == name):
+            cls.logger.warning(f"插件 {name} 有事件監聽器，無法延遲載入")
+            cls._cache.pop(name, None)
+        else:
+            cls._cache[name] = {
+                "digest": cls.digest(name),
+                "commands": [
+                    {"guild_ids": cmd.guild_ids, "payload": cmd.to_dict()} for cmd in commands
+                ],
+            }
+        os.makedirs(os.path.dirname(cls.path), exist_ok=True)
+        with open(f"{cls.path}.tmp", "wb") as f:
+            f.write(orjson.dumps(cls._cache, option=orjson.OPT_INDENT_2))
+        os.replace(f"{cls.path}.tmp", cls.path)
+
+    @classmethod
+    def payloads(cls) -> List[Tuple[Optional[List[int]], dict]]:
+        """
+        Get the cached commands of the extensions not loaded yet.
+
+        :return: The guild IDs and the payload of every command.
+        :rtype: List[Tuple[Optional[List[int]], dict]]
+        """
+        return [
+            (command["guild_ids"], command["payload"])
+            for commands in cls.pending.values()
+            for command in commands
+        ]
+
+    @classmethod
+    def extension(cls, command: str) -> Optional[str]:
+        """
+        Get the extension of a command that is not loaded yet.
+
+        :param command: The name of the top level command.
+        :type command: str
+
+        :return: The name of the extension, or None if the command is loaded.
+        :rtype: Optional[str]
+        """
+        name = cls._names.get(command)
+        return name if name in cls.pending else None
+
+    @classmethod
+    async def load(cls, bot: discord.Bot, name: str) -> None:
+        """
+        Load a deferred extension and bind the cached ids of its commands.
+
+        :param bot: The bot instance.
+        :type bot: discord.Bot
+        :param name: The name of the extension.
+        :type name: str
+        """
+        if cls.pending.pop(name, None) is None:
+            return
+        loaded = set(map(id, bot.pending_application_commands))
+        try:
+            bot.load_extension(name)
+        except discord.ExtensionError as e:
+            cls.logger.opt(exception=e).error(f"載入插件 {name} 時出現錯誤")
+            return
+        cls.logger.debug(f"已延遲載入插件 {name}")
+        await CommandSync.attach(
+            bot, [cmd for cmd in bot.pending_application_commands if id(cmd) not in loaded]
+        )
+
+    @classmethod
+    async def load_all(cls, bot: discord.Bot) -> None:
+        """
+        Load every deferred extension.
+
+        :param bot: The bot instance.
+        :type bot: discord.Bot
+        """
+        for name in list(cls.pending):
+            await cls.load(bot, name)
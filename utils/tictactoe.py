@@ -1,5 +1,5 @@
 """
-Tic Tac Toe Minimax Algorithm evaluation function
+Tic Tac Toe and k-in-a-row engines
 
 This file is part of ouoteam/ouov3 which is released under GNU General Public License v3.0.
 See file LISENCE for full license details.
@@ -7,20 +7,705 @@ See file LISENCE for full license details.
 
 from __future__ import annotations
 
-import itertools
+import random
+import time
+from typing import TYPE_CHECKING, Callable, Iterable
 
-import numpy as np
+if TYPE_CHECKING:
+    # numpy is only needed by Batch and Solver.build, which import it when they run, so the
+    # engines and the pool workers load without it
+    import numpy as np
 
-__all__ = ["Tictactoe"]
+__all__ = ["Tictactoe", "Solver", "Engine", "SearchResult", "Batch"]
+
+FULL = 0b111111111
+# cell (row, col) is bit row * 3 + col
+WIN_MASKS = (
+    0b000000111,
+    0b000111000,
+    0b111000000,
+    0b001001001,
+    0b010010010,
+    0b100100100,
+    0b100010001,
+    0b001010100,
+)
+# WINS[bits] tells whether the cells in bits contain a line, so a win check is one lookup
+WINS = tuple(any(bits & mask == mask for mask in WIN_MASKS) for bits in range(FULL + 1))
+CELLS = tuple((i // 3, i % 3) for i in range(9))
+# the 8 symmetries of the board, each as the cell every cell is moved to
+_ROTATE = tuple(c * 3 + (2 - r) for r, c in CELLS)
+_MIRROR = tuple(r * 3 + (2 - c) for r, c in CELLS)
+SYMMETRIES = tuple(
+    tuple(_MIRROR[p] if mirrored else p for p in rotation)
+    for rotation in (
+        tuple(range(9)),
+        _ROTATE,
+        tuple(_ROTATE[_ROTATE[i]] for i in range(9)),
+        tuple(_ROTATE[_ROTATE[_ROTATE[i]]] for i in range(9)),
+    )
+    for mirrored in (False, True)
+)
+INVERSES = tuple(
+    next(j for j, t in enumerate(SYMMETRIES) if all(t[p[i]] == i for i in range(9)))
+    for p in SYMMETRIES
+)
+# TRANSFORMS[s][bits] is bits with symmetry s applied
+TRANSFORMS = tuple(
+    tuple(sum(1 << p[i] for i in range(9) if bits >> i & 1) for bits in range(FULL + 1))
+    for p in SYMMETRIES
+)
+# cells are tried center first, then corners, then edges, as ties go to the first best move
+ORDER = (4, 0, 2, 6, 8, 1, 3, 5, 7)
+
+
+class Solver:
+    """
+    Perfect play for Tic Tac Toe from a table of every position.
+    Positions are stored once per symmetry class, keyed by the smallest of their 8 images, which
+    leaves 765 entries for the 5478 legal positions. The table is built by the first position
+    solved, after that finding the best move is a lookup.
+
+    :cvar table: The value for the player to move and the best cell of each canonical position.
+    :vartype table: dict[int, tuple[int, int]]
+    """
+
+    table: dict[int, tuple[int, int]] = {}
+    _built = False
+
+    @classmethod
+    def canonical(cls, mover: int, opponent: int) -> tuple[int, int]:
+        """
+        Find the canonical image of a position.
+
+        :param mover: The cells of the player to move.
+        :type mover: int
+        :param opponent: The cells of the other player.
+        :type opponent: int
+
+        :return: The key of the canonical image and the symmetry giving it.
+        :rtype: tuple[int, int]
+        """
+        return min(
+            (transform[mover] << 9 | transform[opponent], s)
+            for s, transform in enumerate(TRANSFORMS)
+        )
+
+    @classmethod
+    def solve(cls, mover: int, opponent: int) -> tuple[int, int]:
+        """
+        Get the value and the best move of a position.
+        Positions that are not in the table, such as illegal ones, are searched and added.
+
+        :param mover: The cells of the player to move.
+        :type mover: int
+        :param opponent: The cells of the other player.
+        :type opponent: int
+
+        :return: The value for the player to move, positive if they win, negative if they lose,
+            larger when the game ends sooner, and the best cell or -1 if the game is over.
+        :rtype: tuple[int, int]
+        """
+        if not cls._built:
+            cls.build()
+        key, s = cls.canonical(mover, opponent)
+        entry = cls.table.get(key)
+        if entry is None:
+            entry = cls._search(key >> 9, key & FULL)
+            cls.table[key] = entry
+        value, cell = entry
+        return value, SYMMETRIES[INVERSES[s]][cell] if cell >= 0 else -1
+
+    @classmethod
+    def _search(cls, mover: int, opponent: int) -> tuple[int, int]:
+        occupied = mover | opponent
+        if WINS[opponent]:
+            return bin(occupied).count("1") - 20, -1
+        if WINS[mover]:
+            # only in illegal positions, the mover won already
+            return 20 - bin(occupied).count("1"), -1
+        if occupied == FULL:
+            return 0, -1
+        best, best_cell = -100, -1
+        for cell in ORDER:
+            bit = 1 << cell
+            if not occupied & bit:
+                value = -cls.solve(opponent, mover | bit)[0]
+                if value > best:
+                    best, best_cell = value, cell
+        return best, best_cell
+
+    @classmethod
+    def build(cls) -> None:
+        """
+        Solve every position reachable from the empty board, whoever starts.
+        The positions are expanded one ply at a time as arrays of canonical keys, then solved
+        from the last ply back to the first, each ply in a single pass with :class:`Batch`.
+        """
+        import numpy as np
+
+        transforms = np.array(TRANSFORMS, dtype=np.int64)
+        popcount = np.array([bin(bits).count("1") for bits in range(FULL + 1)])
+        rank = np.empty(9, dtype=np.int64)
+        rank[list(ORDER)] = np.arange(8, -1, -1)
+
+        def canonical(mover: np.ndarray, opponent: np.ndarray) -> np.ndarray:
+            return (transforms[:, mover] << 9 | transforms[:, opponent]).min(axis=0)
+
+        plies = [np.zeros(1, dtype=np.int64)]
+        while len(plies[-1]):
+            keys = plies[-1]
+            mover, opponent = keys >> 9, keys & FULL
+            ongoing = Batch.results(mover, opponent) == Batch.ONGOING
+            _, _, child_mover, child_opponent = Batch.children(mover[ongoing], opponent[ongoing])
+            plies.append(np.unique(canonical(child_mover, child_opponent)))
+        plies.pop()
+
+        table = {}
+        child_keys = values = np.zeros(0, dtype=np.int64)
+        for keys in reversed(plies):
+            mover, opponent = keys >> 9, keys & FULL
+            results = Batch.results(mover, opponent)
+            count = popcount[mover | opponent]
+            # the same values as _search, for a lost, an illegal won or a drawn position
+            value = np.select(
+                [results == Batch.O_WINS, results == Batch.X_WINS], [count - 20, 20 - count], 0
+            )
+            cell = np.full(len(keys), -1)
+            ongoing = np.flatnonzero(results == Batch.ONGOING)
+            if len(ongoing):
+                parents, cells, child_mover, child_opponent = Batch.children(
+                    mover[ongoing], opponent[ongoing]
+                )
+                child = canonical(child_mover, child_opponent)
+                scores = -values[np.searchsorted(child_keys, child)] * 16 + rank[cells]
+                # the best value, ties going to the cell first in ORDER like _search
+                best = np.full(len(ongoing), np.iinfo(np.int64).min)
+                np.maximum.at(best, parents, scores)
+                value[ongoing] = best >> 4
+                cell[ongoing] = np.array(ORDER)[8 - (best & 15)]
+            table.update(zip(keys.tolist(), zip(value.tolist(), cell.tolist())))
+            child_keys, values = keys, value
+        cls.table = table
+        cls._built = True
+
+
+class Batch:
+    """
+    Evaluate many positions at once with numpy.
+    A batch of positions is two arrays of unsigned 64-bit integers, the cells of each player in
+    the same layout as :class:`Tictactoe`, so boards of up to 8×8 fit.
+
+    :cvar ONGOING: The game is not over.
+    :cvar X_WINS: The first player of the position won.
+    :cvar O_WINS: The second player of the position won.
+    :cvar DRAW: The board is full without a winner.
+    """
+
+    ONGOING, X_WINS, O_WINS, DRAW = 0, 1, 2, 3
+    _masks: dict[tuple[int, int], np.ndarray] = {}
+
+    @classmethod
+    def masks(cls, size: int = 3, k: int | None = None) -> np.ndarray:
+        """
+        Get the win masks of a board size.
+
+        :param size: The width and height of the board.
+        :type size: int
+        :param k: The number of marks in a row needed to win, the size of the board by default.
+        :type k: int | None
+
+        :raises ValueError: If the board has more than 64 cells.
+
+        :return: The cells of every line.
+        :rtype: np.ndarray
+        """
+        import numpy as np
+
+        k = k or size
+        masks = cls._masks.get((size, k))
+        if masks is None:
+            if size * size > 64:
+                raise ValueError("Boards of more than 64 cells do not fit in a batch.")
+            lines = WIN_MASKS if size == 3 and k == 3 else Engine.get(size, k).lines
+            masks = cls._masks[size, k] = np.array(lines, dtype=np.uint64)
+        return masks
+
+    @classmethod
+    def pack(cls, games: Iterable[Tictactoe]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Pack games of the same size into a batch.
+
+        :param games: The games.
+        :type games: Iterable[Tictactoe]
+
+        :return: The cells of X and the cells of O.
+        :rtype: tuple[np.ndarray, np.ndarray]
+        """
+        import numpy as np
+
+        boards = [(game.x, game.o) for game in games]
+        packed = np.array(boards, dtype=np.uint64).reshape(-1, 2)
+        return packed[:, 0], packed[:, 1]
+
+    @classmethod
+    def wins(cls, bits: np.ndarray, size: int = 3, k: int | None = None) -> np.ndarray:
+        """
+        Check which boards contain a line.
+
+        :param bits: The cells of a player on each board.
+        :type bits: np.ndarray
+        :param size: The width and height of the board.
+        :type size: int
+        :param k: The number of marks in a row needed to win, the size of the board by default.
+        :type k: int | None
+
+        :return: Whether the player won, for each board.
+        :rtype: np.ndarray
+        """
+        import numpy as np
+
+        masks = cls.masks(size, k)
+        bits = np.asarray(bits, dtype=np.uint64)
+        return (bits[:, None] & masks == masks).any(axis=1)
+
+    @classmethod
+    def results(
+        cls, x: np.ndarray, o: np.ndarray, size: int = 3, k: int | None = None
+    ) -> np.ndarray:
+        """
+        Get the result of every board.
+
+        :param x: The cells of the first player on each board.
+        :type x: np.ndarray
+        :param o: The cells of the second player on each board.
+        :type o: np.ndarray
+        :param size: The width and height of the board.
+        :type size: int
+        :param k: The number of marks in a row needed to win, the size of the board by default.
+        :type k: int | None
+
+        :return: One of :attr:`ONGOING`, :attr:`X_WINS`, :attr:`O_WINS` and :attr:`DRAW` per board.
+        :rtype: np.ndarray
+        """
+        import numpy as np
+
+        x = np.asarray(x, dtype=np.uint64)
+        o = np.asarray(o, dtype=np.uint64)
+        full = np.uint64((1 << size * size) - 1)
+        return np.select(
+            [cls.wins(x, size, k), cls.wins(o, size, k), x | o == full],
+            [cls.X_WINS, cls.O_WINS, cls.DRAW],
+            cls.ONGOING,
+        ).astype(np.uint8)
+
+    @classmethod
+    def children(
+        cls, mover: np.ndarray, opponent: np.ndarray, size: int = 3
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Generate every move of every board.
+        The children are seen from the player to move next, so their mover is the opponent of
+        the parent, like in :class:`Solver` and :class:`Engine`.
+
+        :param mover: The cells of the player to move on each board.
+        :type mover: np.ndarray
+        :param opponent: The cells of the other player on each board.
+        :type opponent: np.ndarray
+        :param size: The width and height of the board.
+        :type size: int
+
+        :return: The index of the parent and the cell played of each child, then the cells of
+            the player to move and of the other player on each child.
+        :rtype: tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+        """
+        import numpy as np
+
+        dtype = np.result_type(mover, opponent)
+        bits = np.left_shift(1, np.arange(size * size)).astype(dtype)
+        free = (mover | opponent)[:, None] & bits == 0
+        parents, cells = np.nonzero(free)
+        return parents, cells, opponent[parents], mover[parents] | bits[cells]
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside a search when its time limit is reached or it is stopped.
+    """
+
+
+class SearchResult:
+    """
+    The outcome of an :meth:`Engine.search`.
+
+    :ivar move: The best cell found, or -1 if the game is over.
+    :vartype move: int
+    :ivar value: The value of the move for the player to move.
+    :vartype value: int
+    :ivar depth: The depth of the last completed iteration.
+    :vartype depth: int
+    :ivar nodes: The number of nodes searched.
+    :vartype nodes: int
+    """
+
+    __slots__ = ("move", "value", "depth", "nodes")
+
+    def __init__(self, move: int, value: int, depth: int, nodes: int) -> None:
+        self.move = move
+        self.value = value
+        self.depth = depth
+        self.nodes = nodes
+
+    def __repr__(self) -> str:
+        return (
+            f"<SearchResult move={self.move} value={self.value} "
+            f"depth={self.depth} nodes={self.nodes}>"
+        )
+
+
+class Engine:
+    """
+    Alpha-beta search for k-in-a-row on an N×N board, with bitboards of N×N bits.
+    Moves are ordered by the transposition table, then by a history of the cutoffs they caused,
+    then by how many lines they are part of. The search deepens iteratively until the depth or
+    the time limit is reached, so it always has a move from the last completed depth.
+
+    Engines are shared by every game of the same size through :meth:`get`, so the transposition
+    table is shared too. It has a fixed number of slots, a new entry replaces the old one.
+
+    :param size: The width and height of the board.
+    :type size: int
+    :param k: The number of marks in a row needed to win.
+    :type k: int
+    :param table_bits: The transposition table has 2 ** table_bits slots.
+    :type table_bits: int
+    """
+
+    WIN = 1_000_000
+    EXACT, LOWER, UPPER = 0, 1, 2
+    _engines: dict[tuple[int, int], "Engine"] = {}
+
+    def __init__(self, size: int, k: int, table_bits: int = 18) -> None:
+        if not 1 <= k <= size:
+            raise ValueError("k must be between 1 and the size of the board.")
+        self.size = size
+        self.k = k
+        self.cells = size * size
+        self.full = (1 << self.cells) - 1
+        lines = []
+        for r in range(size):
+            for c in range(size):
+                for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                    end_r, end_c = r + dr * (k - 1), c + dc * (k - 1)
+                    if 0 <= end_r < size and 0 <= end_c < size:
+                        lines.append(sum(1 << ((r + dr * i) * size + c + dc * i) for i in range(k)))
+        self.lines = tuple(lines)
+        self.lines_through = tuple(
+            tuple(line for line in self.lines if line >> cell & 1) for cell in range(self.cells)
+        )
+        # cells in more lines are tried first, ties broken towards the center
+        center = (size - 1) / 2
+        self.order = tuple(
+            sorted(
+                range(self.cells),
+                key=lambda i: (
+                    -len(self.lines_through[i]),
+                    abs(i // size - center) + abs(i % size - center),
+                ),
+            )
+        )
+        rng = random.Random(size * 1000 + k)
+        self.zobrist = tuple(
+            tuple(rng.getrandbits(64) for _ in range(self.cells)) for _ in range(2)
+        )
+        self.zobrist_side = rng.getrandbits(64)
+        self.table_mask = (1 << table_bits) - 1
+        self.table: list = [None] * (1 << table_bits)
+
+    @classmethod
+    def get(cls, size: int, k: int) -> Engine:
+        """
+        Get the shared engine of a board size.
+
+        :param size: The width and height of the board.
+        :type size: int
+        :param k: The number of marks in a row needed to win.
+        :type k: int
+
+        :return: The engine.
+        :rtype: Engine
+        """
+        engine = cls._engines.get((size, k))
+        if engine is None:
+            engine = cls._engines[size, k] = cls(size, k)
+        return engine
+
+    def wins(self, bits: int) -> bool:
+        """
+        Check whether the cells contain a line.
+
+        :param bits: The cells of a player.
+        :type bits: int
+
+        :return: Whether the player won.
+        :rtype: bool
+        """
+        return any(bits & line == line for line in self.lines)
+
+    def hash(self, mover: int, opponent: int, side: int) -> int:
+        """
+        Compute the Zobrist hash of a position.
+
+        :param mover: The cells of the player to move.
+        :type mover: int
+        :param opponent: The cells of the other player.
+        :type opponent: int
+        :param side: The player to move, 0 or 1.
+        :type side: int
+
+        :return: The hash.
+        :rtype: int
+        """
+        h = self.zobrist_side if side else 0
+        for cell in range(self.cells):
+            if mover >> cell & 1:
+                h ^= self.zobrist[side][cell]
+            elif opponent >> cell & 1:
+                h ^= self.zobrist[1 - side][cell]
+        return h
+
+    def evaluate(self, mover: int, opponent: int) -> int:
+        """
+        Estimate a position for the player to move, from the lines each player can still fill.
+
+        :param mover: The cells of the player to move.
+        :type mover: int
+        :param opponent: The cells of the other player.
+        :type opponent: int
+
+        :return: The estimate, positive if the player to move is better.
+        :rtype: int
+        """
+        score = 0
+        for line in self.lines:
+            if not line & opponent:
+                score += 1 << (2 * bin(line & mover).count("1"))
+            elif not line & mover:
+                score -= 1 << (2 * bin(line & opponent).count("1"))
+        return score
+
+    def search(
+        self,
+        mover: int,
+        opponent: int,
+        side: int = 0,
+        max_depth: int | None = None,
+        time_limit: float | None = None,
+        stop: Callable[[], bool] | None = None,
+    ) -> SearchResult:
+        """
+        Search the best move with iterative deepening.
+
+        :param mover: The cells of the player to move.
+        :type mover: int
+        :param opponent: The cells of the other player.
+        :type opponent: int
+        :param side: The player to move, 0 or 1, for the transposition table.
+        :type side: int
+        :param max_depth: The maximum depth in plies, or None to search until the end of the game.
+        :type max_depth: int | None
+        :param time_limit: The time limit in seconds, or None for no limit.
+        :type time_limit: float | None
+        :param stop: A function polled during the search, which ends it early when it returns True.
+        :type stop: Callable[[], bool] | None
+
+        :return: The result of the deepest completed iteration.
+        :rtype: SearchResult
+        """
+        empty = self.cells - bin(mover | opponent).count("1")
+        max_depth = empty if max_depth is None else min(max_depth, empty)
+        search = _Search(self, None if time_limit is None else time.monotonic() + time_limit, stop)
+        result = SearchResult(-1, 0, 0, 0)
+        h = self.hash(mover, opponent, side)
+        for depth in range(1, max_depth + 1):
+            try:
+                value, move = search.root(mover, opponent, side, h, depth)
+            except SearchTimeout:
+                break
+            result = SearchResult(move, value, depth, search.nodes)
+            if abs(value) >= self.WIN - self.cells:
+                # the game is decided, deeper searches cannot change the result
+                break
+        if result.move < 0 and empty:
+            # not even depth 1 finished, play the first legal move in order
+            result.move = next(c for c in self.order if not (mover | opponent) >> c & 1)
+        result.nodes = search.nodes
+        return result
+
+
+class _Search:
+    """
+    The state of a single search, so an engine can run several searches at once.
+    """
+
+    __slots__ = ("engine", "deadline", "stop", "nodes", "history")
+
+    def __init__(
+        self, engine: Engine, deadline: float | None, stop: Callable[[], bool] | None
+    ) -> None:
+        self.engine = engine
+        self.deadline = deadline
+        self.stop = stop
+        self.nodes = 0
+        self.history = [0] * engine.cells
+
+    def moves(self, occupied: int, first: int) -> list[int]:
+        engine = self.engine
+        history = self.history
+        moves = [c for c in engine.order if not occupied >> c & 1]
+        moves.sort(key=lambda c: -history[c])
+        if first >= 0 and not occupied >> first & 1:
+            moves.remove(first)
+            moves.insert(0, first)
+        return moves
+
+    def root(self, mover: int, opponent: int, side: int, h: int, depth: int) -> tuple[int, int]:
+        entry = self.engine.table[h & self.engine.table_mask]
+        first = entry[4] if entry is not None and entry[0] == h else -1
+        best, best_move = -Engine.WIN - 1, -1
+        alpha = -Engine.WIN - 1
+        for cell in self.moves(mover | opponent, first):
+            value = self.child(mover, opponent, side, h, cell, depth, -Engine.WIN - 1, -alpha, 0)
+            if value > best:
+                best, best_move = value, cell
+                alpha = max(alpha, value)
+        self.engine.table[h & self.engine.table_mask] = (h, depth, best, Engine.EXACT, best_move)
+        return best, best_move
+
+    def child(
+        self,
+        mover: int,
+        opponent: int,
+        side: int,
+        h: int,
+        cell: int,
+        depth: int,
+        alpha: int,
+        beta: int,
+        ply: int,
+    ) -> int:
+        engine = self.engine
+        moved = mover | 1 << cell
+        for line in engine.lines_through[cell]:
+            if moved & line == line:
+                return Engine.WIN - ply - 1
+        h ^= engine.zobrist[side][cell] ^ engine.zobrist_side
+        return -self.negamax(opponent, moved, 1 - side, h, depth - 1, alpha, beta, ply + 1)
+
+    def negamax(
+        self,
+        mover: int,
+        opponent: int,
+        side: int,
+        h: int,
+        depth: int,
+        alpha: int,
+        beta: int,
+        ply: int,
+    ) -> int:
+        self.nodes += 1
+        if not self.nodes & 1023:
+            if self.deadline is not None and time.monotonic() > self.deadline:
+                raise SearchTimeout
+            if self.stop is not None and self.stop():
+                raise SearchTimeout
+        engine = self.engine
+        occupied = mover | opponent
+        if occupied == engine.full:
+            return 0
+        if depth == 0:
+            return engine.evaluate(mover, opponent)
+        slot = h & engine.table_mask
+        entry = engine.table[slot]
+        first = -1
+        if entry is not None and entry[0] == h:
+            _, entry_depth, value, flag, first = entry
+            if entry_depth >= depth:
+                # wins are stored relative to the position, not to the root
+                if value > Engine.WIN - engine.cells:
+                    value -= ply
+                elif value < engine.cells - Engine.WIN:
+                    value += ply
+                if flag == Engine.EXACT:
+                    return value
+                if flag == Engine.LOWER:
+                    alpha = max(alpha, value)
+                else:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return value
+        original_alpha = alpha
+        best, best_move = -Engine.WIN - 1, -1
+        for cell in self.moves(occupied, first):
+            value = self.child(mover, opponent, side, h, cell, depth, -beta, -alpha, ply)
+            if value > best:
+                best, best_move = value, cell
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        self.history[cell] += depth * depth
+                        break
+        flag = (
+            Engine.UPPER
+            if best <= original_alpha
+            else Engine.LOWER
+            if best >= beta
+            else Engine.EXACT
+        )
+        stored = best
+        if best > Engine.WIN - engine.cells:
+            stored += ply
+        elif best < engine.cells - Engine.WIN:
+            stored -= ply
+        engine.table[slot] = (h, depth, stored, flag, best_move)
+        return best
 
 
 class Tictactoe:
     """
-    This class represents a Tic Tac Toe game.
+    This class represents a Tic Tac Toe game, or k-in-a-row on a bigger board.
+    The board is stored as two integers, one per player, bit ``row * size + col`` being set
+    when the player took that cell.
+
+    :param size: The width and height of the board.
+    :type size: int
+    :param k: The number of marks in a row needed to win, the size of the board by default.
+    :type k: int | None
     """
 
-    def __init__(self):
-        self.board = np.array([["", "", ""], ["", "", ""], ["", "", ""]])
+    def __init__(self, size: int = 3, k: int | None = None):
+        self.size = size
+        self.k = k or size
+        self.engine = Engine.get(size, self.k)
+        self.x = 0
+        self.o = 0
+        self.nodes = 0
+
+    @property
+    def board(self) -> list[list[str]]:
+        """
+        The board as rows of "X", "O" and "" for empty cells.
+
+        :rtype: list[list[str]]
+        """
+        n = self.size
+        return [
+            [
+                "X" if self.x >> (i * n + j) & 1 else "O" if self.o >> (i * n + j) & 1 else ""
+                for j in range(n)
+            ]
+            for i in range(n)
+        ]
 
     def move(self, row: int, col: int, player: str) -> str | bool | None:
         """
@@ -39,13 +724,20 @@ class Tictactoe:
         :return: X if X won, O if O won, None if the game is tied, and False if the game is not over.
         :rtype: Optional[Union[str, bool]]
         """
+        n = self.size
         if player not in ["X", "O"]:
             raise ValueError("Invalid player.")
-        if row < 0 or row > 2 or col < 0 or col > 2 or self.board[row][col] != "":
+        if row < 0 or row >= n or col < 0 or col >= n or (self.x | self.o) >> (row * n + col) & 1:
             raise ValueError("Invalid move.")
-        self.board[row][col] = player
+        if player == "X":
+            self.x |= 1 << (row * n + col)
+        else:
+            self.o |= 1 << (row * n + col)
         return self.evaluate_result()
 
+    def _wins(self, bits: int) -> bool:
+        return WINS[bits] if self.size == 3 and self.k == 3 else self.engine.wins(bits)
+
     def evaluate_result(self) -> str | bool | None:
         """
         This function checks if the game is over.
@@ -53,34 +745,12 @@ class Tictactoe:
         :return: X if X won, O if O won, None if the game is tied, and False if the game is not over.
         :rtype: Optional[Union[str, bool]]
         """
-        # check rows
-        for row in self.board:
-            if all(cell == "X" for cell in row):
-                return "X"
-            elif all(cell == "O" for cell in row):
-                return "O"
-
-        # check columns
-        for col in range(3):
-            if all(self.board[row][col] == "X" for row in range(3)):
-                return "X"
-            elif all(self.board[row][col] == "O" for row in range(3)):
-                return "O"
-
-        # check diagonals
-        if all(self.board[i][i] == "X" for i in range(3)):
+        if self._wins(self.x):
             return "X"
-        elif all(self.board[i][i] == "O" for i in range(3)):
+        if self._wins(self.o):
             return "O"
-
-        # check other diagonal
-        if all(self.board[i][2 - i] == "X" for i in range(3)):
-            return "X"
-        elif all(self.board[i][2 - i] == "O" for i in range(3)):
-            return "O"
-
         # check if the game is tied or not over yet
-        return None if np.all(self.board != "") else False
+        return None if self.x | self.o == self.engine.full else False
 
     def get_score(self) -> int:
         """
@@ -91,32 +761,16 @@ class Tictactoe:
         :return: The score of the current board state.
         :rtype: int
         """
-        for row in self.board:
-            if all(cell == "X" for cell in row):
-                return 10
-            elif all(cell == "O" for cell in row):
-                return -10
-
-        for col in range(3):
-            if all(self.board[row][col] == "X" for row in range(3)):
-                return 10
-            elif all(self.board[row][col] == "O" for row in range(3)):
-                return -10
-
-        if all(self.board[i][i] == "X" for i in range(3)):
-            return 10
-        elif all(self.board[i][i] == "O" for i in range(3)):
-            return -10
-
-        if all(self.board[i][2 - i] == "X" for i in range(3)):
+        if self._wins(self.x):
             return 10
-        elif all(self.board[i][2 - i] == "O" for i in range(3)):
+        if self._wins(self.o):
             return -10
         return 0
 
     def minimax(self, depth: int, is_maximizing: bool) -> int:
         """
         This function uses the minimax algorithm to evaluate the best next move for the computer player (X).
+        This is a full-width search without pruning, only practical on a 3×3 board.
 
         :param depth: The depth of the tree.
         :type depth: int
@@ -126,45 +780,51 @@ class Tictactoe:
         :return: The score of the current board state.
         :rtype: int
         """
-        score = self.get_score()
-        if score in [10, -10]:
-            return score - depth
-        if np.all(self.board != ""):
+        self.nodes += 1
+        x, o = self.x, self.o
+        if self._wins(x):
+            return 10 - depth
+        if self._wins(o):
+            return -10 - depth
+        occupied = x | o
+        if occupied == self.engine.full:
             return 0
-        if is_maximizing:
-            best_score = -np.inf
-            for i, j in itertools.product(range(3), range(3)):
-                if self.board[i][j] == "":
-                    self.board[i][j] = "X"
-                    score = self.minimax(depth + 1, False)
-                    self.board[i][j] = ""
-                    best_score = max(score, best_score)
-        else:
-            best_score = np.inf
-            for i, j in itertools.product(range(3), range(3)):
-                if self.board[i][j] == "":
-                    self.board[i][j] = "O"
-                    score = self.minimax(depth + 1, True)
-                    self.board[i][j] = ""
-                    best_score = min(score, best_score)
+        best_score = -100 if is_maximizing else 100
+        for i in range(self.engine.cells):
+            bit = 1 << i
+            if occupied & bit:
+                continue
+            if is_maximizing:
+                self.x = x | bit
+                best_score = max(self.minimax(depth + 1, False), best_score)
+            else:
+                self.o = o | bit
+                best_score = min(self.minimax(depth + 1, True), best_score)
+        self.x, self.o = x, o
         return best_score
 
-    def get_best_move(self) -> tuple[int, int]:
+    def get_best_move(
+        self, max_depth: int | None = None, time_limit: float | None = None
+    ) -> tuple[int, int] | None:
         """
-        This function uses the minimax algorithm to evaluate the best next move for the computer player (X),
-        and returns the row and column indices of the best move.
+        This function finds the best next move for the computer player (X), and returns the row
+        and column indices of the best move. A 3×3 game looks the move up in the solver table,
+        bigger boards are searched by the engine within the limits.
 
-        :return: The row and column indices of the best move.
-        :rtype: tuple[int, int]
+        :param max_depth: The maximum search depth in plies, unlimited by default.
+        :type max_depth: int | None
+        :param time_limit: The search time limit in seconds, unlimited by default.
+        :type time_limit: float | None
+
+        :return: The row and column indices of the best move, or None if the game is over.
+        :rtype: tuple[int, int] | None
         """
-        best_score = -np.inf
-        best_move = None
-        for i, j in itertools.product(range(3), range(3)):
-            if self.board[i][j] == "":
-                self.board[i][j] = "X"
-                score = self.minimax(0, False)
-                self.board[i][j] = ""
-                if score > best_score:
-                    best_score = score
-                    best_move = (i, j)
-        return best_move
+        if self.size == 3 and self.k == 3:
+            cell = Solver.solve(self.x, self.o)[1]
+        elif self.evaluate_result() is not False:
+            cell = -1
+        else:
+            cell = self.engine.search(
+                self.x, self.o, max_depth=max_depth, time_limit=time_limit
+            ).move
+        return divmod(cell, self.size) if cell >= 0 else None
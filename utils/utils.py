@@ -5,11 +5,18 @@ This file is part of ouoteam/ouov3 which is released under GNU General Public Li
 See file LISENCE for full license details.
 """
 
+import asyncio
 import datetime
+import importlib
+import importlib.util
+import sys
+import types
 from typing import Union
 
 import aiohttp
 
+from utils.ipc import IPC
+
 __all__ = ["Utils"]
 
 
@@ -19,6 +26,49 @@ class Utils:
     """
 
     ratelimit = {}
+    lazy_imports = False
+
+    @classmethod
+    def lazy_import(cls, name: str) -> types.ModuleType:
+        """
+        Import a module, deferring its execution to the first attribute access if
+        lazy imports are enabled. Use this for heavy dependencies that are rarely needed.
+
+        :param name: The name of the module.
+        :type name: str
+
+        :raises ModuleNotFoundError: If the module cannot be found.
+
+        :return: The module.
+        :rtype: types.ModuleType
+        """
+        if not cls.lazy_imports or name in sys.modules:
+            return importlib.import_module(name)
+        spec = importlib.util.find_spec(name)
+        if spec is None or spec.loader is None:
+            raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+        loader = importlib.util.LazyLoader(spec.loader)
+        spec.loader = loader
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        loader.exec_module(module)
+        return module
+
+    @classmethod
+    def install_uvloop(cls) -> bool:
+        """
+        Make uvloop the event loop of every new loop, if it is installed.
+        This must be called before the bot is created, as the bot gets its loop on creation.
+
+        :return: Whether uvloop was installed.
+        :rtype: bool
+        """
+        try:
+            import uvloop
+        except ImportError:
+            return False
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        return True
 
     @classmethod
     async def api_request(cls, url: str, headers: dict = None) -> Union[dict, int]:
@@ -34,15 +84,18 @@ class Utils:
         :return: The response from the API or the status code if the request was ratelimited.
         :rtype: Union[dict, int]
         """
-        if url.startswith(
-            "https://api.trace.moe/search?url="
-        ) and datetime.datetime.utcnow().timestamp() < cls.ratelimit.get("trace.moe", 0):
-            return 429
+        if url.startswith("https://api.trace.moe/search?url="):
+            if IPC.running():
+                cls.ratelimit["trace.moe"] = await IPC.get_ratelimit("trace.moe")
+            if datetime.datetime.utcnow().timestamp() < cls.ratelimit.get("trace.moe", 0):
+                return 429
         async with aiohttp.ClientSession() as s, s.get(url, headers=headers) as r:
             if r.status == 402:
                 return 402
             if r.status == 429:
                 if url.startswith("https://api.trace.moe/search?url="):
-                    cls.ratelimit["trace.moe"] = r.headers["x-ratelimit-reset"]
+                    cls.ratelimit["trace.moe"] = float(r.headers["x-ratelimit-reset"])
+                    if IPC.running():
+                        await IPC.set_ratelimit("trace.moe", cls.ratelimit["trace.moe"])
                 return 429
             return await r.json()
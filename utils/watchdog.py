@@ -0,0 +1,112 @@
+"""
+Event loop lag monitor and slow callback detector.
+
+This file is part of ouoteam/ouov3 which is released under GNU General Public License v3.0.
+See file LISENCE for full license details.
+"""
+from __future__ import annotations
+
+import asyncio
+import collections
+import sys
+import threading
+import time
+import traceback
+from typing import Deque, Optional, Tuple
+
+from utils.logging import Logging
+
+__all__ = ["LoopWatchdog"]
+
+
+class LoopWatchdog:
+    """
+    Measure the lag of an event loop and report the code blocking it.
+    A task on the loop records a heartbeat every interval, while a daemon thread checks the
+    heartbeat and logs the stack of the loop thread when the loop stalls beyond the threshold.
+
+    :param interval: The interval between two heartbeats in seconds.
+    :type interval: float
+    :param threshold: The stall duration in seconds after which a slow callback is reported.
+    :type threshold: float
+    """
+
+    def __init__(self, interval: float = 0.5, threshold: float = 0.25) -> None:
+        self.interval = interval
+        self.threshold = threshold
+        self.logger = Logging.get_logger()
+        self.lag: float = 0.0
+        self.max_lag: float = 0.0
+        self.average_lag: float = 0.0
+        self.slow_callbacks: int = 0
+        self.recent: Deque[Tuple[float, str]] = collections.deque(maxlen=10)
+        self._beat = time.monotonic()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopped = threading.Event()
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        Start monitoring the loop.
+
+        :param loop: The loop to monitor.
+        :type loop: asyncio.AbstractEventLoop
+        """
+        if self._task is not None:
+            return
+        self._loop = loop
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._task = loop.create_task(self._measure())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    def stop(self) -> None:
+        """
+        Stop monitoring the loop.
+        """
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _measure(self) -> None:
+        """
+        Record a heartbeat and the loop lag every interval.
+        """
+        self._loop_thread = threading.get_ident()
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lag = max(loop.time() - start - self.interval, 0.0)
+            self.max_lag = max(self.max_lag, self.lag)
+            self.average_lag = self.average_lag * 0.9 + self.lag * 0.1
+            self._beat = time.monotonic()
+
+    def _watch(self) -> None:
+        """
+        Check the heartbeat from the watchdog thread.
+        """
+        reported = None
+        while not self._stopped.wait(self.threshold / 2):
+            beat = self._beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled > self.threshold and beat != reported:
+                reported = beat
+                self._report(stalled)
+
+    def _report(self, stalled: float) -> None:
+        """
+        Log the callback currently blocking the loop.
+
+        :param stalled: How long the loop has been stalled in seconds.
+        :type stalled: float
+        """
+        self.slow_callbacks += 1
+        task = asyncio.current_task(self._loop) if self._loop is not None else None
+        name = task.get_coro().__qualname__ if task is not None else "<callback>"
+        frame = sys._current_frames().get(self._loop_thread)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+        self.recent.append((stalled, name))
+        self.logger.warning(f"事件迴圈已被 {name} 阻塞 {stalled * 1000:.0f} ms\n{stack}")